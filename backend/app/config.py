@@ -7,10 +7,11 @@ MONGODB_USERNAME = os.getenv("MONGODB_USERNAME")
 MONGODB_PASSWORD = os.getenv("MONGODB_PASSWORD")
 MONGODB_CLUSTER = os.getenv("MONGODB_CLUSTER")
 
-if not all([MONGODB_USERNAME, MONGODB_PASSWORD, MONGODB_CLUSTER]):
-    raise ValueError("Missing required MongoDB environment variables.")
-
-MONGO_URI = f"mongodb+srv://{MONGODB_USERNAME}:{MONGODB_PASSWORD}@{MONGODB_CLUSTER}/?retryWrites=true&w=majority&appName=metadata&tls=true"
+# Checked when the Mongo client is first built (app/utils/services.py), so
+# modules can be imported without a database configured
+MONGO_URI = None
+if all([MONGODB_USERNAME, MONGODB_PASSWORD, MONGODB_CLUSTER]):
+    MONGO_URI = f"mongodb+srv://{MONGODB_USERNAME}:{MONGODB_PASSWORD}@{MONGODB_CLUSTER}/?retryWrites=true&w=majority&appName=metadata&tls=true"
 class Settings:
     DATABASE_URL: str = MONGO_URI
     SECRET_KEY: str = os.getenv("SECRET_KEY")
@@ -20,4 +21,118 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
     CHAT_COLLECTION: str = os.getenv("CHAT_COLLECTION") or "chats"
     MEAL_CHAT_COLLECTION: str = os.getenv("MEAL_CHAT_COLLECTION") or "meal_chats"
+    FIREBASE_CREDENTIALS: str = os.getenv("FIREBASE_CREDENTIALS") or "app/firebase-cred.json"
+    # Connections opened at startup and kept open
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE") or 2)
+    STARTUP_CHECK_TIMEOUT_SECONDS: float = float(os.getenv("STARTUP_CHECK_TIMEOUT_SECONDS") or 10)
+    # Wire compression between the app and Mongo; add zstd where the driver has zstd support
+    MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS") or "zlib"
+    # Responses smaller than this are sent uncompressed
+    GZIP_MIN_BYTES: int = int(os.getenv("GZIP_MIN_BYTES") or 1024)
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL") or 5)
+    # zstd level for the blobs archived plans and chats are stored in (see
+    # lifecycle.to_archive); zlib caps it at 9
+    COMPRESSION_LEVEL: int = int(os.getenv("COMPRESSION_LEVEL") or 10)
+    # Server processes (see app/serve.py)
+    SERVE_HOST: str = os.getenv("SERVE_HOST") or "0.0.0.0"
+    SERVE_PORT: int = int(os.getenv("SERVE_PORT") or 8000)
+    # Admission limits and in-memory caches are per worker
+    SERVE_WORKERS: int = int(os.getenv("SERVE_WORKERS") or os.cpu_count() or 1)
+    # Keep below the orchestrator's kill timeout; generations still running are requeued
+    SERVE_GRACEFUL_SECONDS: int = int(os.getenv("SERVE_GRACEFUL_SECONDS") or 25)
+    SERVE_KEEP_ALIVE_SECONDS: int = int(os.getenv("SERVE_KEEP_ALIVE_SECONDS") or 5)
+    SERVE_FORWARDED_ALLOW_IPS: str = os.getenv("SERVE_FORWARDED_ALLOW_IPS") or "127.0.0.1"
+    # Structured logging (see app/utils/log.py)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL") or "INFO"
+    # Records beyond this many waiting to be written are dropped
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE") or 10000)
+    # Share of high-volume debug events (per WebSocket message and the like) kept
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE") or 0.01)
+    # Directory LLM requests and responses are recorded to for offline replay
+    # (see app/utils/recorder.py and benchmarks/replay.py); unset disables recording.
+    # Recordings contain prompts with user data.
+    LLM_RECORD_DIR: str = os.getenv("LLM_RECORD_DIR") or ""
+    # Readiness probes are cached this long so load balancer polling adds no load
+    HEALTH_CACHE_SECONDS: float = float(os.getenv("HEALTH_CACHE_SECONDS") or 5)
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS") or 2)
+    HEALTH_MONGO_MAX_LATENCY_MS: float = float(os.getenv("HEALTH_MONGO_MAX_LATENCY_MS") or 500)
+    # Generation jobs stuck in `generating` longer than this are requeued
+    JOB_STALE_AFTER_SECONDS: int = int(os.getenv("JOB_STALE_AFTER_SECONDS") or 600)
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS") or 3)
+    JOB_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("JOB_SWEEP_INTERVAL_SECONDS") or 60)
+    # How long a shutting-down worker waits for cancelled jobs to be requeued
+    JOB_RELEASE_TIMEOUT_SECONDS: float = float(os.getenv("JOB_RELEASE_TIMEOUT_SECONDS") or 5)
+    # Document lifecycle (see app/utils/lifecycle.py). Abandoned and failed
+    # plans expire; old plans and idle chats move to compressed archives.
+    QUEUED_PLAN_TTL_DAYS: int = int(os.getenv("QUEUED_PLAN_TTL_DAYS") or 2)
+    FAILED_PLAN_TTL_DAYS: int = int(os.getenv("FAILED_PLAN_TTL_DAYS") or 7)
+    ARCHIVE_PLANS_AFTER_DAYS: int = int(os.getenv("ARCHIVE_PLANS_AFTER_DAYS") or 180)
+    ARCHIVE_CHATS_AFTER_DAYS: int = int(os.getenv("ARCHIVE_CHATS_AFTER_DAYS") or 90)
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ARCHIVE_INTERVAL_SECONDS") or 3600)
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE") or 200)
+    # Newest archived documents per user that search decompresses and scans
+    ARCHIVE_SEARCH_SCAN: int = int(os.getenv("ARCHIVE_SEARCH_SCAN") or 100)
+    # Off-peak generation of plans users are expected to request next (see app/utils/pregenerate.py).
+    # It spends OpenAI tokens speculatively, so operators opt in
+    PREGENERATE_ENABLED: bool = (os.getenv("PREGENERATE_ENABLED") or "false").lower() == "true"
+    PREGENERATED_COLLECTION: str = os.getenv("PREGENERATED_COLLECTION") or "pregenerated_plans"
+    # UTC hours, end exclusive; may wrap midnight, e.g. "22-4"
+    PREGENERATE_HOURS: str = os.getenv("PREGENERATE_HOURS") or "2-6"
+    PREGENERATE_INTERVAL_SECONDS: int = int(os.getenv("PREGENERATE_INTERVAL_SECONDS") or 600)
+    PREGENERATE_DAILY_TOKENS: int = int(os.getenv("PREGENERATE_DAILY_TOKENS") or 200000)
+    PREGENERATE_LOOKBACK_DAYS: int = int(os.getenv("PREGENERATE_LOOKBACK_DAYS") or 28)
+    PREGENERATE_MIN_PLANS: int = int(os.getenv("PREGENERATE_MIN_PLANS") or 2)
+    PREGENERATE_LEAD_HOURS: int = int(os.getenv("PREGENERATE_LEAD_HOURS") or 36)
+    PREGENERATE_BATCH_SIZE: int = int(os.getenv("PREGENERATE_BATCH_SIZE") or 100)
+    # Pause while live LLM calls use more than this share of LLM_MAX_INFLIGHT
+    PREGENERATE_MAX_LOAD: float = float(os.getenv("PREGENERATE_MAX_LOAD") or 0.25)
+    # Per-user preference profiles (see app/utils/profile.py)
+    PROFILE_COLLECTION: str = os.getenv("PROFILE_COLLECTION") or "profiles"
+    # Meal names remembered so new plans do not repeat them
+    PROFILE_RECENT_MEALS: int = int(os.getenv("PROFILE_RECENT_MEALS") or 40)
+    # Plans read to build the profile of a user who predates profiles
+    PROFILE_SEED_PLANS: int = int(os.getenv("PROFILE_SEED_PLANS") or 10)
+    MEAL_PLAN_BATCH_MAX: int = int(os.getenv("MEAL_PLAN_BATCH_MAX") or 50)
+    BATCH_GENERATION_CONCURRENCY: int = int(os.getenv("BATCH_GENERATION_CONCURRENCY") or 4)
+    OPENAI_BATCH_POLL_SECONDS: int = int(os.getenv("OPENAI_BATCH_POLL_SECONDS") or 60)
+    USAGE_COLLECTION: str = os.getenv("USAGE_COLLECTION") or "usage"
+    # Admission control for LLM-backed endpoints (see app/utils/admission.py)
+    DEFAULT_TIER: str = os.getenv("DEFAULT_TIER") or "free"
+    LLM_MAX_INFLIGHT: int = int(os.getenv("LLM_MAX_INFLIGHT") or 64)
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS") or 5)
+    USAGE_CACHE_SECONDS: int = int(os.getenv("USAGE_CACHE_SECONDS") or 30)
+    # Deadlines, retries and circuit breaking for OpenAI calls (see app/utils/llm.py)
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS") or 30)
+    LLM_MEAL_PLAN_TIMEOUT_SECONDS: float = float(os.getenv("LLM_MEAL_PLAN_TIMEOUT_SECONDS") or 90)
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES") or 2)
+    LLM_RETRY_BASE_SECONDS: float = float(os.getenv("LLM_RETRY_BASE_SECONDS") or 0.5)
+    LLM_RETRY_MAX_SECONDS: float = float(os.getenv("LLM_RETRY_MAX_SECONDS") or 8)
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES") or 5)
+    LLM_BREAKER_RESET_SECONDS: int = int(os.getenv("LLM_BREAKER_RESET_SECONDS") or 30)
+    # Send a second chat request if the first is slower than this; 0 disables hedging
+    LLM_CHAT_HEDGE_AFTER_SECONDS: float = float(os.getenv("LLM_CHAT_HEDGE_AFTER_SECONDS") or 0)
+    # Model per LLM task (see route() in app/utils/llm.py)
+    LLM_CHAT_MODEL: str = os.getenv("LLM_CHAT_MODEL") or "gpt-3.5-turbo"
+    LLM_MEAL_CHAT_MODEL: str = os.getenv("LLM_MEAL_CHAT_MODEL") or "gpt-3.5-turbo"
+    LLM_MEAL_PLAN_MODEL: str = os.getenv("LLM_MEAL_PLAN_MODEL") or "gpt-3.5-turbo"
+    LLM_PLAN_CHUNK_MODEL: str = os.getenv("LLM_PLAN_CHUNK_MODEL") or "gpt-4o-mini"
+    LLM_TITLE_MODEL: str = os.getenv("LLM_TITLE_MODEL") or "gpt-4o-mini"
+    LLM_TITLE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TITLE_TIMEOUT_SECONDS") or 10)
+    # Serialized plan and chat bodies kept for ETag responses (see app/utils/http_cache.py)
+    HTTP_BODY_CACHE_ENTRIES: int = int(os.getenv("HTTP_BODY_CACHE_ENTRIES") or 500)
+    # Upper bound on staleness of nutrition summaries cached by another worker
+    NUTRITION_CACHE_SECONDS: int = int(os.getenv("NUTRITION_CACHE_SECONDS") or 300)
+    # Reuse meals from completed plans before asking the LLM (see app/utils/recipe_index.py).
+    # The index is shared across users: any user's generated recipes can fill another's plan
+    RECIPE_INDEX_ENABLED: bool = (os.getenv("RECIPE_INDEX_ENABLED") or "true").lower() == "true"
+    RECIPE_INDEX_MAX_MEALS: int = int(os.getenv("RECIPE_INDEX_MAX_MEALS") or 20000)
+    RECIPE_INDEX_REFRESH_SECONDS: int = int(os.getenv("RECIPE_INDEX_REFRESH_SECONDS") or 60)
+    # Plans read by one refresh; the first build takes the newest ones
+    RECIPE_INDEX_MAX_PLANS: int = int(os.getenv("RECIPE_INDEX_MAX_PLANS") or 2000)
+    # Below this share of filled slots the whole plan is generated instead
+    RECIPE_INDEX_MIN_COVERAGE: float = float(os.getenv("RECIPE_INDEX_MIN_COVERAGE") or 0.5)
+    # Password hashing runs in a process pool (see app/utils/security.py)
+    PASSWORD_HASH_ROUNDS: int = int(os.getenv("PASSWORD_HASH_ROUNDS") or 12)
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS") or 2)
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING") or 32)
 settings = Settings()
\ No newline at end of file
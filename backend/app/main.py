@@ -1,22 +1,65 @@
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from slowapi import Limiter
-import firebase_admin
-from firebase_admin import credentials
 from slowapi.middleware import SlowAPIMiddleware
 from slowapi.util import get_remote_address
+# Imported before the routers so Mongo command monitoring sees every client
+from .utils.metrics import MetricsMiddleware
+from .utils.log import RequestIdMiddleware, configure_logging, shutdown_logging
 from .routers.auth import router as auth_router
-from .routers.meal_plan import router as meal_plan_router
-from .routers.chat import router as chat_router
+from .routers.meal_plan import (
+    router as meal_plan_router, start_job_sweeper, stop_job_sweeper,
+    start_plan_pregenerator, stop_plan_pregenerator,
+)
+from .routers.chat import router as chat_router, ensure_meal_chat_index
+from .routers.metrics import router as metrics_router
+from .routers.health import router as health_router
+from .routers.search import router as search_router, ensure_search_indexes
+from .routers.profile import router as profile_router
 from .utils.websocket import router as websocket_router
+from .utils.auth import ensure_user_indexes
+from .utils.security import shutdown_hash_pool
+from .utils.lifecycle import ensure_lifecycle_indexes, start_archiver, stop_archiver
+from .utils.pregenerate import ensure_pregenerate_indexes
+from .utils.recorder import stop_recording
+from .utils.services import services
+from .config import settings
 
 # Add WebSocket connection manager
 
 
 limiter = Limiter(key_func=get_remote_address)
 
-app = FastAPI()
+# Before anything logs, so every record goes through the queue
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients are built and warmed concurrently instead of at import time
+    await services.startup(
+        user_indexes=ensure_user_indexes(),
+        meal_chat_index=ensure_meal_chat_index(),
+        search_indexes=ensure_search_indexes(),
+        lifecycle_indexes=ensure_lifecycle_indexes(),
+        pregenerate_indexes=ensure_pregenerate_indexes(),
+    )
+    await start_job_sweeper()
+    start_archiver()
+    start_plan_pregenerator()
+    yield
+    # By now uvicorn has drained requests and their background generations (see app/serve.py)
+    await stop_plan_pregenerator()
+    stop_archiver()
+    await stop_job_sweeper()
+    shutdown_hash_pool()
+    await services.shutdown()
+    stop_recording()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 #CORS middleware
 app.add_middleware(
@@ -25,20 +68,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Plans with full recipes compress several times over; WebSocket messages
+# are compressed by uvicorn, which negotiates permessage-deflate by default
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_BYTES, compresslevel=settings.GZIP_LEVEL)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
-# client = AsyncIOMotorClient(settings.DATABASE_URL)
-# db = client[settings.DATABASE_NAME]
-
-cred = credentials.Certificate("app/firebase-cred.json")
-firebase_admin.initialize_app(cred)
-
+app.add_middleware(MetricsMiddleware)
+# Outermost, so everything logged while handling a request carries its ID
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(meal_plan_router, prefix="/api/v1/meal-plans", tags=["meal-plans"])
 app.include_router(websocket_router, prefix="/api/v1/ws", tags=["websocket"])
 app.include_router(chat_router, prefix="/api/v1/chats", tags=["chats"])
+app.include_router(search_router, prefix="/api/v1/search", tags=["search"])
+app.include_router(profile_router, prefix="/api/v1/profile", tags=["profile"])
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(health_router, tags=["health"])
 
 @app.get("/")
 @limiter.limit("7/minute") 
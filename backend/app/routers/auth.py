@@ -1,34 +1,38 @@
-
-
-from fastapi import APIRouter, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 
 from app.schemas.user import UserCreate
-from app.utils.security import hash_password
+from app.utils.security import hash_password_async
+from app.utils.auth import ensure_user_indexes, link_verified_email, verify_firebase_token
 from app.config import settings
+from app.utils.services import services
 
 
 
 router = APIRouter()
 
-# MongoDB client setup
-client = AsyncIOMotorClient(settings.DATABASE_URL)
-db = client[settings.DATABASE_NAME]
-
 @router.post("/register")
-async def register_user(user: UserCreate):
-    # Check if user already exists
-    existing_user = await db[settings.USER_COLLECTION].find_one({"email": user.email})
-    if existing_user:
-        return {"message": "User already exists"}
-
-    # Create new user
-    hashed_password = hash_password(user.password)
+async def register_user(user: UserCreate, decoded_token: dict = Depends(verify_firebase_token)):
+    # The email and UID come from the verified token, so nobody can claim
+    # an address they haven't signed in with
+    email = decoded_token.get("email")
+    if not email:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Firebase account has no email")
+    await ensure_user_indexes()
+
+    # Create new user; the unique email index rejects existing users
+    hashed_password = await hash_password_async(user.password) if user.password else None
     new_user = {
-        "email": user.email,
+        "email": email,
         "password": hashed_password,
-        "googleAuth": user.googleAuth,
-        "firebaseUid": user.uuid
+        "googleAuth": decoded_token.get("firebase", {}).get("sign_in_provider") == "google.com",
+        "firebaseUid": decoded_token["uid"],
+        "createdAt": datetime.now().isoformat()
     }
-    await db[settings.USER_COLLECTION].insert_one(new_user)
-    return {"message": "User created successfully"}
\ No newline at end of file
+    try:
+        await services.db[settings.USER_COLLECTION].insert_one(new_user)
+    except DuplicateKeyError:
+        await link_verified_email(decoded_token)
+        return {"message": "User already exists"}
+    return {"message": "User created successfully"}
@@ -1,25 +1,44 @@
 # backend/app/routers/chat.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from bson import ObjectId
-import openai
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel
 from app.schemas.chat import ChatMessage, GenieChat, MessageRequest, MealMessageRequest
 from app.config import settings
+from app.utils.services import services
 from app.utils.auth import get_current_user
+from app.utils import lifecycle, llm, profile
+from app.utils.http_cache import conditional_get, with_version_bump
+from app.utils.admission import admission
+from app.utils.tasks import after_response
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-client = AsyncIOMotorClient(settings.DATABASE_URL)
-db = client[settings.DATABASE_NAME]
+# Turns of meal-chat history read back and sent to the model
+MEAL_CHAT_HISTORY_LIMIT = 50
+_meal_chat_index_ready = False
 
-openai_client = None
-if settings.OPENAI_API_KEY:
-    openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-else:
-    print("WARNING: OPENAI_API_KEY not set. OpenAI features will not be available.")
+async def ensure_meal_chat_index():
+    """One meal chat per user, plan, day and meal type, so concurrent upserts cannot duplicate it"""
+    global _meal_chat_index_ready
+    if _meal_chat_index_ready:
+        return
+    try:
+        await services.db[settings.MEAL_CHAT_COLLECTION].create_index(
+            [("userId", 1), ("mealPlanId", 1), ("dayId", 1), ("mealType", 1)],
+            unique=True, name="meal_chat_key"
+        )
+    except Exception as e:
+        # Existing duplicates block the unique index; chats still work without it
+        logger.warning("Failed to create meal chat index: %s", e)
+    _meal_chat_index_ready = True
 
 # Create new chat
 @router.post("/", response_model=GenieChat)
@@ -39,8 +58,8 @@ async def create_chat(user_id: str = Depends(get_current_user)):
         "updatedAt": datetime.now().isoformat()
     }
     
-    result = await db[settings.CHAT_COLLECTION].insert_one(new_chat)
-    created_chat = await db[settings.CHAT_COLLECTION].find_one({"_id": result.inserted_id})
+    result = await services.db[settings.CHAT_COLLECTION].insert_one(new_chat)
+    created_chat = await services.db[settings.CHAT_COLLECTION].find_one({"_id": result.inserted_id})
         # Ensure _id is properly converted to string for response
     created_chat["_id"] = str(created_chat["_id"])
     return created_chat
@@ -56,15 +75,25 @@ async def get_chats(user_id: str = Depends(get_current_user), order_by: str = 'c
         user_id_str = str(user_id_str)
 
     sort_field = order_by if order_by in ["createdAt", "updatedAt"] else "createdAt"
-    chats = await db[settings.CHAT_COLLECTION].find({"userId": user_id_str}).sort(sort_field, -1).to_list(100)
+    query = {"userId": user_id_str}
+    chats, archived = await asyncio.gather(
+        services.db[settings.CHAT_COLLECTION].find(query).sort(sort_field, -1).to_list(100),
+        # Idle chats move to the archive but stay in the list; opening one restores it
+        lifecycle.find_archived(settings.CHAT_COLLECTION, query, sort_field, 100),
+    )
+    chats = sorted(chats + archived, key=lambda chat: chat.get(sort_field) or "", reverse=True)[:100]
     # Ensure all _id fields are converted to strings
     for chat in chats:
         chat["_id"] = str(chat["_id"])
     return chats
 
+def _chat_response(chat):
+    chat["_id"] = str(chat["_id"])
+    return chat
+
 # Get specific chat by ID
 @router.get("/{chat_id}", response_model=GenieChat)
-async def get_chat(chat_id: str, user_id: str = Depends(get_current_user)):
+async def get_chat(chat_id: str, request: Request, user_id: str = Depends(get_current_user)):
     # Extract just the user ID if a full user object is returned    
     user_id_str = user_id["_id"] if isinstance(user_id, dict) and "_id" in user_id else user_id
     
@@ -72,16 +101,20 @@ async def get_chat(chat_id: str, user_id: str = Depends(get_current_user)):
     if isinstance(user_id_str, ObjectId):
         user_id_str = str(user_id_str)
         
-    chat = await db[settings.CHAT_COLLECTION].find_one({"_id": ObjectId(chat_id), "userId": user_id_str})
-    if not chat:
+    query = {"_id": ObjectId(chat_id), "userId": user_id_str}
+    collection = services.db[settings.CHAT_COLLECTION]
+    response = await conditional_get(request, "chat", collection, query, GenieChat, _chat_response)
+    if response is None and await lifecycle.restore(settings.CHAT_COLLECTION, query):
+        response = await conditional_get(request, "chat", collection, query, GenieChat, _chat_response)
+    if response is None:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat
+    return response
 
 
 
 # Add message to chat and get AI response
 @router.post("/{chat_id}/messages", response_model=List[ChatMessage])
-async def add_message(chat_id: str, message_request: MessageRequest, user_id: str = Depends(get_current_user)):
+async def add_message(chat_id: str, message_request: MessageRequest, background_tasks: BackgroundTasks, user_id: str = Depends(get_current_user)):
     # Extract just the user ID if a full user object is returned    
     user_id_str = user_id["_id"] if isinstance(user_id, dict) and "_id" in user_id else user_id
     
@@ -89,7 +122,16 @@ async def add_message(chat_id: str, message_request: MessageRequest, user_id: st
     if isinstance(user_id_str, ObjectId):
         user_id_str = str(user_id_str)
         
-    chat = await db[settings.CHAT_COLLECTION].find_one({"_id": ObjectId(chat_id), "userId": user_id_str})
+    ticket = await admission.admit(user_id, "chat")
+    try:
+        return await _add_message(chat_id, message_request, user_id_str, user_id["firebaseUid"], background_tasks)
+    except llm.LLMUnavailableError as e:
+        raise llm.service_unavailable(e) from e
+    finally:
+        ticket.release()
+
+async def _add_message(chat_id: str, message_request: MessageRequest, user_id_str: str, firebase_uid: str, background_tasks: BackgroundTasks):
+    chat = await lifecycle.find_one(settings.CHAT_COLLECTION, {"_id": ObjectId(chat_id), "userId": user_id_str})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -98,77 +140,66 @@ async def add_message(chat_id: str, message_request: MessageRequest, user_id: st
         "isUser": True,
         "timestamp": datetime.now().isoformat()
     }
-    is_first_message = len(chat["messages"]) == 0
-    response_data = await generate_ai_response(chat["messages"] + [user_message], is_first_message)
-    
+    ai_response = await generate_ai_response(chat["messages"] + [user_message], firebase_uid)
 
-    if is_first_message:
-        ai_response = response_data["content"]
-        new_title = response_data["title"]
-    else:
-        ai_response = response_data
-        new_title = chat["title"]
-    
     ai_message = {
         "content": ai_response,
         "isUser": False,
         "timestamp": datetime.now().isoformat()
     }
     
-    new_messages = chat["messages"] + [user_message, ai_message]
-    update_data = {
-        "messages": new_messages,
-        "updatedAt": datetime.now().isoformat()
-    }
-
-    if new_title:
-        update_data["title"] = new_title
-    
-    await db[settings.CHAT_COLLECTION].update_one(
-        {"_id": ObjectId(chat_id)},
-        {"$set": update_data}
-    )
+    # Saved before responding so a reload right after sees the turn; only
+    # the title and profile work wait for the response
+    await save_turn(settings.CHAT_COLLECTION, chat["_id"], [user_message, ai_message])
+    if len(chat["messages"]) == 0:
+        # Named by a small model once the answer has been sent
+        after_response(background_tasks, generate_chat_title, settings.CHAT_COLLECTION, chat["_id"], chat["title"], message_request.message, firebase_uid)
+    after_response(background_tasks, profile.record_message, user_id_str, message_request.message)
     
     return [user_message, ai_message]
 
+
+async def save_turn(collection_name: str, chat_id, messages: List[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> None:
+    """Append a user message and its answer in order with one $push, so concurrent turns never overwrite each other"""
+    await services.db[collection_name].update_one(
+        {"_id": chat_id},
+        with_version_bump({"$push": {"messages": {"$each": messages}}, "$set": {**(extra or {}), "updatedAt": datetime.now().isoformat()}})
+    )
+
 # Helper function to generate AI response with context
-async def generate_ai_response(messages, generate_title=False):
+async def generate_ai_response(messages, firebase_uid=None):
     # Format messages for OpenAI
     openai_messages = [{"role": "system", "content": "You are a helpful nutritionist and cooking expert named Genie. Answer questions about food, cooking, nutrition, and meal planning. Be concise but thorough, when neccesary give things in a list format. Be very specific and detailed. Be very friendly, engaging and helpful."}]
-    if generate_title:
-        openai_messages += "Additionally, at the end of your response, include a line '<TITLE:Your suggested title>' where you provide a concise title (max 5 words) for this conversation based on the user's initial message."
     # Add conversation history
     for msg in messages:
         role = "user" if msg["isUser"] else "assistant"
         openai_messages.append({"role": role, "content": msg["content"]})
     
     # Call OpenAI
-    response = await openai_client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=openai_messages,
-        temperature=0.7
-    )
+    response = await llm.complete("chat", openai_messages, firebase_uid)
+    return response.choices[0].message.content
 
-    response_content = response.choices[0].message.content
 
-    if generate_title:
-        # Split the response to separate content and title
-        if "<TITLE:" in response_content:
-            parts = response_content.split("<TITLE:")
-            content = parts[0].strip()
-            title = parts[1].strip().rstrip('>')[:50]  # Extract title and limit to 50 chars
-        else:
-            # Fallback if the AI didn't follow the format
-            content = response_content
-            title = "New Conversation"
-        return {"content": content, "title": title}
-    
-    return response_content
+async def generate_chat_title(collection_name: str, chat_id, placeholder: str, first_message: str, firebase_uid=None):
+    """
+    Name a chat after its first message. Runs after the response is sent and
+    only replaces the placeholder title, so a failure just keeps the default.
+    """
+    try:
+        response = await llm.complete("title", [
+            {"role": "system", "content": "Write a concise title (max 5 words) for a conversation that starts with the user's message. Reply with the title only."},
+            {"role": "user", "content": first_message},
+        ], firebase_uid)
+        title = (response.choices[0].message.content or "").strip().strip('"').strip()[:50]
+        if title:
+            await services.db[collection_name].update_one({"_id": chat_id, "title": placeholder}, with_version_bump({"$set": {"title": title}}))
+    except Exception as e:
+        logger.warning("Failed to generate chat title: %s", e, extra={"chat": str(chat_id)})
 
 
 # Add meal-specific message endpoint
 @router.post("/meal-chat", response_model=List[ChatMessage])
-async def add_meal_message(message_request: MealMessageRequest, user_id: str = Depends(get_current_user)):
+async def add_meal_message(message_request: MealMessageRequest, background_tasks: BackgroundTasks, user_id: str = Depends(get_current_user)):
     # Extract user ID
     user_id_str = user_id["_id"] if isinstance(user_id, dict) and "_id" in user_id else user_id
     
@@ -176,7 +207,16 @@ async def add_meal_message(message_request: MealMessageRequest, user_id: str = D
     if isinstance(user_id_str, ObjectId):
         user_id_str = str(user_id_str)
     
-    # Find or create a meal-specific chat
+    ticket = await admission.admit(user_id, "chat")
+    try:
+        return await _add_meal_message(message_request, user_id_str, user_id["firebaseUid"], background_tasks)
+    except llm.LLMUnavailableError as e:
+        raise llm.service_unavailable(e) from e
+    finally:
+        ticket.release()
+
+async def _add_meal_message(message_request: MealMessageRequest, user_id_str: str, firebase_uid: str, background_tasks: BackgroundTasks):
+    # Find or create a meal-specific chat in one round trip
     chat_title = f"Meal Chat: {message_request.mealType} - Day {message_request.dayId}"
     query = {
         "userId": user_id_str,
@@ -184,22 +224,37 @@ async def add_meal_message(message_request: MealMessageRequest, user_id: str = D
         "dayId": message_request.dayId,
         "mealType": message_request.mealType
     }
-     # Find existing chat or create new one
-    chat = await db[settings.MEAL_CHAT_COLLECTION].find_one(query)
-    
-    if not chat:
-        # Create new chat for this meal
-        new_chat = {
-            **query,
+    await ensure_meal_chat_index()
+    upsert = {
+        "$setOnInsert": {
             "title": chat_title,
             "messages": [],
             "isMealChat": True,
             "createdAt": datetime.now().isoformat(),
             "updatedAt": datetime.now().isoformat()
         }
-        
-        result = await db[settings.MEAL_CHAT_COLLECTION].insert_one(new_chat)
-        chat = await db[settings.MEAL_CHAT_COLLECTION].find_one({"_id": result.inserted_id})
+    }
+    projection = {"title": 1, "mealContext": 1, "messages": {"$slice": -MEAL_CHAT_HISTORY_LIMIT}}
+    try:
+        chat = await services.db[settings.MEAL_CHAT_COLLECTION].find_one_and_update(
+            query, upsert, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent request created the chat first; it exists now
+        chat = await services.db[settings.MEAL_CHAT_COLLECTION].find_one(query, projection)
+    meal_context = chat.get("mealContext")
+    if not chat["messages"]:
+        # A new chat needs both, so they are looked up together
+        archived, meal_context = await asyncio.gather(
+            services.db[lifecycle.archive_name(settings.MEAL_CHAT_COLLECTION)].count_documents(query, limit=1),
+            get_meal_context(message_request, user_id_str),
+        )
+        if archived:
+            # The conversation was archived; swap the empty chat just created for it
+            await services.db[settings.MEAL_CHAT_COLLECTION].delete_one({"_id": chat["_id"], "messages": {"$size": 0}})
+            chat = await lifecycle.find_one(settings.MEAL_CHAT_COLLECTION, query, projection)
+    elif not meal_context:
+        meal_context = await get_meal_context(message_request, user_id_str)
     
     # Add user message
     user_message = {
@@ -209,54 +264,49 @@ async def add_meal_message(message_request: MealMessageRequest, user_id: str = D
     }
     
     # Generate AI response with meal context
-    is_first_message = len(chat["messages"]) == 0
+    ai_response = await generate_meal_ai_response(chat["messages"] + [user_message], meal_context, firebase_uid)
 
-    meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(message_request.mealPlanId)})
-    meal_context = "No meal details available"
-    
-    if meal_plan and "mealPlan" in meal_plan and "days" in meal_plan["mealPlan"]:
-        for day in meal_plan["mealPlan"]["days"]:
-            if str(day["day"]) == message_request.dayId:
-                for meal in day["meals"]:
-                    if meal["type"] == message_request.mealType:
-                        meal_context = f"Meal: {meal['name']}\nIngredients: {', '.join(meal['ingredients'])}\nDescription: {meal.get('description', 'No description')}"
-                        break
-    response_data = await generate_meal_ai_response(chat["messages"] + [user_message], meal_context, is_first_message)
-    if is_first_message:
-        ai_response = response_data["content"]
-        new_title = response_data["title"]
-    else:
-        ai_response = response_data
-        new_title = chat["title"]
-    
     ai_message = {
         "content": ai_response,
         "isUser": False,
         "timestamp": datetime.now().isoformat()
     }
     
-    new_messages = chat["messages"] + [user_message, ai_message]
-    update_data = {
-        "messages": new_messages,
-        "updatedAt": datetime.now().isoformat()
-    }
-
-    if new_title and is_first_message:
-        update_data["title"] = new_title
-    
-    await db[settings.CHAT_COLLECTION].update_one(
-        {"_id": chat["_id"]},
-        {"$set": update_data}
-    )
+    await save_turn(settings.MEAL_CHAT_COLLECTION, chat["_id"], [user_message, ai_message], {"mealContext": meal_context})
+    if len(chat["messages"]) == 0:
+        after_response(background_tasks, generate_chat_title, settings.MEAL_CHAT_COLLECTION, chat["_id"], chat["title"], message_request.message, firebase_uid)
+    after_response(background_tasks, profile.record_message, user_id_str, message_request.message)
     
     return [user_message, ai_message]
 
+async def get_meal_context(message_request: MealMessageRequest, user_id_str: str) -> str:
+    """Describe the chatted-about meal, reading only its day of the plan"""
+    day_ids = [message_request.dayId]
+    if message_request.dayId.isdigit():
+        day_ids.append(int(message_request.dayId))
+    try:
+        # Project just the matching day; $elemMatch projection does not reach nested arrays
+        days = await services.db[settings.MEAL_PLAN_COLLECTION].aggregate([
+            {"$match": {"_id": ObjectId(message_request.mealPlanId), "userId": ObjectId(user_id_str)}},
+            {"$project": {"_id": 0, "day": {"$arrayElemAt": [
+                {"$filter": {"input": "$mealPlan.days", "as": "day", "cond": {"$in": ["$$day.day", day_ids]}}}, 0
+            ]}}},
+        ]).to_list(1)
+    except InvalidId:
+        days = []
+    if days and days[0].get("day"):
+        for meal in days[0]["day"].get("meals", []):
+            if meal["type"] == message_request.mealType:
+                return f"Meal: {meal['name']}\nIngredients: {', '.join(meal['ingredients'])}\nDescription: {meal.get('description', 'No description')}"
+    return "No meal details available"
+
 # Get meal-specific chat history
 @router.get("/meal-chat/{meal_plan_id}/{day_id}/{meal_type}", response_model=GenieChat)
 async def get_meal_chat_history(
     meal_plan_id: str, 
     day_id: str, 
     meal_type: str, 
+    request: Request,
     user_id: str = Depends(get_current_user)
 ):
     # Extract user ID
@@ -274,11 +324,15 @@ async def get_meal_chat_history(
         "mealType": meal_type
     }
     
-    chat = await db[settings.MEAL_CHAT_COLLECTION].find_one(query)
+    collection = services.db[settings.MEAL_CHAT_COLLECTION]
+    response = await conditional_get(request, "meal_chat", collection, query, GenieChat, _chat_response)
+    if response is None and await lifecycle.restore(settings.MEAL_CHAT_COLLECTION, query):
+        response = await conditional_get(request, "meal_chat", collection, query, GenieChat, _chat_response)
     
-    if not chat:
+    if response is None:
         # Return empty chat if none exists
         return {
+            "userId": user_id_str,
             "title": f"Meal Chat: {meal_type} - Day {day_id}",
             "messages": [],
             "isMealChat": True,
@@ -286,11 +340,7 @@ async def get_meal_chat_history(
             "updatedAt": datetime.now().isoformat()
         }
     
-    # Convert ObjectId to string
-    if "_id" in chat:
-        chat["_id"] = str(chat["_id"])
-    
-    return chat
+    return response
 
 # Add this new endpoint after the other chat endpoints
 @router.delete("/{chat_id}")
@@ -302,8 +352,12 @@ async def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
     if isinstance(user_id_str, ObjectId):
         user_id_str = str(user_id_str)
         
+    # Archived chats are deleted from the archive
+    if await lifecycle.delete_archived(settings.CHAT_COLLECTION, {"_id": ObjectId(chat_id), "userId": user_id_str}):
+        return {"message": "Chat deleted successfully"}
+
     # First check if the chat exists and belongs to the user
-    chat = await db[settings.CHAT_COLLECTION].find_one({
+    chat = await services.db[settings.CHAT_COLLECTION].find_one({
         "_id": ObjectId(chat_id),
         "userId": user_id_str
     })
@@ -312,7 +366,7 @@ async def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Delete the chat
-    result = await db[settings.CHAT_COLLECTION].delete_one({
+    result = await services.db[settings.CHAT_COLLECTION].delete_one({
         "_id": ObjectId(chat_id),
         "userId": user_id_str
     })
@@ -322,7 +376,7 @@ async def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
     
     return {"message": "Chat deleted successfully"}
 
-async def generate_meal_ai_response(messages, meal_context, generate_title=False):
+async def generate_meal_ai_response(messages, meal_context, firebase_uid=None):
     # Format messages for OpenAI with meal context
     system_prompt = """You are a helpful nutritionist and cooking expert named Genie. 
     Answer questions about the specific meal details provided below. 
@@ -336,34 +390,11 @@ async def generate_meal_ai_response(messages, meal_context, generate_title=False
     
     openai_messages = [{"role": "system", "content": system_prompt}]
     
-    if generate_title:
-        title_instruction = "Additionally, at the end of your response, include a line '<TITLE:Your suggested title>' where you provide a concise title (max 5 words) for this conversation based on the user's initial message."
-        openai_messages[0]["content"] += "\n\n" + title_instruction
-    
     # Add conversation history
     for msg in messages:
         role = "user" if msg["isUser"] else "assistant"
         openai_messages.append({"role": role, "content": msg["content"]})
     
     # Call OpenAI
-    response = await openai_client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=openai_messages,
-        temperature=0.7
-    )
-
-    response_content = response.choices[0].message.content
-
-    if generate_title:
-        # Split the response to separate content and title
-        if "<TITLE:" in response_content:
-            parts = response_content.split("<TITLE:")
-            content = parts[0].strip()
-            title = parts[1].strip().rstrip('>')[:50]  # Extract title and limit to 50 chars
-        else:
-            # Fallback if the AI didn't follow the format
-            content = response_content
-            title = "Meal Question"
-        return {"content": content, "title": title}
-    
-    return response_content
\ No newline at end of file
+    response = await llm.complete("meal_chat", openai_messages, firebase_uid)
+    return response.choices[0].message.content
\ No newline at end of file
@@ -0,0 +1,93 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, Optional
+import asyncio
+import time
+
+from app.config import settings
+from app.utils.services import services
+from app.utils.admission import admission
+from app.utils.websocket import manager
+from app.utils import jobs, llm
+
+router = APIRouter()
+
+STARTED_AT = time.monotonic()
+OK, DEGRADED, UNAVAILABLE = "ok", "degraded", "unavailable"
+
+_cached: Optional[Dict[str, Any]] = None
+_cached_at = 0.0
+_probe_lock = asyncio.Lock()
+
+
+async def _timed(probe) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        value = await asyncio.wait_for(probe, settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+        return {"ok": True, "value": value, "latencyMs": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        return {"ok": False, "error": str(e) or type(e).__name__, "latencyMs": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def probe() -> Dict[str, Any]:
+    """Run every readiness probe concurrently and fold them into one status"""
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    mongo, backlog, ready = await asyncio.gather(
+        _timed(services.db.command("ping")),
+        # Bounded count, so a huge backlog cannot make the probe itself slow
+        _timed(collection.count_documents({"status": {"$in": [jobs.QUEUED, jobs.PENDING, jobs.GENERATING]}}, limit=10_000)),
+        # Critical checks that failed at boot are retried until they pass
+        _timed(services.recheck()),
+    )
+    checks = {
+        "startup": {"ok": bool(ready.get("value")), "checks": services.checks},
+        "mongo": {"ok": mongo["ok"], "latencyMs": mongo["latencyMs"], "error": mongo.get("error")},
+        "generationBacklog": {"ok": backlog["ok"], "jobs": backlog.get("value"), "error": backlog.get("error")},
+        "llm": {
+            # An open circuit fails LLM calls fast; plans fall back to the recipe index
+            "ok": services.openai is not None and llm.breaker.state != llm.OPEN,
+            "circuit": llm.breaker.state,
+            "inflight": admission.inflight,
+            "capacity": settings.LLM_MAX_INFLIGHT,
+        },
+        "websockets": {"ok": True, "connections": manager.connection_count()},
+    }
+
+    state = OK
+    if not checks["mongo"]["ok"] or not checks["startup"]["ok"]:
+        state = UNAVAILABLE
+    elif admission.inflight >= settings.LLM_MAX_INFLIGHT:
+        # Saturated: new generations and chats would only be shed with 429s
+        state = UNAVAILABLE
+    elif mongo["latencyMs"] > settings.HEALTH_MONGO_MAX_LATENCY_MS or not checks["llm"]["ok"] or not backlog["ok"]:
+        state = DEGRADED
+    return {"status": state, "uptimeSeconds": round(time.monotonic() - STARTED_AT), "checks": checks}
+
+
+async def cached_probe() -> Dict[str, Any]:
+    """The last probe result, refreshed at most every HEALTH_CACHE_SECONDS by one caller"""
+    global _cached, _cached_at
+    if _cached is not None and time.monotonic() - _cached_at < settings.HEALTH_CACHE_SECONDS:
+        return _cached
+    async with _probe_lock:
+        if _cached is None or time.monotonic() - _cached_at >= settings.HEALTH_CACHE_SECONDS:
+            _cached = await probe()
+            _cached_at = time.monotonic()
+    return _cached
+
+
+@router.get("/health/live", include_in_schema=False)
+async def liveness():
+    """
+    The process is up and its event loop is serving requests
+    """
+    return {"status": OK}
+
+
+@router.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """
+    Whether this node should receive traffic; 503 when it should not
+    """
+    result = await cached_probe()
+    return JSONResponse(result, status_code=503 if result["status"] == UNAVAILABLE else 200)
@@ -1,32 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Dict, Optional, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, BackgroundTasks
+from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime, date
 from bson import ObjectId
 from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo import ReturnDocument
 import json
 import asyncio
+import logging
 from functools import lru_cache
 import time
-import openai
 import re
 
-from app.schemas.meal_plan import MealPlanCreate, MealPlanResponse, MealPlanInDB
+from app.schemas.meal_plan import (
+    MealPlanCreate, MealPlanResponse, MealPlanInDB, MealPlanStatus,
+    MealPlanBatchCreate, MealPlanBatchResponse, MealPlanBatchStatus, ShoppingList,
+    NutritionSummary, MealDay, MealItem, MealRegenerateRequest,
+)
 from app.config import settings
+from app.utils.services import services
 from app.utils.auth import get_current_user
 from app.utils.websocket import manager
+from app.utils.metrics import CACHE_LOOKUPS, stage
+from app.utils import jobs, lifecycle, llm, profile
+from app.utils.admission import Ticket, admission
+from app.utils.shopping_list import build_shopping_list
+from app.utils.nutrition import get_nutrition_summary, invalidate_nutrition
+from app.utils.recipe_index import merge_generated, recipe_index
+from app.utils.http_cache import conditional_get, with_version_bump
+from app.utils.pregenerate import start_pregenerator, stop_pregenerator, take_pregenerated
+from app.utils.log import bind
+from app.utils.tasks import after_response
+from app.utils.recorder import record
 
 router = APIRouter()
-
-# MongoDB client setup
-client = AsyncIOMotorClient(settings.DATABASE_URL)
-db = client[settings.DATABASE_NAME]
-
-openai_client = None
-if settings.OPENAI_API_KEY:
-    openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-else:
-    print("WARNING: OPENAI_API_KEY not set. OpenAI features will not be available.")
+logger = logging.getLogger(__name__)
 
 # Cache for OpenAI requests - simple in-memory cache
 OPENAI_CACHE = {}
@@ -54,139 +62,87 @@ def cache_response(query_key: str, response: Dict[str, Any]) -> None:
         "timestamp": time.time()
     }
 
-async def get_previous_meal_plans(user_id: str, limit: int = 3) -> List[Dict[str, Any]]:
-    """Get the user's previous meal plans for context"""
+async def get_user_profile(user_id) -> Dict[str, Any]:
+    """The user's preference profile for prompt context; generation goes ahead without one"""
     try:
-        #todo: we can also get the previous plans using other parameters like dietary restrictions, preferences, etc., to find a close match
-        previous_plans = await db[settings.MEAL_PLAN_COLLECTION].find(
-            {"userId": user_id, "status": "completed"}
-        ).sort("createdAt", -1).limit(limit).to_list(limit)
-        
-        return previous_plans
+        return await profile.get_profile(user_id)
     except Exception as e:
-        print(f"Error fetching previous meal plans: {e}")
-        return []
+        logger.warning("Error fetching user profile: %s", e)
+        return {}
 
-async def generate_meal_plan(meal_plan_id: str, user_id: str, firebase_uid: str) -> None: 
-    """
-    Background task to generate a meal plan using GPT
-    """
-    try:
-        if not openai_client:
-            raise Exception("OpenAI API key not configured. Cannot generate meal plan.")
-        # Get the meal plan from the database
-        print(f'started meal generation')
-        meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(meal_plan_id)})
-        print(f'meal plan found {meal_plan}')
-        if not meal_plan:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,  
-                detail="Meal plan not found"
-            )
+def meal_plan_cache_key(meal_plan: Dict[str, Any]) -> str:
+    return f"{meal_plan['userId']}_{meal_plan['dietaryRestrictions']}_{meal_plan['dietaryPreferences']}_{meal_plan.get('cuisineTypes', [])}"
 
-        
-        # Get previous meal plans for context
-        previous_plans = await get_previous_meal_plans(meal_plan["userId"])
-        print(f'previous plan')
-        #check cache first
-        cache_key = f"{meal_plan['userId']}_{meal_plan['dietaryRestrictions']}_{meal_plan['dietaryPreferences']}_{meal_plan.get('cuisineTypes', [])}"
-        cached_result = get_cached_response(cache_key)
-        print(f'cached_result, {cached_result}')
+def requested_days(meal_plan: Dict[str, Any]) -> int:
+    # Convert string dates to datetime objects
+    start_date = datetime.fromisoformat(meal_plan.get('startDate')).date()
+    end_date = datetime.fromisoformat(meal_plan.get('endDate')).date()
+    return (end_date - start_date).days + 1
 
-        if cached_result:
-             
-             update_data = {
-                "status": "completed",
-                "mealPlan": cached_result,
-                "updatedAt": datetime.now().isoformat()
-             }
-             await db[settings.MEAL_PLAN_COLLECTION].update_one(
-                {"_id": ObjectId(meal_plan_id)},
-                {"$set": update_data}
-             )
-            # Notify client that meal plan is ready
-             updated_meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(meal_plan_id)})
-             if updated_meal_plan:
-                updated_meal_plan["_id"] = str(updated_meal_plan["_id"])
-                updated_meal_plan["userId"] = str(updated_meal_plan["userId"])
-                          
-             # Notify client that meal plan is ready with the complete data
-             await manager.send_message(
-                 {"type": "meal_plan_completed", "meal_plan_id": meal_plan_id, "meal_plan_data": updated_meal_plan},
-                 firebase_uid
-             )
-             return
+def build_meal_plan_messages(
+    meal_plan: Dict[str, Any],
+    user_profile: Dict[str, Any],
+    gaps: Optional[Dict[int, List[str]]] = None,
+    planned_meals: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Build the OpenAI messages for a meal plan document. Returns the messages
+    and the number of days requested. With `gaps` (day -> meal types) only
+    those meals are asked for; the rest of the plan is already assembled.
+    """
+    days_difference = requested_days(meal_plan)
 
+    #prepare prompt
+    # A few lines from the user's profile instead of their previous plans
+    previous_meals_context = profile.profile_context(user_profile)
 
-     # Rate limiting - ensure we don't exceed OpenAI's rate limits
-        global OPENAI_LAST_REQUEST_TIME
-        current_time = time.time()
-        time_since_last_request = current_time - OPENAI_LAST_REQUEST_TIME
-        
-        if time_since_last_request < (OPENAI_RATE_INTERVAL / OPENAI_RATE_LIMIT):
-            wait_time = (OPENAI_RATE_INTERVAL / OPENAI_RATE_LIMIT) - time_since_last_request
-            await asyncio.sleep(wait_time) 
-                        # Convert string dates to datetime objects
-        start_date = datetime.fromisoformat(meal_plan.get('startDate')).date()
-        end_date = datetime.fromisoformat(meal_plan.get('endDate')).date()
-        days_difference = (end_date - start_date).days + 1
-
-        #prepare prompt
-        print(f'preparing prompt')
-        previous_meals_context = ""
-        if previous_plans:
-            previous_meals_context = "Previous meal plans:\n"
-            for plan in previous_plans:
-                if "mealPlan" in plan and plan["mealPlan"]:
-                    previous_meals_context += json.dumps(plan["mealPlan"], indent=2) + "\n\n"
-             
-        meal_plan_schema = {
-            "type": "object",
-            "properties": {
-                "days": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "day": {"type": "integer"},
-                            "description": {"type": "string"},
-                            "meals": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "type": {"type": "string"},
-                                            "description": {"type": "string"},
-                                        "name": {"type": "string"},
-                                        "ingredients": {
-                                            "type": "array",
-                                            "items": {"type": "string"}
-                                        },
-                                        "recipe": {"type": "array", "items": {"type": "object", "properties": {"step": {"type": "string"}, "description": {"type": "string"}}, "required": ["type", "boolean"]}},
-                                        "nutritionalInfo": {
-                                            "type": "object",
-                                            "properties": {
-                                                "calories": {"type": "integer"},
-                                                "protein": {"type": "integer"},
-                                                "carbs": {"type": "integer"},
-                                                "fat": {"type": "integer"}
-                                            },
-                                            "required": ["calories", "protein", "carbs", "fat"]
-                                        }
+    meal_plan_schema = {
+        "type": "object",
+        "properties": {
+            "days": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "day": {"type": "integer"},
+                        "description": {"type": "string"},
+                        "meals": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "type": {"type": "string"},
+                                        "description": {"type": "string"},
+                                    "name": {"type": "string"},
+                                    "ingredients": {
+                                        "type": "array",
+                                        "items": {"type": "string"}
                                     },
-                                    "required": ["type", "name", "ingredients", "recipe", "nutritionalInfo"]
-                                }
+                                    "recipe": {"type": "array", "items": {"type": "object", "properties": {"step": {"type": "string"}, "description": {"type": "string"}}, "required": ["type", "boolean"]}},
+                                    "nutritionalInfo": {
+                                        "type": "object",
+                                        "properties": {
+                                            "calories": {"type": "integer"},
+                                            "protein": {"type": "integer"},
+                                            "carbs": {"type": "integer"},
+                                            "fat": {"type": "integer"}
+                                        },
+                                        "required": ["calories", "protein", "carbs", "fat"]
+                                    }
+                                },
+                                "required": ["type", "name", "ingredients", "recipe", "nutritionalInfo"]
                             }
-                        },
-                        "required": ["day", "meals"]
-                    }
+                        }
+                    },
+                    "required": ["day", "meals"]
                 }
-            },
-            "required": ["days"]
-        }
-                # System and user messages for the prompt
-        system_message = "You are a nutritionist and meal planning expert."
-        user_message = f"""
+            }
+        },
+        "required": ["days"]
+    }
+    # System and user messages for the prompt
+    system_message = "You are a nutritionist and meal planning expert."
+    user_message = f"""
 Generate a personalized meal plan for {days_difference} days. 
 Each day should have a description of the day and the meals for that day. Each day should contain meals for each meal type (breakfast, lunch, dinner, snack) included in the mealType array.
 Dietary preferences: {', '.join(meal_plan.get('dietaryPreferences', []))}
@@ -223,93 +179,705 @@ This meal is a traditional dish from the region of India and is a popular choice
 {previous_meals_context if previous_meals_context else ''}
 Respond with a complete meal plan in JSON format.
 """
- # Call OpenAI API to generate meal plan
-        OPENAI_LAST_REQUEST_TIME = time.time()
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                  {"role": "user", "content": system_message + "\n\nHere is the required JSON schema:\n" + json.dumps(meal_plan_schema, indent=2)},
-                {"role": "user", "content": user_message}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7,
-            max_tokens=4000
-        )   
+    if gaps:
+        missing = "\n".join(f"Day {day}: {', '.join(meal_types)}" for day, meal_types in sorted(gaps.items()))
+        user_message += f"""
+Some of the meals are already planned. Only generate the meals listed below, keeping these day numbers, and omit days that are not listed:
+{missing}
+Do not repeat any of the already planned meals: {', '.join(planned_meals or [])}
+"""
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": system_message + "\n\nHere is the required JSON schema:\n" + json.dumps(meal_plan_schema, indent=2)},
+        {"role": "user", "content": user_message}
+    ]
+    return messages, days_difference
 
-        # Parse the response and extract the meal plan data
-        response_content = response.choices[0].message.content
-        meal_plan_data = json.loads(response_content)
-              
-     
-        # Cache the result
-        cache_response(cache_key, meal_plan_data)
-        
-        # Update the meal plan in the database
-        update_data = {
-            "status": "completed",
-            "mealPlan": meal_plan_data,
-            "completedAt": datetime.now().isoformat()
-        }
-        print(f'response:{meal_plan_data}')
-        await db[settings.MEAL_PLAN_COLLECTION].update_one(
-            {"_id": ObjectId(meal_plan_id)},
-            {"$set": update_data}
+
+def build_regeneration_messages(meal_plan: Dict[str, Any], day: Dict[str, Any], meal_types: List[str], instructions: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Messages asking for new `meal_types` on one day of a generated plan. The
+    day's other meals and every meal name in the plan go in as constraints
+    instead of the whole plan.
+    """
+    kept = [meal for meal in day.get("meals") or [] if meal.get("type") not in meal_types]
+    kept_context = "\n".join(
+        f"- {meal.get('type')}: {meal.get('name')} ({(meal.get('nutritionalInfo') or {}).get('calories', 0)} kcal)" for meal in kept
+    )
+    planned = [meal.get("name") for plan_day in meal_plan["mealPlan"].get("days") or [] for meal in plan_day.get("meals") or []]
+    schema = {"type": "object", "properties": {"description": {"type": "string"}, "meals": {"type": "array", "items": MealItem.model_json_schema()}}, "required": ["meals"]}
+    user_message = f"""
+Replace the {', '.join(meal_types)} of day {day['day']} in an existing meal plan. Return exactly one meal per meal type listed, with a step by step recipe and ingredients with measurements.
+Dietary preferences: {', '.join(meal_plan.get('dietaryPreferences', []))}
+Cuisine types: {', '.join(meal_plan.get('cuisineTypes', []))}
+Complexity levels: {', '.join(meal_plan.get('complexityLevels', []))}
+Dietary restrictions: {', '.join(meal_plan.get('dietaryRestrictions', []))}
+"""
+    if kept_context:
+        user_message += f"The new meals must fit alongside the rest of the day:\n{kept_context}\n"
+    user_message += f"Do not repeat any meal already in the plan: {', '.join(planned)}\n"
+    if not kept:
+        user_message += "Include a brief description of the day.\n"
+    if instructions:
+        user_message += f"The user asked for: {instructions}\n"
+    return [
+        {"role": "system", "content": "You are a nutritionist and meal planning expert. Respond in JSON matching this schema:\n" + json.dumps(schema, separators=(",", ":"))},
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def regenerate_meals(
+    meal_plan_id: str,
+    day_number: int,
+    meal_types: Optional[List[str]],
+    instructions: Optional[str],
+    current_user: Dict[str, Any],
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Regenerate one day (`meal_types` None) or one meal of a plan and patch
+    it into the document in place. Returns the day, with its new description,
+    and the new meals.
+    """
+    try:
+        object_id = ObjectId(meal_plan_id)
+    except InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid meal plan ID format"
+        )
+    meal_plan = await lifecycle.find_one(
+        settings.MEAL_PLAN_COLLECTION,
+        {"_id": object_id, "userId": current_user["_id"]},
+        {"mealPlan": 1, "status": 1, "version": 1, **{field: 1 for field in CONSTRAINT_FIELDS}}
+    )
+    if not meal_plan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan not found or you don't have permission to access it"
+        )
+    if meal_plan.get("status") not in (jobs.COMPLETED, jobs.PARTIAL) or not meal_plan.get("mealPlan"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Meal plan has not been generated yet"
+        )
+    day = next((d for d in meal_plan["mealPlan"].get("days") or [] if d.get("day") == day_number), None)
+    existing_types = [meal.get("type") for meal in (day or {}).get("meals") or []]
+    whole_day = meal_types is None
+    if whole_day:
+        meal_types = existing_types or meal_plan.get("mealType") or []
+    if day is None or not meal_types or (not whole_day and meal_types[0] not in existing_types):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Day or meal not found in this meal plan"
+        )
+
+    response = await llm.complete("meal_regenerate", build_regeneration_messages(meal_plan, day, meal_types, instructions), current_user["firebaseUid"])
+    try:
+        data = json.loads(response.choices[0].message.content)
+        generated = [MealItem.model_validate(meal) for meal in data.get("meals") or []]
+    except (json.JSONDecodeError, ValidationError, AttributeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Genie returned an invalid meal: {e}"
+        ) from e
+    # One meal per requested type, in the order the day already had them
+    meals = []
+    for meal_type in meal_types:
+        meal = next((m for m in generated if m.type.lower() == meal_type.lower()), None)
+        if meal is None and not whole_day and len(generated) == 1:
+            meal = generated[0]
+        if meal is None:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Genie did not return a {meal_type}"
             )
-        updated_meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(meal_plan_id)})
-        if updated_meal_plan:
-            updated_meal_plan["_id"] = str(updated_meal_plan["_id"])
-            updated_meal_plan["userId"] = str(updated_meal_plan["userId"])
-         
+        meals.append({**meal.model_dump(), "type": meal_type})
+
+    # Patch only the regenerated slots; the shopping list is rebuilt on next read
+    if not whole_day:
+        # By position, so a day with two meals of this type keeps the other one
+        update = {"$set": {f"mealPlan.days.$[d].meals.{existing_types.index(meal_types[0])}": meals[0]}}
+        array_filters = [{"d.day": day_number}]
+    else:
+        update = {"$set": {"mealPlan.days.$[d].meals": meals}}
+        if data.get("description"):
+            update["$set"]["mealPlan.days.$[d].description"] = data["description"]
+        array_filters = [{"d.day": day_number}]
+    update["$set"]["updatedAt"] = datetime.now().isoformat()
+    update["$unset"] = {"shoppingList": ""}
+    # Only if the plan is as it was read; a position is meaningless otherwise
+    updated = await services.db[settings.MEAL_PLAN_COLLECTION].find_one_and_update(
+        {"_id": object_id, "userId": current_user["_id"], "version": meal_plan.get("version")},
+        with_version_bump(update),
+        array_filters=array_filters,
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Meal plan changed while regenerating; please try again"
+        )
+    invalidate_nutrition(current_user["_id"])
+
+    description = (data.get("description") if whole_day else None) or day.get("description")
+    replaced = [meal.get("name") for meal in day.get("meals") or [] if meal.get("type") in meal_types and meal.get("name")]
+    _, forgotten, sent = await asyncio.gather(
+        # The meals they replaced tell us what they didn't want
+        profile.record_replaced(current_user["_id"], replaced, instructions),
+        forget_meal_context(str(current_user["_id"]), meal_plan_id, day_number, meal_types),
+        # Connected clients patch their copy instead of refetching the plan
+        manager.send_message(
+            {
+                "type": "meal_plan_patched", "meal_plan_id": meal_plan_id, "version": updated.get("version", 0),
+                "day": day_number, "mealType": None if whole_day else meal_types[0],
+                "description": description, "meals": meals,
+            },
+            current_user["firebaseUid"]
+        ),
+        return_exceptions=True
+    )
+    if isinstance(forgotten, Exception):
+        logger.warning("Failed to clear meal chat context: %s", forgotten)
+    if isinstance(sent, Exception):
+        logger.warning("Failed to send websocket message: %s", sent)
+    return {**day, "description": description}, meals
+
+
+async def forget_meal_context(user_id: str, meal_plan_id: str, day_number: int, meal_types: List[str]) -> None:
+    """Drop the context cached on the chats about regenerated meals; the next message looks it up again"""
+    query = {"userId": user_id, "mealPlanId": meal_plan_id, "dayId": str(day_number)}
+    # An archived chat would bring the old context back when it is restored
+    for meal_type in meal_types:
+        await lifecycle.restore(settings.MEAL_CHAT_COLLECTION, {**query, "mealType": meal_type})
+    await services.db[settings.MEAL_CHAT_COLLECTION].update_many(
+        {**query, "mealType": {"$in": meal_types}},
+        {"$unset": {"mealContext": ""}}
+    )
+
+
+async def complete_meal_plan(meal_plan_id: str, firebase_uid: str, meal_plan_data: Dict[str, Any], days_requested: int, cache_key: Optional[str] = None) -> str:
+    """
+    Store generated plan data on a generating job and notify the client.
+    Returns the job's final status.
+    """
+    # A response with fewer days than requested is kept as a partial plan
+    # rather than thrown away
+    generated_days = len(meal_plan_data.get("days") or [])
+    if generated_days >= days_requested:
+        final_status, progress, error = jobs.COMPLETED, 100, None
+        # Cache the result
+        if cache_key:
+            cache_response(cache_key, meal_plan_data)
+    else:
+        final_status = jobs.PARTIAL
+        progress = int(generated_days / days_requested * 100)
+        error = f"Generated {generated_days} of {days_requested} days"
+
+    with stage("meal_plan.shopping_list"):
+        shopping_list = build_shopping_list(meal_plan_data)
+
+    # Update the meal plan in the database
+    await jobs.transition(
+        services.db[settings.MEAL_PLAN_COLLECTION], meal_plan_id, final_status, progress=progress, error=error,
+        extra={"mealPlan": meal_plan_data, "shoppingList": shopping_list, "completedAt": datetime.now().isoformat()}
+    )
+    updated_meal_plan = await services.db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(meal_plan_id)})
+    if updated_meal_plan:
+        invalidate_nutrition(updated_meal_plan["userId"])
+        await profile.record_plan_completed(updated_meal_plan["userId"], meal_plan_data)
+        updated_meal_plan["_id"] = str(updated_meal_plan["_id"])
+        updated_meal_plan["userId"] = str(updated_meal_plan["userId"])
+
+    try:
+        await manager.send_message(
+            {"type": "meal_plan_completed", "meal_plan_id": meal_plan_id, "meal_plan_data": updated_meal_plan},
+            firebase_uid
+        )
+    except Exception as e:
+        logger.warning("Failed to send websocket message: %s", e)
+    return final_status
+
+
+async def generate_without_llm(meal_plan_id: str, firebase_uid: str, meal_plan: Dict[str, Any], fallback: List[Dict[str, Any]], days_requested: int, error: llm.LLMUnavailableError) -> None:
+    """
+    The LLM is failing or its circuit is open. Serve the days the recipe
+    index filled as a partial plan, or put the job back in the queue for the
+    sweeper to retry once the provider recovers.
+    """
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    if fallback:
+        await complete_meal_plan(meal_plan_id, firebase_uid, merge_generated(fallback, {}, meal_plan["mealType"]), days_requested)
+        return
+    if meal_plan.get("attempts", 0) >= settings.JOB_MAX_ATTEMPTS:
+        raise error
+    if await jobs.transition(collection, meal_plan_id, jobs.QUEUED, error=str(error)):
+        await jobs.notify_progress(firebase_uid, meal_plan_id, jobs.QUEUED, 0, "Genie is busy right now; your plan will be retried shortly")
+
+
+async def generate_meal_plan(meal_plan_id: str, user_id: str, firebase_uid: str, ticket: Optional[Ticket] = None) -> None:
+    """
+    Background task to generate a meal plan using GPT. Releases the admission
+    `ticket` taken by the request that queued it once generation ends.
+    """
+    with bind(meal_plan_id):
         try:
-            await manager.send_message(
-                {"type": "meal_plan_completed", "meal_plan_id": meal_plan_id, "meal_plan_data": updated_meal_plan},
-                firebase_uid
+            await _generate_meal_plan(meal_plan_id, user_id, firebase_uid, ticket)
+        except asyncio.CancelledError:
+            # The worker is shutting down past its grace period; another worker picks the job up
+            await jobs.release(services.db[settings.MEAL_PLAN_COLLECTION], meal_plan_id)
+            logger.info("Released meal plan job on shutdown")
+            raise
+
+
+async def _generate_meal_plan(meal_plan_id: str, user_id: str, firebase_uid: str, ticket: Optional[Ticket] = None) -> None:
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    try:
+        # Claim the job; the sweeper or another worker may already own it
+        if not await jobs.transition(collection, meal_plan_id, jobs.GENERATING, progress=10):
+            return
+        if not services.openai:
+            raise Exception("OpenAI API key not configured. Cannot generate meal plan.")
+        # Get the meal plan and the user's profile from the database; neither waits on the other
+        _, meal_plan, user_profile = await asyncio.gather(
+            jobs.notify_progress(firebase_uid, meal_plan_id, jobs.GENERATING, 10),
+            collection.find_one({"_id": ObjectId(meal_plan_id)}),
+            get_user_profile(user_id),
+        )
+        if not meal_plan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,  
+                detail="Meal plan not found"
             )
-            print(f'Websocket messae sent successfully')
-        except Exception as e:
-            print(f'Failed to send websocket message: {e}')
+        # Lets benchmarks/replay.py issue the same request again offline
+        record("meal_plan", request={field: meal_plan.get(field) for field in CONSTRAINT_FIELDS})
+
+        #check cache first
+        with stage("meal_plan.cache_lookup"):
+            cache_key = meal_plan_cache_key(meal_plan)
+            cached_result = get_cached_response(cache_key)
+        CACHE_LOOKUPS.inc(cache="meal_plan", result="hit" if cached_result else "miss")
+
+        if cached_result:
+             await jobs.transition(
+                collection, meal_plan_id, jobs.COMPLETED, progress=100,
+                extra={"mealPlan": cached_result, "shoppingList": build_shopping_list(cached_result), "completedAt": datetime.now().isoformat()}
+             )
+             invalidate_nutrition(meal_plan["userId"])
+             await profile.record_plan_completed(meal_plan["userId"], cached_result)
+            # Notify client that meal plan is ready
+             updated_meal_plan = await services.db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": ObjectId(meal_plan_id)})
+             if updated_meal_plan:
+                updated_meal_plan["_id"] = str(updated_meal_plan["_id"])
+                updated_meal_plan["userId"] = str(updated_meal_plan["userId"])
+                          
+             # Notify client that meal plan is ready with the complete data
+             await manager.send_message(
+                 {"type": "meal_plan_completed", "meal_plan_id": meal_plan_id, "meal_plan_data": updated_meal_plan},
+                 firebase_uid
+             )
+             return
+
+
+        # Assemble what we can from meals of other completed plans
+        days_requested = requested_days(meal_plan)
+        assembled, gaps = None, None
+        # Whole days the index could fill, served if the LLM is unavailable
+        fallback = []
+        if settings.RECIPE_INDEX_ENABLED:
+            with stage("meal_plan.recipe_index"):
+                recipe_index.refresh(collection)
+                recent_meals = (user_profile.get("recentMeals") or []) + (user_profile.get("dislikedMeals") or [])
+                assembled, gaps = recipe_index.assemble(meal_plan, days_requested, recent_meals)
+            slots = days_requested * len(meal_plan.get("mealType") or [])
+            filled = slots - sum(len(meal_types) for meal_types in gaps.values())
+            fallback = [day for day in assembled if day["meals"] and day["day"] not in gaps]
+            if slots and not gaps:
+                CACHE_LOOKUPS.inc(cache="recipe_index", result="hit")
+                await complete_meal_plan(meal_plan_id, firebase_uid, merge_generated(assembled, {}, meal_plan["mealType"]), days_requested)
+                return
+            if not slots or filled / slots < settings.RECIPE_INDEX_MIN_COVERAGE:
+                CACHE_LOOKUPS.inc(cache="recipe_index", result="miss")
+                assembled, gaps = None, None
+            else:
+                CACHE_LOOKUPS.inc(cache="recipe_index", result="partial")
+
+     # Rate limiting - ensure we don't exceed OpenAI's rate limits
+        global OPENAI_LAST_REQUEST_TIME
+        current_time = time.time()
+        time_since_last_request = current_time - OPENAI_LAST_REQUEST_TIME
+        
+        if time_since_last_request < (OPENAI_RATE_INTERVAL / OPENAI_RATE_LIMIT):
+            wait_time = (OPENAI_RATE_INTERVAL / OPENAI_RATE_LIMIT) - time_since_last_request
+            await asyncio.sleep(wait_time) 
+        with stage("meal_plan.prompt_build"):
+            planned_meals = [meal["name"] for day in assembled or [] for meal in day["meals"]]
+            messages, days_difference = build_meal_plan_messages(meal_plan, user_profile, gaps, planned_meals)
+        await jobs.heartbeat(collection, meal_plan_id, 30)
+        await jobs.notify_progress(firebase_uid, meal_plan_id, jobs.GENERATING, 30)
+
+        # Call OpenAI API to generate meal plan
+        OPENAI_LAST_REQUEST_TIME = time.time()
+        try:
+            response = await llm.complete("meal_plan_chunk" if gaps else "meal_plan", messages, firebase_uid)
+        except llm.LLMUnavailableError as e:
+            await generate_without_llm(meal_plan_id, firebase_uid, meal_plan, fallback, days_requested, e)
+            return
+
+        # Parse the response and extract the meal plan data
+        with stage("meal_plan.json_parse"):
+            response_content = response.choices[0].message.content
+            meal_plan_data = json.loads(response_content)
+            if gaps:
+                meal_plan_data = merge_generated(assembled, meal_plan_data, meal_plan["mealType"])
+
+        await complete_meal_plan(meal_plan_id, firebase_uid, meal_plan_data, days_difference, cache_key)
 
     except Exception as e:
-            # Update database with error status
+            # Keep the document so clients and the sweeper can see why it failed
             try:
-                await db[settings.MEAL_PLAN_COLLECTION].delete_one(
-                    {"_id": ObjectId(meal_plan_id)},
-                   
-                )
+                await jobs.transition(collection, meal_plan_id, jobs.FAILED, error=str(e))
             except Exception as db_error:
-                print(f"Failed to update meal plan with error status: {db_error}")
-            
-            print(f"Error generating meal plan: {e}")   
+                logger.error("Failed to update meal plan with error status: %s", db_error)
+            try:
+                await manager.send_message(
+                    {"type": "meal_plan_error", "meal_plan_id": meal_plan_id, "error": str(e)},
+                    firebase_uid
+                )
+            except Exception as ws_error:
+                logger.warning("Failed to send websocket message: %s", ws_error)
+
+            logger.exception("Error generating meal plan")
+    finally:
+        if ticket:
+            ticket.release()
         
 
+def new_meal_plan_document(meal_plan: MealPlanCreate, current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the queued job document stored for a meal plan request"""
+    # Convert meal plan to dict and add user ID
+    meal_plan_dict = meal_plan.dict()
+    if isinstance(meal_plan_dict.get("startDate"), date):
+        meal_plan_dict["startDate"] = meal_plan_dict["startDate"].isoformat()
+    if isinstance(meal_plan_dict.get("endDate"), date):
+        meal_plan_dict["endDate"] = meal_plan_dict["endDate"].isoformat()
+
+    now = datetime.now().isoformat()
+    meal_plan_dict["userId"] = current_user["_id"]
+    meal_plan_dict["status"] = jobs.QUEUED
+    meal_plan_dict["progress"] = 0
+    meal_plan_dict["attempts"] = 0
+    meal_plan_dict["stageTimestamps"] = {jobs.QUEUED: now}
+    meal_plan_dict["createdAt"] = now
+    meal_plan_dict["expiresAt"] = jobs.expires_at(jobs.QUEUED)
+    meal_plan_dict["firebaseUid"] = current_user["firebaseUid"]
+    return meal_plan_dict
+
+CONSTRAINT_FIELDS = ("startDate", "endDate", "mealType", "dietaryPreferences", "cuisineTypes", "complexityLevels", "dietaryRestrictions")
+
+def constraint_key(meal_plan: Dict[str, Any]) -> str:
+    """Identity of a request's constraints, ignoring list order"""
+    return json.dumps(
+        {field: sorted(value) if isinstance(value, list) else value for field, value in ((f, meal_plan.get(f)) for f in CONSTRAINT_FIELDS)},
+        sort_keys=True
+    )
+
+async def get_batch_status(batch_id: str, user_id) -> Optional[Dict[str, Any]]:
+    """Aggregate the status counts and mean progress of a batch in one query"""
+    groups = await services.db[settings.MEAL_PLAN_COLLECTION].aggregate([
+        {"$match": {"batchId": batch_id, "userId": user_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "progress": {"$sum": "$progress"}}}
+    ]).to_list(None)
+    if not groups:
+        return None
+    total = sum(group["count"] for group in groups)
+    return {
+        "batchId": batch_id,
+        "total": total,
+        "counts": {group["_id"]: group["count"] for group in groups},
+        "progress": int(sum(group["progress"] or 0 for group in groups) / total),
+    }
+
+async def notify_batch_progress(batch_id: str, user_id, firebase_uid: str) -> None:
+    batch_status = await get_batch_status(batch_id, user_id)
+    if batch_status:
+        try:
+            await manager.send_message({"type": "meal_plan_batch_progress", **batch_status}, firebase_uid)
+        except Exception as e:
+            logger.warning("Failed to send websocket message: %s", e)
+
+async def copy_plan_to_followers(leader_id: str, follower_ids: List[str]) -> None:
+    """Give plans with the same constraints as `leader_id` its generated result"""
+    if not follower_ids:
+        return
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    leader = await collection.find_one(
+        {"_id": ObjectId(leader_id)},
+        {"userId": 1, "status": 1, "mealPlan": 1, "shoppingList": 1, "progress": 1, "error": 1}
+    )
+    if not leader or leader["status"] not in (jobs.COMPLETED, jobs.PARTIAL, jobs.FAILED):
+        # Still owned by another worker; the sweeper will pick the followers up
+        return
+    extra = {"completedAt": datetime.now().isoformat()}
+    if leader.get("mealPlan"):
+        extra["mealPlan"] = leader["mealPlan"]
+    if leader.get("shoppingList"):
+        extra["shoppingList"] = leader["shoppingList"]
+    await jobs.transition_many(collection, follower_ids, jobs.GENERATING)
+    await jobs.transition_many(collection, follower_ids, leader["status"], progress=leader.get("progress"), error=leader.get("error"), extra=extra)
+    invalidate_nutrition(leader["userId"])
+
+async def generate_meal_plan_batch(batch_id: str, groups: List[List[str]], user_id, firebase_uid: str, ticket: Optional[Ticket] = None) -> None:
+    """
+    Background task generating every distinct request of a batch with bounded
+    concurrency. Each group shares one generation, copied to the rest.
+    """
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    semaphore = asyncio.Semaphore(settings.BATCH_GENERATION_CONCURRENCY)
+
+    async def run_group(meal_plan_ids: List[str]) -> None:
+        async with semaphore:
+            await generate_meal_plan(meal_plan_ids[0], user_id, firebase_uid)
+        await copy_plan_to_followers(meal_plan_ids[0], meal_plan_ids[1:])
+        await notify_batch_progress(batch_id, user_id, firebase_uid)
+
+    async def keep_alive() -> None:
+        # Plans waiting on the semaphore are not stale; the sweeper leaves them alone
+        while True:
+            try:
+                await jobs.heartbeat_batch(collection, batch_id)
+            except Exception as e:
+                logger.warning("Failed to heartbeat batch: %s", e, extra={"batch": batch_id})
+            await asyncio.sleep(settings.JOB_STALE_AFTER_SECONDS / 3)
+
+    keeper = asyncio.create_task(keep_alive())
+    try:
+        await asyncio.gather(*(run_group(group) for group in groups))
+    finally:
+        keeper.cancel()
+        if ticket:
+            ticket.release()
+
+async def resume_meal_plan(meal_plan_id: str, user_id: str, firebase_uid: str) -> None:
+    """
+    The sweeper's way back into generation. A batch follower only ever gets
+    its leader's result (a no-op while the leader is still running); a
+    leader is generated and then copied to its waiting followers.
+    """
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    doc = await collection.find_one({"_id": ObjectId(meal_plan_id)}, {"batchLeaderId": 1, "batchId": 1})
+    if (doc or {}).get("batchLeaderId"):
+        await copy_plan_to_followers(doc["batchLeaderId"], [meal_plan_id])
+        return
+    await generate_meal_plan(meal_plan_id, user_id, firebase_uid)
+    if (doc or {}).get("batchId"):
+        followers = await collection.find(
+            {"batchLeaderId": meal_plan_id, "status": {"$in": [jobs.QUEUED, jobs.PENDING]}}, {"_id": 1}
+        ).to_list(None)
+        await copy_plan_to_followers(meal_plan_id, [str(f["_id"]) for f in followers])
+
+async def submit_openai_batch(batch_id: str, leader_ids: List[str], user_id, firebase_uid: str, ticket: Optional[Ticket] = None) -> None:
+    """
+    Submit a batch's distinct requests to the OpenAI batch API and start
+    polling for the results. The admission ticket is released once submitted,
+    since the provider does the work offline.
+    """
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    try:
+        leaders = await collection.find({"_id": {"$in": [ObjectId(i) for i in leader_ids]}}).to_list(None)
+        user_profile = await get_user_profile(user_id)
+        plan_route = llm.route("meal_plan")
+        lines = []
+        for leader in leaders:
+            messages, _ = build_meal_plan_messages(leader, user_profile)
+            lines.append(json.dumps({
+                "custom_id": str(leader["_id"]),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": plan_route["model"], "messages": messages, **plan_route["params"]}
+            }))
+        input_file = await services.openai.files.create(file=(f"meal-plans-{batch_id}.jsonl", "\n".join(lines).encode()), purpose="batch")
+        openai_batch = await services.openai.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+        await collection.update_many({"batchId": batch_id}, {"$set": {"openaiBatchId": openai_batch.id}})
+        _spawn_background(poll_openai_batch(openai_batch.id, user_id, firebase_uid))
+    except Exception as e:
+        logger.warning("Failed to submit OpenAI batch, generating directly: %s", e, extra={"batch": batch_id})
+        groups = await _batch_groups(batch_id)
+        _spawn_background(generate_meal_plan_batch(batch_id, groups, user_id, firebase_uid))
+    finally:
+        if ticket:
+            ticket.release()
+
+async def _batch_groups(batch_id: str) -> List[List[str]]:
+    """Rebuild leader-first groups of a batch from the stored leader links"""
+    docs = await services.db[settings.MEAL_PLAN_COLLECTION].find(
+        {"batchId": batch_id, "status": {"$in": [jobs.QUEUED, jobs.PENDING]}},
+        {"_id": 1, "batchLeaderId": 1}
+    ).to_list(None)
+    groups: Dict[str, List[str]] = {}
+    for doc in docs:
+        leader_id = doc.get("batchLeaderId") or str(doc["_id"])
+        group = groups.setdefault(leader_id, [leader_id])
+        if str(doc["_id"]) != leader_id:
+            group.append(str(doc["_id"]))
+    return list(groups.values())
+
+async def generate_openai_batch_directly(openai_batch_id: str, user_id, firebase_uid: str) -> None:
+    """Take a batch's plans back from the OpenAI batch API and generate them here"""
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    doc = await collection.find_one({"openaiBatchId": openai_batch_id}, {"batchId": 1})
+    if not doc:
+        return
+    # From here the sweeper owns the plans again should this worker die
+    await collection.update_many({"openaiBatchId": openai_batch_id}, {"$unset": {"openaiBatchId": ""}})
+    groups = await _batch_groups(doc["batchId"])
+    await generate_meal_plan_batch(doc["batchId"], groups, user_id, firebase_uid)
+
+async def poll_openai_batch(openai_batch_id: str, user_id, firebase_uid: str) -> None:
+    """Wait for an OpenAI batch to finish and apply its results to the plans"""
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    while True:
+        try:
+            openai_batch = await services.openai.batches.retrieve(openai_batch_id)
+            if openai_batch.status in ("completed", "failed", "expired", "cancelled"):
+                break
+        except llm.RETRIABLE_ERRORS as e:
+            # The batch keeps running on OpenAI's side; just poll again later
+            logger.warning("Failed to poll OpenAI batch %s: %s", openai_batch_id, e)
+        except Exception as e:
+            # Polling again would fail the same way; don't leave the plans queued until they expire
+            logger.error("Cannot poll OpenAI batch %s, generating directly: %s", openai_batch_id, e)
+            await generate_openai_batch_directly(openai_batch_id, user_id, firebase_uid)
+            return
+        await asyncio.sleep(settings.OPENAI_BATCH_POLL_SECONDS)
+
+    docs = await collection.find(
+        {"openaiBatchId": openai_batch_id},
+        {"_id": 1, "batchId": 1, "batchLeaderId": 1, "startDate": 1, "endDate": 1, "userId": 1, "dietaryRestrictions": 1, "dietaryPreferences": 1, "cuisineTypes": 1}
+    ).to_list(None)
+    results: Dict[str, Dict[str, Any]] = {}
+    if openai_batch.status == "completed" and openai_batch.output_file_id:
+        content = await services.openai.files.content(openai_batch.output_file_id)
+        for line in content.text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                results[entry["custom_id"]] = entry
+
+    for doc in docs:
+        if doc.get("batchLeaderId"):
+            continue
+        meal_plan_id = str(doc["_id"])
+        followers = [str(d["_id"]) for d in docs if d.get("batchLeaderId") == meal_plan_id]
+        try:
+            entry = results.get(meal_plan_id)
+            if not entry or entry.get("error") or not entry.get("response"):
+                raise Exception(f"OpenAI batch {openai_batch.status}: no result for this plan")
+            body = entry["response"]["body"]
+            meal_plan_data = json.loads(body["choices"][0]["message"]["content"])
+            await jobs.transition(collection, meal_plan_id, jobs.GENERATING)
+            start_date = datetime.fromisoformat(doc["startDate"]).date()
+            end_date = datetime.fromisoformat(doc["endDate"]).date()
+            await complete_meal_plan(meal_plan_id, firebase_uid, meal_plan_data, (end_date - start_date).days + 1, meal_plan_cache_key(doc))
+            await admission.record_tokens(firebase_uid, (body.get("usage") or {}).get("total_tokens", 0))
+        except Exception as e:
+            await jobs.transition(collection, meal_plan_id, jobs.FAILED, error=str(e))
+        await copy_plan_to_followers(meal_plan_id, followers)
+    if docs:
+        await notify_batch_progress(docs[0]["batchId"], user_id, firebase_uid)
+
+# Strong references to detached background work so it is not garbage collected
+_background_tasks = set()
+
+def _spawn_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_job_sweeper: Optional[asyncio.Task] = None
+
+async def start_job_sweeper():
+    """Requeue generations orphaned by crashed or restarted workers; called from the app lifespan"""
+    global _job_sweeper
+    _job_sweeper = asyncio.create_task(jobs.run_sweeper(services.db[settings.MEAL_PLAN_COLLECTION], resume_meal_plan))
+    # Resume polling OpenAI batches submitted before a restart
+    if services.openai:
+        pending_batches = await services.db[settings.MEAL_PLAN_COLLECTION].find(
+            {"openaiBatchId": {"$exists": True}, "batchLeaderId": {"$exists": False}, "status": jobs.QUEUED},
+            {"openaiBatchId": 1, "userId": 1, "firebaseUid": 1}
+        ).to_list(None)
+        for openai_batch_id, doc in {d["openaiBatchId"]: d for d in pending_batches}.items():
+            _spawn_background(poll_openai_batch(openai_batch_id, doc["userId"], doc["firebaseUid"]))
+
+async def stop_job_sweeper():
+    """
+    Stop the sweeper and requeue the jobs it relaunched here. OpenAI batch
+    polls are just cancelled; start_job_sweeper resumes them on the next
+    worker to start.
+    """
+    if _job_sweeper:
+        _job_sweeper.cancel()
+    await jobs.drain_relaunched_jobs(settings.JOB_RELEASE_TIMEOUT_SECONDS)
+    await jobs.cancel_and_wait(list(_background_tasks), settings.JOB_RELEASE_TIMEOUT_SECONDS)
+
+
+async def pregenerate_meal_plan(predicted: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Generate a plan the pre-generator expects a user to request. Tokens come
+    out of the pre-generation budget rather than the user's daily quota.
+    """
+    user_profile = await get_user_profile(predicted["userId"])
+    messages, days_requested = build_meal_plan_messages(predicted, user_profile)
+    response = await llm.complete("meal_plan", messages)
+    meal_plan_data = json.loads(response.choices[0].message.content)
+    # Only whole plans are worth handing out instantly
+    if len(meal_plan_data.get("days") or []) < days_requested:
+        raise ValueError(f"Generated {len(meal_plan_data.get('days') or [])} of {days_requested} days")
+    return meal_plan_data, getattr(response.usage, "total_tokens", 0) or 0
+
+
+def start_plan_pregenerator():
+    """Generate likely next-week plans off-peak; called from the app lifespan"""
+    start_pregenerator(pregenerate_meal_plan)
+
+
+async def stop_plan_pregenerator():
+    await stop_pregenerator()
+
+
 @router.post("/", response_model=MealPlanResponse)
 async def create_meal_plan(meal_plan: MealPlanCreate, background_tasks: BackgroundTasks, current_user = Depends(get_current_user)):
     """
     Create a new meal plan for the authenticated user
     """
+    # Rejects with 429 before any work is done if the user is over their limits
+    ticket = await admission.admit(current_user, "generation")
     try:
-        # Convert meal plan to dict and add user ID
-        meal_plan_dict = meal_plan.dict()
-        if isinstance(meal_plan_dict.get("startDate"), date):
-            meal_plan_dict["startDate"] = meal_plan_dict["startDate"].isoformat()
-        if isinstance(meal_plan_dict.get("endDate"), date):
-            meal_plan_dict["endDate"] = meal_plan_dict["endDate"].isoformat()
-
-
-        meal_plan_dict["userId"] = current_user["_id"]
-        meal_plan_dict["status"] = "pending"
-        meal_plan_dict["createdAt"] = datetime.now().isoformat()
-        meal_plan_dict["firebaseUid"] = current_user["firebaseUid"]
-        
+        meal_plan_dict = new_meal_plan_document(meal_plan, current_user)
+
+        # A plan generated off-peak for exactly this request completes it at once
+        days_requested = requested_days(meal_plan_dict)
+        pregenerated = await take_pregenerated(current_user["_id"], meal_plan_dict, days_requested)
+        CACHE_LOOKUPS.inc(cache="pregenerated", result="hit" if pregenerated else "miss")
+
         # Insert into database
-        result = await db[settings.MEAL_PLAN_COLLECTION].insert_one(meal_plan_dict)
-        
-        # Trigger background task for meal plan generation
-        background_tasks.add_task(generate_meal_plan, str(result.inserted_id), current_user["_id"], current_user["firebaseUid"])
+        result = await services.db[settings.MEAL_PLAN_COLLECTION].insert_one(meal_plan_dict)
+        after_response(background_tasks, profile.record_plan_request, current_user["_id"], meal_plan_dict)
+
+        if pregenerated:
+            await jobs.transition(services.db[settings.MEAL_PLAN_COLLECTION], str(result.inserted_id), jobs.GENERATING, progress=90)
+            await complete_meal_plan(str(result.inserted_id), current_user["firebaseUid"], pregenerated, days_requested)
+            ticket.release()
+        else:
+            # Trigger background task for meal plan generation
+            background_tasks.add_task(generate_meal_plan, str(result.inserted_id), current_user["_id"], current_user["firebaseUid"], ticket)
         
-        # Return the created meal plan
-        created_meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": result.inserted_id})
+        # Return the created meal plan; unless it was completed above, it is exactly what was inserted
+        if pregenerated:
+            created_meal_plan = await services.db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": result.inserted_id})
+        else:
+            created_meal_plan = {**meal_plan_dict, "_id": result.inserted_id}
         if not created_meal_plan:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
@@ -320,20 +888,96 @@ async def create_meal_plan(meal_plan: MealPlanCreate, background_tasks: Backgrou
         created_meal_plan["userId"] = str(created_meal_plan["userId"])
         return created_meal_plan
     except Exception as e:
+        ticket.release()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create meal plan: {str(e)}"
         ) from e
 
+@router.post("/batch", response_model=MealPlanBatchResponse)
+async def create_meal_plan_batch(batch: MealPlanBatchCreate, background_tasks: BackgroundTasks, current_user = Depends(get_current_user)):
+    """
+    Create many meal plans in one request. Requests with identical constraints
+    are generated once and share the result.
+    """
+    ticket = await admission.admit(current_user, "generation")
+    try:
+        batch_id = str(ObjectId())
+        documents = []
+        groups: Dict[str, List[str]] = {}
+        for item in batch.items:
+            document = new_meal_plan_document(item, current_user)
+            document["_id"] = ObjectId()
+            document["batchId"] = batch_id
+            group = groups.setdefault(constraint_key(document), [])
+            if group:
+                document["batchLeaderId"] = group[0]
+            group.append(str(document["_id"]))
+            documents.append(document)
+
+        await services.db[settings.MEAL_PLAN_COLLECTION].insert_many(documents)
+        for document in documents:
+            after_response(background_tasks, profile.record_plan_request, current_user["_id"], document)
+
+        if batch.useBatchApi and services.openai:
+            leader_ids = [group[0] for group in groups.values()]
+            background_tasks.add_task(submit_openai_batch, batch_id, leader_ids, current_user["_id"], current_user["firebaseUid"], ticket)
+        else:
+            background_tasks.add_task(generate_meal_plan_batch, batch_id, list(groups.values()), current_user["_id"], current_user["firebaseUid"], ticket)
+
+        return {
+            "batchId": batch_id,
+            "mealPlanIds": [str(document["_id"]) for document in documents],
+            "uniqueRequests": len(groups),
+        }
+    except Exception as e:
+        ticket.release()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create meal plan batch: {str(e)}"
+        ) from e
+
+@router.get("/batch/{batch_id}", response_model=MealPlanBatchStatus)
+async def get_meal_plan_batch(batch_id: str, current_user = Depends(get_current_user)):
+    """
+    Get aggregated progress for a batch of meal plans
+    """
+    batch_status = await get_batch_status(batch_id, current_user["_id"])
+    if not batch_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found or you don't have permission to access it"
+        )
+    return batch_status
+
+@router.get("/nutrition", response_model=NutritionSummary)
+async def get_nutrition(
+    limit: int = Query(20, ge=1, le=100),
+    window: int = Query(7, ge=1, le=90),
+    current_user = Depends(get_current_user)
+):
+    """
+    Get daily, per-plan and overall nutrition totals, macro ratios and a
+    rolling daily average over the user's latest `limit` meal plans
+    """
+    try:
+        return await get_nutrition_summary(services.db[settings.MEAL_PLAN_COLLECTION], current_user["_id"], limit, window)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get nutrition summary: {str(e)}"
+        ) from e
+
 @router.get("/", response_model=List[MealPlanResponse])
 async def get_user_meal_plans(current_user = Depends(get_current_user)):
     """
     Get all meal plans for the authenticated user
     """
     try:
-        meal_plans = await db[settings.MEAL_PLAN_COLLECTION].find(
-            {"userId": current_user["_id"], "status": "completed"}
-        ).to_list(100)
+        query = {"userId": current_user["_id"], "status": {"$in": [jobs.COMPLETED, jobs.PARTIAL]}}
+        meal_plans = await services.db[settings.MEAL_PLAN_COLLECTION].find(query).to_list(100)
+        # Old plans move to the archive but stay listed; opening one restores it
+        meal_plans += await lifecycle.find_archived(settings.MEAL_PLAN_COLLECTION, query, "createdAt", 100 - len(meal_plans))
         for plan in meal_plans:
             plan["_id"] = str(plan["_id"])
             plan["userId"] = str(plan["userId"])
@@ -344,10 +988,16 @@ async def get_user_meal_plans(current_user = Depends(get_current_user)):
             detail=f"Failed to get meal plans: {str(e)}"
         ) from e
 
+def _plan_response(meal_plan: Dict[str, Any]) -> Dict[str, Any]:
+    meal_plan["_id"] = str(meal_plan["_id"])
+    meal_plan["userId"] = str(meal_plan["userId"])
+    return meal_plan
+
 @router.get("/{meal_plan_id}", response_model=MealPlanResponse)
-async def get_meal_plan(meal_plan_id: str, current_user = Depends(get_current_user)):
+async def get_meal_plan(meal_plan_id: str, request: Request, current_user = Depends(get_current_user)):
     """
-    Get a specific meal plan by ID for the authenticated user
+    Get a specific meal plan by ID for the authenticated user. Answers
+    If-None-Match with 304 when the client already has this version.
     """
     try:
             # Convert string ID to ObjectId
@@ -358,18 +1008,17 @@ async def get_meal_plan(meal_plan_id: str, current_user = Depends(get_current_us
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid meal plan ID format"
                 ) 
-            meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one(
-                {"_id": object_id, "userId": current_user["_id"]}
-            )
-            if not meal_plan:
+            query = {"_id": object_id, "userId": current_user["_id"]}
+            collection = services.db[settings.MEAL_PLAN_COLLECTION]
+            response = await conditional_get(request, "meal_plan", collection, query, MealPlanResponse, _plan_response)
+            if response is None and await lifecycle.restore(settings.MEAL_PLAN_COLLECTION, query):
+                response = await conditional_get(request, "meal_plan", collection, query, MealPlanResponse, _plan_response)
+            if response is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, 
                     detail="Meal plan not found or you don't have permission to access it"
                 )
-                        # Convert ObjectId to strings
-            meal_plan["_id"] = str(meal_plan["_id"])
-            meal_plan["userId"] = str(meal_plan["userId"])
-            return meal_plan
+            return response
     except HTTPException:
             raise
     except Exception as e:
@@ -379,10 +1028,75 @@ async def get_meal_plan(meal_plan_id: str, current_user = Depends(get_current_us
             ) from e
     
 
+@router.get("/{meal_plan_id}/status", response_model=MealPlanStatus)
+async def get_meal_plan_status(meal_plan_id: str, current_user = Depends(get_current_user)):
+    """
+    Get the generation state of a meal plan without loading the plan itself
+    """
+    try:
+        object_id = ObjectId(meal_plan_id)
+    except InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid meal plan ID format"
+        )
+    job = await lifecycle.find_one(
+        settings.MEAL_PLAN_COLLECTION,
+        {"_id": object_id, "userId": current_user["_id"]},
+        {"status": 1, "progress": 1, "attempts": 1, "error": 1, "stageTimestamps": 1}
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan not found or you don't have permission to access it"
+        )
+    job["_id"] = str(job["_id"])
+    return job
+
+
+@router.get("/{meal_plan_id}/shopping-list", response_model=ShoppingList)
+async def get_shopping_list(meal_plan_id: str, current_user = Depends(get_current_user)):
+    """
+    Get the aggregated shopping list of a meal plan. It is computed when the
+    plan completes; plans generated before that are backfilled on first read.
+    """
+    try:
+        object_id = ObjectId(meal_plan_id)
+    except InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid meal plan ID format"
+        )
+    collection = services.db[settings.MEAL_PLAN_COLLECTION]
+    meal_plan = await lifecycle.find_one(
+        settings.MEAL_PLAN_COLLECTION,
+        {"_id": object_id, "userId": current_user["_id"]},
+        {"shoppingList": 1}
+    )
+    if not meal_plan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan not found or you don't have permission to access it"
+        )
+    shopping_list = meal_plan.get("shoppingList")
+    if shopping_list is None:
+        # Only the ingredient lines are needed to build the list
+        ingredients = await collection.find_one({"_id": object_id}, {"mealPlan.days.meals.ingredients": 1})
+        if not (ingredients or {}).get("mealPlan"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Meal plan has not been generated yet"
+            )
+        shopping_list = build_shopping_list(ingredients["mealPlan"])
+        await collection.update_one({"_id": object_id}, {"$set": {"shoppingList": shopping_list}})
+    return {"mealPlanId": meal_plan_id, "items": shopping_list["items"]}
+
+
 @router.post("/{meal_plan_id}/favorite", response_model=MealPlanResponse)
 async def toggle_favorite_day(
     meal_plan_id: str, 
     data: dict,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user)
 ):
     """
@@ -399,8 +1113,8 @@ async def toggle_favorite_day(
             ) 
         
         # Find the meal plan
-        meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one(
-            {"_id": object_id, "userId": current_user["_id"]}
+        meal_plan = await lifecycle.find_one(
+            settings.MEAL_PLAN_COLLECTION, {"_id": object_id, "userId": current_user["_id"]}
         )
         
         if not meal_plan:
@@ -422,19 +1136,24 @@ async def toggle_favorite_day(
         # Update the meal plan
         if "mealPlan" in meal_plan and "days" in meal_plan["mealPlan"]:
             days = meal_plan["mealPlan"]["days"]
+            toggled = None
             for i, day in enumerate(days):
                 if str(day["day"]) == day_id:
+                    if bool(day.get("isFavorite")) != bool(is_favorite):
+                        toggled = day
                     meal_plan["mealPlan"]["days"][i]["isFavorite"] = is_favorite
                     break
             
-            # Save the updated meal plan
-            await db[settings.MEAL_PLAN_COLLECTION].update_one(
+            # Save the updated meal plan and return it in the same round trip
+            updated_meal_plan = await services.db[settings.MEAL_PLAN_COLLECTION].find_one_and_update(
                 {"_id": object_id},
-                {"$set": {"mealPlan": meal_plan["mealPlan"]}}
+                with_version_bump({"$set": {"mealPlan": meal_plan["mealPlan"], "updatedAt": datetime.now().isoformat()}}),
+                return_document=ReturnDocument.AFTER
             )
+            # Only a change of status counts, so repeated toggles don't inflate likes
+            if toggled:
+                after_response(background_tasks, profile.record_favorite, current_user["_id"], toggled, bool(is_favorite))
             
-            # Return the updated meal plan
-            updated_meal_plan = await db[settings.MEAL_PLAN_COLLECTION].find_one({"_id": object_id})
             if updated_meal_plan:
                 updated_meal_plan["_id"] = str(updated_meal_plan["_id"])
                 updated_meal_plan["userId"] = str(updated_meal_plan["userId"])
@@ -451,4 +1170,46 @@ async def toggle_favorite_day(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update favorite status: {str(e)}"
-        ) from e
\ No newline at end of file
+        ) from e
+
+
+@router.post("/{meal_plan_id}/days/{day}/regenerate", response_model=MealDay)
+async def regenerate_day(
+    meal_plan_id: str,
+    day: int,
+    data: Optional[MealRegenerateRequest] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    Replace every meal of one day, keeping the rest of the plan
+    """
+    # A short interactive completion, admitted like a chat turn
+    ticket = await admission.admit(current_user, "chat")
+    try:
+        existing, meals = await regenerate_meals(meal_plan_id, day, None, data.instructions if data else None, current_user)
+    except llm.LLMUnavailableError as e:
+        raise llm.service_unavailable(e) from e
+    finally:
+        ticket.release()
+    return {**existing, "meals": meals}
+
+
+@router.post("/{meal_plan_id}/days/{day}/meals/{meal_type}/regenerate", response_model=MealItem)
+async def regenerate_meal(
+    meal_plan_id: str,
+    day: int,
+    meal_type: str,
+    data: Optional[MealRegenerateRequest] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    Replace one meal of a day, keeping the other meals as constraints
+    """
+    ticket = await admission.admit(current_user, "chat")
+    try:
+        _, meals = await regenerate_meals(meal_plan_id, day, [meal_type], data.instructions if data else None, current_user)
+    except llm.LLMUnavailableError as e:
+        raise llm.service_unavailable(e) from e
+    finally:
+        ticket.release()
+    return meals[0]
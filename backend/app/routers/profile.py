@@ -0,0 +1,46 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from app.schemas.profile import ProfileResponse, ProfileUpdate
+from app.utils.auth import get_current_user
+from app.utils import profile
+
+router = APIRouter()
+
+
+def _response(user_profile: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "plans": user_profile.get("plans", 0),
+        "cuisines": user_profile.get("cuisines") or {},
+        "dietaryPreferences": user_profile.get("dietaryPreferences") or {},
+        "restrictions": user_profile.get("restrictions") or [],
+        "likedIngredients": profile.liked_ingredients(user_profile),
+        "dislikedIngredients": user_profile.get("dislikedIngredients") or [],
+        "likedMeals": user_profile.get("likedMeals") or [],
+        "dislikedMeals": user_profile.get("dislikedMeals") or [],
+        "macroTargets": profile.macro_targets(user_profile),
+        "updatedAt": user_profile.get("updatedAt"),
+    }
+
+
+@router.get("/", response_model=ProfileResponse)
+async def get_profile(current_user = Depends(get_current_user)):
+    """
+    What generation has learned about the authenticated user
+    """
+    return _response(await profile.get_profile(current_user["_id"]))
+
+
+@router.patch("/", response_model=ProfileResponse)
+async def update_profile(data: ProfileUpdate, current_user = Depends(get_current_user)):
+    """
+    Set macro targets or correct the learned ingredient lists
+    """
+    await profile.set_preferences(
+        current_user["_id"],
+        macro_targets=data.macroTargets.model_dump() if data.macroTargets else None,
+        liked=data.likedIngredients,
+        disliked=data.dislikedIngredients,
+    )
+    return _response(await profile.get_profile(current_user["_id"]))
@@ -0,0 +1,264 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pymongo import TEXT
+from typing import Iterable, List, Dict, Optional, Any, Tuple
+import asyncio
+import re
+
+from app.schemas.search import SearchResponse
+from app.config import settings
+from app.utils.services import services
+from app.utils.auth import get_current_user
+from app.utils.metrics import stage
+from app.utils import jobs, lifecycle
+
+router = APIRouter()
+
+KINDS = ("chat", "meal_chat", "meal_plan")
+SNIPPET_CHARS = 160
+# Deepest result offset served; past this, narrow the query instead
+MAX_RESULTS = 500
+
+_TERM_RE = re.compile(r"\w+")
+_indexes_ready = False
+
+
+async def ensure_search_indexes() -> None:
+    """
+    Create the text indexes search relies on. Mongo keeps them current on
+    every write, so nothing else has to update them.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    for collection in (settings.CHAT_COLLECTION, settings.MEAL_CHAT_COLLECTION):
+        await services.db[collection].create_index(
+            [("title", TEXT), ("messages.content", TEXT)],
+            name="search_text", weights={"title": 5, "messages.content": 1}
+        )
+    await services.db[settings.MEAL_PLAN_COLLECTION].create_index(
+        [
+            ("mealPlan.days.meals.name", TEXT),
+            ("mealPlan.days.meals.ingredients", TEXT),
+            ("mealPlan.days.meals.description", TEXT),
+            ("mealPlan.days.description", TEXT),
+        ],
+        name="search_text", weights={"mealPlan.days.meals.name": 5, "mealPlan.days.meals.ingredients": 2}
+    )
+    _indexes_ready = True
+
+
+def query_terms(query: str) -> List[str]:
+    """Terms used to pick and highlight snippets, roughly stemmed like Mongo's text search"""
+    terms = []
+    for term in _TERM_RE.findall(query.lower())[:10]:
+        for suffix in ("ing", "es", "s"):
+            if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+                term = term[:-len(suffix)]
+                break
+        if len(term) > 1 and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def highlight(text: str, pattern: Optional[re.Pattern]) -> Tuple[str, List[List[int]]]:
+    """Cut a snippet around the first match and return match offsets within it"""
+    text = " ".join((text or "").split())
+    first = pattern.search(text) if pattern else None
+    start = max(0, first.start() - SNIPPET_CHARS // 3) if first else 0
+    snippet = text[start:start + SNIPPET_CHARS]
+    if start:
+        snippet = "…" + snippet
+    if start + SNIPPET_CHARS < len(text):
+        snippet += "…"
+    highlights = [[m.start(), m.end()] for m in pattern.finditer(snippet)] if pattern else []
+    return snippet, highlights
+
+
+def _chat_pipeline(user_id: str, query: str, regex: str, limit: int) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {"userId": user_id, "$text": {"$search": query}}},
+        {"$sort": {"score": {"$meta": "textScore"}}},
+        {"$limit": limit},
+        {"$project": {
+            "title": 1, "updatedAt": 1, "mealPlanId": 1, "dayId": 1, "mealType": 1,
+            "score": {"$meta": "textScore"},
+            # Only the first matching message leaves the database
+            "match": {"$first": {"$filter": {
+                "input": {"$ifNull": ["$messages.content", []]},
+                "as": "content",
+                "cond": {"$regexMatch": {"input": "$$content", "regex": regex, "options": "i"}},
+                "limit": 1,
+            }}},
+        }},
+    ]
+
+
+def _meal_plan_pipeline(user_id, query: str, limit: int) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {"userId": user_id, "status": {"$in": [jobs.COMPLETED, jobs.PARTIAL]}, "$text": {"$search": query}}},
+        {"$sort": {"score": {"$meta": "textScore"}}},
+        {"$limit": limit},
+        {"$project": {
+            "startDate": 1, "endDate": 1, "updatedAt": 1,
+            "score": {"$meta": "textScore"},
+            "mealPlan.days.day": 1, "mealPlan.days.meals.type": 1, "mealPlan.days.meals.name": 1,
+        }},
+    ]
+
+
+def _chat_result(kind: str, doc: Dict[str, Any], pattern: Optional[re.Pattern]) -> Dict[str, Any]:
+    snippet, highlights = highlight(doc.get("match") or doc.get("title", ""), pattern)
+    return {
+        "kind": kind,
+        "id": str(doc["_id"]),
+        "title": doc.get("title", ""),
+        "snippet": snippet,
+        "highlights": highlights,
+        "score": doc["score"],
+        "updatedAt": doc.get("updatedAt"),
+        "mealPlanId": doc.get("mealPlanId"),
+        "dayId": doc.get("dayId"),
+        "mealType": doc.get("mealType"),
+    }
+
+
+def _meal_plan_result(doc: Dict[str, Any], pattern: Optional[re.Pattern]) -> Dict[str, Any]:
+    meals = [
+        (day.get("day"), meal.get("type"), meal.get("name", ""))
+        for day in (doc.get("mealPlan") or {}).get("days") or []
+        for meal in day.get("meals") or []
+    ]
+    # Point at the first meal whose name matches; ingredient-only matches fall back to the first meal
+    best = next((meal for meal in meals if pattern and pattern.search(meal[2])), meals[0] if meals else (None, None, ""))
+    snippet, highlights = highlight(best[2], pattern)
+    return {
+        "kind": "meal_plan",
+        "id": str(doc["_id"]),
+        "title": f"Meal plan {doc.get('startDate', '')} – {doc.get('endDate', '')}",
+        "snippet": snippet,
+        "highlights": highlights,
+        "score": doc["score"],
+        "updatedAt": doc.get("updatedAt"),
+        "mealPlanId": str(doc["_id"]),
+        "dayId": str(best[0]) if best[0] is not None else None,
+        "mealType": best[1],
+    }
+
+
+def _archive_score(pattern: re.Pattern, weighted: List[Tuple[int, Iterable[str]]]) -> float:
+    """
+    Archived documents have no text index; score them roughly on the scale
+    of Mongo's text score, by the weights of the fields that matched
+    """
+    return float(sum(weight for weight, texts in weighted if any(pattern.search(text or "") for text in texts)))
+
+
+async def _search_chats(kind: str, user_id: str, query: str, pattern: Optional[re.Pattern], limit: int) -> List[Dict[str, Any]]:
+    collection = settings.CHAT_COLLECTION if kind == "chat" else settings.MEAL_CHAT_COLLECTION
+    regex = pattern.pattern if pattern else "."
+    docs = await services.db[collection].aggregate(_chat_pipeline(user_id, query, regex, limit)).to_list(limit)
+    return [_chat_result(kind, doc, pattern) for doc in docs]
+
+
+async def _search_archived_chats(kind: str, user_id: str, pattern: Optional[re.Pattern], limit: int) -> List[Dict[str, Any]]:
+    """Scan the user's newest archived chats, which the text index no longer covers"""
+    if not pattern:
+        return []
+    collection = settings.CHAT_COLLECTION if kind == "chat" else settings.MEAL_CHAT_COLLECTION
+    docs = await lifecycle.find_archived(collection, {"userId": user_id}, "updatedAt", settings.ARCHIVE_SEARCH_SCAN)
+    results = []
+    for doc in docs:
+        contents = [message.get("content") or "" for message in doc.get("messages") or []]
+        score = _archive_score(pattern, [(5, [doc.get("title")]), (1, contents)])
+        if score:
+            match = next((content for content in contents if pattern.search(content)), None)
+            results.append(_chat_result(kind, {**doc, "match": match, "score": score}, pattern))
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:limit]
+
+
+async def _search_meal_plans(user_id, query: str, pattern: Optional[re.Pattern], limit: int) -> List[Dict[str, Any]]:
+    docs = await services.db[settings.MEAL_PLAN_COLLECTION].aggregate(_meal_plan_pipeline(user_id, query, limit)).to_list(limit)
+    return [_meal_plan_result(doc, pattern) for doc in docs]
+
+
+async def _search_archived_meal_plans(user_id, pattern: Optional[re.Pattern], limit: int) -> List[Dict[str, Any]]:
+    """Scan the user's newest archived plans, which the text index no longer covers"""
+    if not pattern:
+        return []
+    docs = await lifecycle.find_archived(
+        settings.MEAL_PLAN_COLLECTION,
+        {"userId": user_id, "status": {"$in": [jobs.COMPLETED, jobs.PARTIAL]}},
+        "createdAt", settings.ARCHIVE_SEARCH_SCAN
+    )
+    results = []
+    for doc in docs:
+        days = (doc.get("mealPlan") or {}).get("days") or []
+        meals = [meal for day in days for meal in day.get("meals") or []]
+        score = _archive_score(pattern, [
+            (5, [meal.get("name") for meal in meals]),
+            (2, [ingredient for meal in meals for ingredient in meal.get("ingredients") or []]),
+            (1, [meal.get("description") for meal in meals] + [day.get("description") for day in days]),
+        ])
+        if score:
+            results.append(_meal_plan_result({**doc, "score": score}, pattern))
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:limit]
+
+
+@router.get("/", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kinds: Optional[str] = Query(None, description="Comma-separated subset of chat, meal_chat, meal_plan"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=50),
+    current_user = Depends(get_current_user)
+):
+    """
+    Search the user's chats, meal chats and meal plans, best matches first
+    """
+    selected = [kind for kind in (kinds.split(",") if kinds else KINDS) if kind in KINDS]
+    if not selected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"kinds must be a subset of {', '.join(KINDS)}"
+        )
+    # Each source returns its own top page * limit; merging those is enough to fill the page
+    depth = page * limit + 1
+    if depth > MAX_RESULTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Page is too deep; refine the search instead"
+        )
+    terms = query_terms(q)
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE) if terms else None
+    # Chats store the user ID as a string, meal plans as an ObjectId
+    user_id = current_user["_id"]
+
+    try:
+        await ensure_search_indexes()
+        with stage("search.query"):
+            searches = []
+            for kind in selected:
+                if kind == "meal_plan":
+                    searches.append(_search_meal_plans(user_id, q, pattern, depth))
+                    searches.append(_search_archived_meal_plans(user_id, pattern, depth))
+                else:
+                    searches.append(_search_chats(kind, str(user_id), q, pattern, depth))
+                    searches.append(_search_archived_chats(kind, str(user_id), pattern, depth))
+            found = await asyncio.gather(*searches)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        ) from e
+
+    merged = sorted((result for results in found for result in results), key=lambda r: (r["score"], r["updatedAt"] or ""), reverse=True)
+    offset = (page - 1) * limit
+    return {
+        "query": q,
+        "page": page,
+        "limit": limit,
+        "hasMore": len(merged) > offset + limit,
+        "results": merged[offset:offset + limit],
+    }
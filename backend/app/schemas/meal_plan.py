@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field, GetJsonSchemaHandler
 from pydantic.json_schema import JsonSchemaValue
 
@@ -7,6 +7,7 @@ from bson import ObjectId
 from pydantic_core import core_schema
 
 from app.schemas.common import PyObjectId
+from app.config import settings
 
 class MealPlanBase(BaseModel):
     startDate: date
@@ -47,10 +48,18 @@ class MealDay(BaseModel):
 class MealPlanData(BaseModel):
     days: List[MealDay]
 
+class MealRegenerateRequest(BaseModel):
+    # Free-text wishes for the replacement, e.g. "no mushrooms"
+    instructions: Optional[str] = Field(default=None, max_length=500)
+
 class MealPlanInDB(MealPlanBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     userId: str
-    status: str = "pending"  # pending, generating, completed
+    status: str = "queued"  # queued, generating, partial, completed, failed
+    progress: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    stageTimestamps: Dict[str, str] = {}
     mealPlan: Optional[MealPlanData] = None
     completedAt: Optional[str] = None
     createdAt: str = Field(default_factory=lambda: datetime.now().isoformat())
@@ -63,4 +72,75 @@ class MealPlanInDB(MealPlanBase):
         }
 
 class MealPlanResponse(MealPlanInDB):
-    pass
\ No newline at end of file
+    pass
+
+class MealPlanStatus(BaseModel):
+    id: str = Field(alias="_id")
+    status: str
+    progress: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    stageTimestamps: Dict[str, str] = {}
+
+class MealPlanBatchCreate(BaseModel):
+    items: List[MealPlanCreate] = Field(min_length=1, max_length=settings.MEAL_PLAN_BATCH_MAX)
+    # Submit through the provider's offline batch API: cheaper, but results
+    # can take up to 24 hours
+    useBatchApi: bool = False
+
+class MealPlanBatchResponse(BaseModel):
+    batchId: str
+    mealPlanIds: List[str]
+    uniqueRequests: int
+
+class MealPlanBatchStatus(BaseModel):
+    batchId: str
+    total: int
+    counts: Dict[str, int]
+    progress: int
+
+class ShoppingListItem(BaseModel):
+    item: str
+    quantity: Optional[float] = None
+    unit: Optional[str] = None
+    occurrences: int = 1
+
+class ShoppingList(BaseModel):
+    mealPlanId: str
+    items: List[ShoppingListItem]
+
+class NutritionTotals(BaseModel):
+    calories: float = 0
+    protein: float = 0
+    carbs: float = 0
+    fat: float = 0
+
+class MacroRatios(BaseModel):
+    # Share of energy from each macro
+    protein: float = 0
+    carbs: float = 0
+    fat: float = 0
+
+class NutritionDay(BaseModel):
+    mealPlanId: str
+    date: Optional[str] = None
+    day: Optional[int] = None
+    totals: NutritionTotals
+    macroRatios: MacroRatios
+    rollingAverage: NutritionTotals
+
+class NutritionPlanSummary(BaseModel):
+    mealPlanId: str
+    startDate: Optional[str] = None
+    days: int
+    totals: NutritionTotals
+    dailyAverage: NutritionTotals
+    macroRatios: MacroRatios
+
+class NutritionSummary(BaseModel):
+    window: int
+    days: List[NutritionDay]
+    plans: List[NutritionPlanSummary]
+    totals: NutritionTotals
+    dailyAverage: NutritionTotals
+    macroRatios: MacroRatios
@@ -0,0 +1,29 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class MacroTargets(BaseModel):
+    calories: int = Field(ge=0)
+    protein: int = Field(ge=0)
+    carbs: int = Field(ge=0)
+    fat: int = Field(ge=0)
+
+
+class ProfileResponse(BaseModel):
+    plans: int = 0
+    cuisines: Dict[str, int] = {}
+    dietaryPreferences: Dict[str, int] = {}
+    restrictions: List[str] = []
+    likedIngredients: List[str] = []
+    dislikedIngredients: List[str] = []
+    likedMeals: List[str] = []
+    dislikedMeals: List[str] = []
+    macroTargets: Dict[str, int] = {}
+    updatedAt: Optional[str] = None
+
+
+class ProfileUpdate(BaseModel):
+    macroTargets: Optional[MacroTargets] = None
+    # Replace the learned lists; an empty list clears them
+    dislikedIngredients: Optional[List[str]] = Field(default=None, max_length=100)
+    likedIngredients: Optional[List[str]] = Field(default=None, max_length=100)
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class SearchResult(BaseModel):
+    kind: str  # chat, meal_chat, meal_plan
+    id: str
+    title: str
+    snippet: str
+    # [start, end) character offsets of matched terms within the snippet
+    highlights: List[List[int]] = []
+    score: float
+    updatedAt: Optional[str] = None
+    mealPlanId: Optional[str] = None
+    dayId: Optional[str] = None
+    mealType: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    page: int
+    limit: int
+    hasMore: bool
+    results: List[SearchResult]
@@ -1,7 +1,5 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel
 from typing import Optional
 class UserCreate(BaseModel):
-    email: EmailStr
+    # Email and Firebase UID are taken from the verified ID token
     password: Optional[str] = None
-    googleAuth: Optional[bool] = False
-    firebaseUid: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+Server entry point: `python -m app.serve [--host HOST] [--port PORT] [--workers N]`
+
+Runs the app under uvicorn's process manager. On SIGTERM each worker stops
+accepting connections, closes WebSockets with 1012 (service restart) so
+clients reconnect to another instance, and waits up to
+SERVE_GRACEFUL_SECONDS for in-flight requests and their background
+generations. Generations still running after that are cancelled and put
+back in the queue for another worker (see generate_meal_plan).
+"""
+import argparse
+import importlib.util
+from typing import List, Optional
+
+import uvicorn
+
+from app.config import settings
+from app.utils.log import configure_logging, shutdown_logging
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the Genie API")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    args = parser.parse_args(argv)
+
+    # The supervisor logs too; workers configure their own logging on import
+    configure_logging()
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            # Installed with uvicorn[standard]; the pure Python fallbacks are slower
+            loop="uvloop" if _available("uvloop") else "asyncio",
+            http="httptools" if _available("httptools") else "h11",
+            ws_per_message_deflate=True,
+            timeout_graceful_shutdown=settings.SERVE_GRACEFUL_SECONDS,
+            timeout_keep_alive=settings.SERVE_KEEP_ALIVE_SECONDS,
+            proxy_headers=True,
+            forwarded_allow_ips=settings.SERVE_FORWARDED_ALLOW_IPS,
+            # Logging goes through app/utils/log.py; request metrics replace the access log
+            log_config=None,
+            access_log=False,
+        )
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
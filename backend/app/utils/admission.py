@@ -0,0 +1,158 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.utils.services import services
+from app.utils.metrics import counter, gauge
+
+
+# Per-tier limits. `share` is the fraction of the process-wide LLM capacity a
+# tier may fill before it is shed, so under pressure free users are turned
+# away first and higher tiers keep headroom.
+TIERS: Dict[str, Dict[str, float]] = {
+    "free": {"generation": 1, "chat": 2, "daily_tokens": 60_000, "share": 0.6},
+    "pro": {"generation": 3, "chat": 4, "daily_tokens": 400_000, "share": 0.85},
+    "coach": {"generation": 10, "chat": 8, "daily_tokens": 2_000_000, "share": 1.0},
+}
+
+ADMISSION_REJECTIONS = counter("genie_admission_rejections_total", "Requests rejected by admission control", ["kind", "reason", "tier"])
+LLM_INFLIGHT = gauge("genie_llm_inflight", "Admitted LLM-backed operations in flight", ["kind"])
+
+
+def seconds_until_utc_midnight() -> int:
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def too_many_requests(detail: str, retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class Ticket:
+    """An admitted unit of LLM work; release it exactly once when the work ends"""
+
+    def __init__(self, controller: "AdmissionController", uid: str, kind: str):
+        self._controller = controller
+        self.uid = uid
+        self.kind = kind
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self.uid, self.kind)
+
+
+class AdmissionController:
+    """
+    Admission control for LLM-backed endpoints, keyed by Firebase UID.
+
+    In-flight counts are per process; the daily token quota lives in Mongo so
+    it holds across workers. Quota reads are cached briefly in-process and
+    kept current locally as usage is recorded.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._total_inflight = 0
+        self._usage_cache: Dict[str, Tuple[str, int, float]] = {}
+        self._ttl_index_ready = False
+
+    @property
+    def inflight(self) -> int:
+        """Admitted LLM-backed operations currently running in this process"""
+        return self._total_inflight
+
+    @staticmethod
+    def tier_of(user: dict) -> str:
+        tier = user.get("tier") or settings.DEFAULT_TIER
+        return tier if tier in TIERS else settings.DEFAULT_TIER
+
+    async def admit(self, user: dict, kind: str) -> Ticket:
+        """Admit one `generation` or `chat` operation or raise a 429 with Retry-After"""
+        uid = user["firebaseUid"]
+        tier = self.tier_of(user)
+        limits = TIERS[tier]
+
+        if self._inflight[(uid, kind)] >= limits[kind]:
+            ADMISSION_REJECTIONS.inc(kind=kind, reason="user_concurrency", tier=tier)
+            raise too_many_requests(
+                f"Too many {kind} requests in progress; wait for one to finish",
+                settings.ADMISSION_RETRY_AFTER_SECONDS,
+            )
+        if self._total_inflight >= settings.LLM_MAX_INFLIGHT * limits["share"]:
+            ADMISSION_REJECTIONS.inc(kind=kind, reason="capacity", tier=tier)
+            raise too_many_requests("Genie is busy right now, please retry shortly", settings.ADMISSION_RETRY_AFTER_SECONDS)
+
+        # Take the slot before the quota lookup may await Mongo, so a burst
+        # from one user cannot all pass the concurrency check meanwhile
+        self._inflight[(uid, kind)] += 1
+        self._total_inflight += 1
+        LLM_INFLIGHT.inc(kind=kind)
+        ticket = Ticket(self, uid, kind)
+        try:
+            if await self.tokens_used_today(uid) >= limits["daily_tokens"]:
+                ADMISSION_REJECTIONS.inc(kind=kind, reason="daily_quota", tier=tier)
+                raise too_many_requests("Daily usage limit reached", seconds_until_utc_midnight())
+        except BaseException:
+            ticket.release()
+            raise
+        return ticket
+
+    def _release(self, uid: str, kind: str) -> None:
+        self._inflight[(uid, kind)] -= 1
+        if self._inflight[(uid, kind)] <= 0:
+            del self._inflight[(uid, kind)]
+        self._total_inflight -= 1
+        LLM_INFLIGHT.dec(kind=kind)
+
+    async def tokens_used_today(self, uid: str) -> int:
+        today = datetime.now(timezone.utc).date().isoformat()
+        cached = self._usage_cache.get(uid)
+        if cached and cached[0] == today and time.monotonic() - cached[2] < settings.USAGE_CACHE_SECONDS:
+            return cached[1]
+        doc = await services.db[settings.USAGE_COLLECTION].find_one({"_id": f"{uid}:{today}"}, {"tokens": 1})
+        tokens = doc.get("tokens", 0) if doc else 0
+        self._usage_cache[uid] = (today, tokens, time.monotonic())
+        return tokens
+
+    async def record_usage(self, uid: Optional[str], response) -> None:
+        """Add the tokens of an OpenAI response to the user's daily total"""
+        usage = getattr(response, "usage", None)
+        await self.record_tokens(uid, getattr(usage, "total_tokens", 0) or 0)
+
+    async def record_tokens(self, uid: Optional[str], tokens: int) -> None:
+        if not uid or not tokens:
+            return
+        today = datetime.now(timezone.utc).date()
+        collection = services.db[settings.USAGE_COLLECTION]
+        if not self._ttl_index_ready:
+            await collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._ttl_index_ready = True
+        await collection.update_one(
+            {"_id": f"{uid}:{today.isoformat()}"},
+            {
+                "$inc": {"tokens": tokens, "requests": 1},
+                "$setOnInsert": {
+                    "firebaseUid": uid,
+                    "date": today.isoformat(),
+                    "expiresAt": datetime.combine(today + timedelta(days=2), datetime.min.time()),
+                },
+            },
+            upsert=True,
+        )
+        cached = self._usage_cache.get(uid)
+        if cached and cached[0] == today.isoformat():
+            self._usage_cache[uid] = (cached[0], cached[1] + tokens, cached[2])
+
+
+admission = AdmissionController()
@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -5,60 +6,110 @@ from jose import JWTError
 
 from firebase_admin import auth as firebase_auth
 from firebase_admin.exceptions import FirebaseError
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from app.config import settings
+from app.utils.services import services
+from app.utils.metrics import stage
+
+logger = logging.getLogger(__name__)
 
 # Set up security scheme
 security = HTTPBearer()
 
-# MongoDB client setup
-client = AsyncIOMotorClient(settings.DATABASE_URL)
-db = client[settings.DATABASE_NAME]
+_user_indexes_ready = False
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """
-    Verify Firebase token and get current user
-    """
-    credentials_exception = HTTPException(
+async def ensure_user_indexes():
+    """Unique email and Firebase UID, so user creation can insert and catch duplicates"""
+    global _user_indexes_ready
+    if _user_indexes_ready:
+        return
+    try:
+        await services.db[settings.USER_COLLECTION].create_index("email", unique=True, name="email_unique")
+        await services.db[settings.USER_COLLECTION].create_index(
+            "firebaseUid", unique=True, name="firebase_uid_unique",
+            partialFilterExpression={"firebaseUid": {"$type": "string"}}
+        )
+    except Exception as e:
+        # Existing duplicates block the unique indexes; creation still works without them
+        logger.warning("Failed to create user indexes: %s", e)
+    _user_indexes_ready = True
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    token = credentials.credentials
+
+async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verify the Firebase ID token and return its claims; the UID and email
+    come from here, never from a request body
+    """
     try:
-        # Verify the Firebase token
-        decoded_token = firebase_auth.verify_id_token(token)
-        
-        # Get user ID (Firebase UID)
-        user_uid = decoded_token.get("uid")
-        if not user_uid:
-            raise credentials_exception
-            
-        # Find user in our MongoDB database using Firebase UID
-        user = await db[settings.USER_COLLECTION].find_one({"firebaseUid": user_uid})
-        
-        # If user doesn't exist in our DB but is authenticated with Firebase,
-        # we can create a new user record
-        if not user:
-            email = decoded_token.get("email")
-            if not email:
-                raise credentials_exception
-                
-            # Create a new user in our database
-            new_user = {
-                "email": email,
-                "firebaseUid": user_uid,
-                "createdAt": datetime.now().isoformat()
-            }
-            
-            result = await db[settings.USER_COLLECTION].insert_one(new_user)
-            user = await db[settings.USER_COLLECTION].find_one({"_id": result.inserted_id})
-            
-        return user
-        
-    except (JWTError, FirebaseError) as e:
-        print(f"Authentication error: {str(e)}")
-        raise credentials_exception from e
\ No newline at end of file
+        with stage("auth.verify_token"):
+            # No-op once the lifespan has initialized Firebase
+            services.init_firebase()
+            decoded_token = firebase_auth.verify_id_token(credentials.credentials)
+    except (JWTError, FirebaseError, ValueError) as e:
+        logger.info("Authentication error: %s", e)
+        raise _credentials_exception() from e
+    if not decoded_token.get("uid"):
+        raise _credentials_exception()
+    return decoded_token
+
+async def link_verified_email(decoded_token: dict):
+    """
+    Point the user record holding the token's email at the token's UID.
+    Only a verified email proves ownership, so a record registered under
+    that email by someone else (or without a UID) is taken over rather
+    than locking the real owner out.
+    """
+    if not decoded_token.get("email_verified"):
+        return None
+    return await services.db[settings.USER_COLLECTION].find_one_and_update(
+        {"email": decoded_token["email"], "firebaseUid": {"$ne": decoded_token["uid"]}},
+        {"$set": {"firebaseUid": decoded_token["uid"]}},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def get_current_user(decoded_token: dict = Depends(verify_firebase_token)):
+    """
+    Get the current user for a verified Firebase token
+    """
+    user_uid = decoded_token["uid"]
+
+    # Find user in our MongoDB database using Firebase UID
+    user = await services.db[settings.USER_COLLECTION].find_one({"firebaseUid": user_uid})
+
+    # If user doesn't exist in our DB but is authenticated with Firebase,
+    # we can create a new user record
+    if not user:
+        email = decoded_token.get("email")
+        if not email:
+            raise _credentials_exception()
+
+        # Create a new user in our database
+        new_user = {
+            "email": email,
+            "firebaseUid": user_uid,
+            "createdAt": datetime.now().isoformat()
+        }
+
+        await ensure_user_indexes()
+        try:
+            result = await services.db[settings.USER_COLLECTION].insert_one(new_user)
+            user = await services.db[settings.USER_COLLECTION].find_one({"_id": result.inserted_id})
+        except DuplicateKeyError:
+            # A concurrent first request created it, or the email is held by
+            # another record; take the latter over only for verified emails
+            user = await services.db[settings.USER_COLLECTION].find_one({"firebaseUid": user_uid})
+            if not user:
+                user = await link_verified_email(decoded_token)
+            if not user:
+                raise _credentials_exception()
+
+    return user
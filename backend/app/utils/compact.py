@@ -0,0 +1,84 @@
+import json
+import zlib
+from typing import Any, Dict, List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from app.config import settings
+
+# Compact plans record their format so it can change without breaking old blobs
+COMPACT_VERSION = 1
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class _Table:
+    """Values in first-seen order, each stored once and referenced by index"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._index: Dict[str, int] = {}
+
+    def ref(self, value: Any) -> int:
+        key = json.dumps(value, sort_keys=True) if not isinstance(value, str) else value
+        if key not in self._index:
+            self._index[key] = len(self.values)
+            self.values.append(value)
+        return self._index[key]
+
+
+def compact_plan(meal_plan_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rewrite a plan so every ingredient line and recipe step is stored once
+    in a per-plan dictionary and meals refer to them by index. Generated
+    plans repeat the same staples and steps across days, so this shrinks
+    them before compression.
+    """
+    ingredients, steps = _Table(), _Table()
+    days = []
+    for day in (meal_plan_data or {}).get("days") or []:
+        meals = []
+        for meal in day.get("meals") or []:
+            meal = dict(meal)
+            meal["ingredients"] = [ingredients.ref(i) for i in meal.get("ingredients") or []]
+            if isinstance(meal.get("recipe"), list):
+                meal["recipe"] = [steps.ref(step) for step in meal["recipe"]]
+            meals.append(meal)
+        days.append({**day, "meals": meals})
+    return {"v": COMPACT_VERSION, "ingredients": ingredients.values, "steps": steps.values, "days": days}
+
+
+def expand_plan(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of `compact_plan`"""
+    ingredients, steps = compact.get("ingredients") or [], compact.get("steps") or []
+    days = []
+    for day in compact.get("days") or []:
+        meals = []
+        for meal in day.get("meals") or []:
+            meal = dict(meal)
+            meal["ingredients"] = [ingredients[i] for i in meal.get("ingredients") or []]
+            if isinstance(meal.get("recipe"), list):
+                meal["recipe"] = [steps[i] for i in meal["recipe"]]
+            meals.append(meal)
+        days.append({**day, "meals": meals})
+    return {"days": days}
+
+
+def compress(raw: bytes) -> bytes:
+    """Compress with zstd when available, zlib otherwise"""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=settings.COMPRESSION_LEVEL).compress(raw)
+    return zlib.compress(raw, min(settings.COMPRESSION_LEVEL, 9))
+
+
+def decompress(blob: bytes) -> bytes:
+    """Inverse of `compress`; the codec is detected from the blob itself"""
+    blob = bytes(blob)
+    if blob.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but the zstandard module is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.config import settings
+from app.utils.metrics import CACHE_LOOKUPS
+
+# Every write to a cached document must include this in its update, so the
+# version (and with it the ETag) changes whenever the response would
+VERSION_FIELD = "version"
+BUMP_VERSION = {VERSION_FIELD: 1}
+
+# Projection for the cheap lookup that answers conditional requests
+VERSION_PROJECTION = {VERSION_FIELD: 1, "updatedAt": 1, "completedAt": 1, "createdAt": 1}
+
+
+def with_version_bump(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the version increment to an update document"""
+    return {**update, "$inc": {**update.get("$inc", {}), **BUMP_VERSION}}
+
+
+class BodyCache:
+    """LRU of serialized response bodies keyed by (kind, document id, version)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[Tuple[str, str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def put(self, key: Tuple[str, str, int], body: bytes) -> None:
+        with self._lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+
+body_cache = BodyCache(settings.HTTP_BODY_CACHE_ENTRIES)
+
+
+def etag(kind: str, doc_id: str, version: int) -> str:
+    return f'"{kind}-{doc_id}-{version}"'
+
+
+def last_modified(doc: Dict[str, Any]) -> Optional[str]:
+    stamp = doc.get("updatedAt") or doc.get("completedAt") or doc.get("createdAt")
+    try:
+        # Stored timestamps are naive local time
+        return format_datetime(datetime.fromisoformat(stamp).astimezone(timezone.utc), usegmt=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or tag in {value.strip() for value in header.split(",")}
+
+
+async def conditional_get(
+    request: Request,
+    kind: str,
+    collection,
+    query: Dict[str, Any],
+    response_model: Type[BaseModel],
+    prepare: Callable[[Dict[str, Any]], Dict[str, Any]],
+) -> Optional[Response]:
+    """
+    Serve a document with an ETag. If the client's copy is current, answer
+    304 after a projection-only lookup; otherwise serve the serialized body
+    from the LRU, reading and serializing the document only on a miss.
+
+    Returns None when no document matches `query`.
+    """
+    meta = await collection.find_one(query, VERSION_PROJECTION)
+    if not meta:
+        return None
+    doc_id = str(meta["_id"])
+    version = meta.get(VERSION_FIELD, 0)
+    tag = etag(kind, doc_id, version)
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    modified = last_modified(meta)
+    if modified:
+        headers["Last-Modified"] = modified
+    if not_modified(request, tag):
+        CACHE_LOOKUPS.inc(cache="http", result="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    body = body_cache.get((kind, doc_id, version))
+    CACHE_LOOKUPS.inc(cache="http", result="hit" if body is not None else "miss")
+    if body is None:
+        doc = await collection.find_one({"_id": meta["_id"]})
+        if not doc:
+            return None
+        # The document may have moved on since the lookup; label the body with what was read
+        version = doc.get(VERSION_FIELD, 0)
+        headers["ETag"] = etag(kind, doc_id, version)
+        body = response_model.model_validate(prepare(doc)).model_dump_json(by_alias=True).encode()
+        body_cache.put((kind, doc_id, version), body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+from app.config import settings
+from app.utils.metrics import counter
+from app.utils.http_cache import with_version_bump
+from app.utils.websocket import manager
+
+logger = logging.getLogger(__name__)
+
+# Meal plan generation job states
+QUEUED = "queued"
+GENERATING = "generating"
+PARTIAL = "partial"
+COMPLETED = "completed"
+FAILED = "failed"
+# Written by older versions of create_meal_plan; behaves like QUEUED
+PENDING = "pending"
+
+ALLOWED_TRANSITIONS = {
+    PENDING: {GENERATING, FAILED},
+    QUEUED: {GENERATING, FAILED},
+    # Back to QUEUED only when the sweeper requeues a stale job
+    GENERATING: {QUEUED, PARTIAL, COMPLETED, FAILED},
+    PARTIAL: {GENERATING, COMPLETED, FAILED},
+    FAILED: {QUEUED},
+    COMPLETED: set(),
+}
+
+# Strong references to relaunched jobs so they are not garbage collected mid-run
+_relaunched_jobs = set()
+
+JOB_TRANSITIONS = counter("genie_job_transitions_total", "Meal plan job state transitions", ["status"])
+
+
+def expires_at(status: str) -> Optional[datetime]:
+    """When the TTL index may delete a job left in `status`; None keeps it"""
+    days = {QUEUED: settings.QUEUED_PLAN_TTL_DAYS, PENDING: settings.QUEUED_PLAN_TTL_DAYS, FAILED: settings.FAILED_PLAN_TTL_DAYS}.get(status)
+    return datetime.now(timezone.utc) + timedelta(days=days) if days else None
+
+
+def sources_for(status: str):
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+
+
+def _transition_update(status: str, progress: Optional[int], error: Optional[str], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    now = datetime.now().isoformat()
+    update: Dict[str, Any] = {
+        "$set": {
+            "status": status,
+            f"stageTimestamps.{status}": now,
+            "updatedAt": now,
+            **(extra or {}),
+        }
+    }
+    if progress is not None:
+        update["$set"]["progress"] = progress
+    if error is not None:
+        update["$set"]["error"] = error
+    if status == GENERATING:
+        update["$set"]["heartbeatAt"] = now
+        update["$inc"] = {"attempts": 1}
+    if status == QUEUED:
+        update["$set"]["progress"] = 0
+    expiry = expires_at(status)
+    if expiry:
+        update["$set"]["expiresAt"] = expiry
+    else:
+        update["$unset"] = {"expiresAt": ""}
+    if status != QUEUED:
+        update.setdefault("$unset", {})["releasedAt"] = ""
+    return with_version_bump(update)
+
+
+async def transition(
+    collection,
+    meal_plan_id: str,
+    status: str,
+    progress: Optional[int] = None,
+    error: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """
+    Move a job to `status` if its current state allows it.
+
+    The check and the write are a single conditional update, so two workers
+    (or a worker and the sweeper) can never both claim the same job. Returns
+    whether the transition happened.
+    """
+    result = await collection.update_one(
+        {"_id": ObjectId(meal_plan_id), "status": {"$in": sources_for(status)}},
+        _transition_update(status, progress, error, extra)
+    )
+    if result.modified_count:
+        JOB_TRANSITIONS.inc(status=status)
+    return bool(result.modified_count)
+
+
+async def transition_many(
+    collection,
+    meal_plan_ids: List[str],
+    status: str,
+    progress: Optional[int] = None,
+    error: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Like `transition` for several jobs in one round trip; returns how many moved"""
+    if not meal_plan_ids:
+        return 0
+    result = await collection.update_many(
+        {"_id": {"$in": [ObjectId(i) for i in meal_plan_ids]}, "status": {"$in": sources_for(status)}},
+        _transition_update(status, progress, error, extra)
+    )
+    if result.modified_count:
+        JOB_TRANSITIONS.inc(result.modified_count, status=status)
+    return result.modified_count
+
+
+async def heartbeat(collection, meal_plan_id: str, progress: int) -> None:
+    """Record that a generating job is alive and how far along it is"""
+    now = datetime.now().isoformat()
+    await collection.update_one(
+        {"_id": ObjectId(meal_plan_id), "status": GENERATING},
+        with_version_bump({"$set": {"heartbeatAt": now, "progress": progress}})
+    )
+
+
+async def heartbeat_batch(collection, batch_id: str) -> None:
+    """Record that a batch's queued plans are still waiting on a live worker"""
+    await collection.update_many({"batchId": batch_id, "status": QUEUED}, {"$set": {"heartbeatAt": datetime.now().isoformat()}})
+
+
+async def notify_progress(firebase_uid: str, meal_plan_id: str, status: str, progress: int, error: Optional[str] = None) -> None:
+    message = {"type": "meal_plan_progress", "meal_plan_id": meal_plan_id, "status": status, "progress": progress}
+    if error:
+        message["error"] = error
+    try:
+        await manager.send_message(message, firebase_uid)
+    except Exception as e:
+        logger.warning("Failed to send progress update: %s", e)
+
+
+async def release(collection, meal_plan_id: str) -> None:
+    """
+    Hand a job this worker is giving up on (because it is shutting down)
+    back to the queue, marked so the next sweep on any worker relaunches it
+    instead of waiting for it to go stale.
+    """
+    now = datetime.now().isoformat()
+    if not await transition(collection, meal_plan_id, QUEUED, extra={"releasedAt": now}):
+        # Not claimed yet
+        await collection.update_one({"_id": ObjectId(meal_plan_id), "status": QUEUED}, {"$set": {"releasedAt": now}})
+
+
+async def cancel_and_wait(tasks, timeout: float) -> None:
+    """Cancel `tasks` and give their cleanup (such as `release`) up to `timeout` seconds"""
+    tasks = [task for task in tasks if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+
+
+async def drain_relaunched_jobs(timeout: float) -> None:
+    """Requeue jobs the sweeper relaunched on this worker; called on shutdown"""
+    await cancel_and_wait(list(_relaunched_jobs), timeout)
+
+
+async def sweep_stale_jobs(collection, run_job: Callable[[str, str, str], Awaitable[None]]) -> int:
+    """
+    Requeue jobs whose worker died and relaunch them with `run_job`.
+
+    A job is stale when it has been `generating` without a heartbeat, or
+    `queued` without being picked up, for JOB_STALE_AFTER_SECONDS, or when a
+    worker released it on shutdown. Batch plans waiting their turn get a
+    heartbeat too (`heartbeat_batch`), and `run_job` hands followers their
+    leader's result rather than generating them again. Jobs that have used
+    up JOB_MAX_ATTEMPTS, or are over a day old, are failed instead.
+    """
+    cutoff = (datetime.now() - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS)).isoformat()
+    # Anything this old was abandoned long ago; regenerating it would only burn tokens
+    abandoned = (datetime.now() - timedelta(days=1)).isoformat()
+    stale = await collection.find(
+        {"$or": [
+            {"status": GENERATING, "heartbeatAt": {"$lt": cutoff}},
+            # Plans submitted to the OpenAI batch API are owned by their poller
+            {
+                "status": {"$in": [QUEUED, PENDING]}, "createdAt": {"$lt": cutoff}, "openaiBatchId": {"$exists": False},
+                "$or": [{"heartbeatAt": {"$exists": False}}, {"heartbeatAt": {"$lt": cutoff}}],
+            },
+            # Released by a worker that shut down; no need to wait
+            {"status": QUEUED, "releasedAt": {"$exists": True}},
+        ]},
+        {"_id": 1, "status": 1, "attempts": 1, "userId": 1, "firebaseUid": 1, "createdAt": 1}
+    ).to_list(100)
+
+    relaunched = 0
+    for job in stale:
+        job_id = str(job["_id"])
+        if job.get("attempts", 0) >= settings.JOB_MAX_ATTEMPTS or job.get("createdAt", "") < abandoned:
+            if await transition(collection, job_id, FAILED, error="Generation timed out"):
+                await notify_progress(job.get("firebaseUid"), job_id, FAILED, 0, "Generation timed out")
+            continue
+        if job["status"] == GENERATING and not await transition(collection, job_id, QUEUED):
+            continue
+        task = asyncio.create_task(run_job(job_id, job["userId"], job.get("firebaseUid")))
+        _relaunched_jobs.add(task)
+        task.add_done_callback(_relaunched_jobs.discard)
+        relaunched += 1
+    return relaunched
+
+
+async def run_sweeper(collection, run_job: Callable[[str, str, str], Awaitable[None]]) -> None:
+    while True:
+        await asyncio.sleep(settings.JOB_SWEEP_INTERVAL_SECONDS)
+        try:
+            await sweep_stale_jobs(collection, run_job)
+        except Exception as e:
+            logger.exception("Job sweeper failed")
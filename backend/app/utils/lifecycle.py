@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import bson
+from bson import Binary
+from pymongo import ReplaceOne
+
+from app.config import settings
+from app.utils import jobs
+from app.utils.compact import compact_plan, compress, decompress, expand_plan
+from app.utils.metrics import counter
+from app.utils.services import services
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_MOVES = counter("genie_archive_moves_total", "Documents moved between hot and archive collections", ["collection", "direction"])
+
+_indexes_ready = False
+_archiver: Optional[asyncio.Task] = None
+
+
+def _policies() -> Dict[str, Dict[str, Any]]:
+    """
+    Per hot collection: the fields kept unpacked on archived documents (so
+    they can still be looked up), the field that ages a document and what
+    may be archived at all.
+    """
+    return {
+        settings.MEAL_PLAN_COLLECTION: {
+            "keys": ("userId", "status", "startDate", "endDate", "createdAt", "version"),
+            "age_field": "createdAt",
+            "days": settings.ARCHIVE_PLANS_AFTER_DAYS,
+            "filter": {"status": {"$in": [jobs.COMPLETED, jobs.PARTIAL]}},
+        },
+        settings.CHAT_COLLECTION: {
+            "keys": ("userId", "title", "createdAt", "updatedAt", "version"),
+            "age_field": "updatedAt",
+            "days": settings.ARCHIVE_CHATS_AFTER_DAYS,
+            "filter": {},
+        },
+        settings.MEAL_CHAT_COLLECTION: {
+            "keys": ("userId", "mealPlanId", "dayId", "mealType", "updatedAt", "version"),
+            "age_field": "updatedAt",
+            "days": settings.ARCHIVE_CHATS_AFTER_DAYS,
+            "filter": {},
+        },
+    }
+
+
+def archive_name(collection_name: str) -> str:
+    return f"{collection_name}_archive"
+
+
+def to_archive(doc: Dict[str, Any], keys) -> Dict[str, Any]:
+    """
+    Keep the lookup keys as fields and pack everything else into one
+    compressed BSON blob, so ObjectIds and dates survive the round trip
+    """
+    rest = {k: v for k, v in doc.items() if k != "_id" and k not in keys}
+    if rest.get("mealPlan"):
+        rest["mealPlan"] = compact_plan(rest["mealPlan"])
+        rest["_compactMealPlan"] = True
+    archived = {k: doc[k] for k in keys if k in doc}
+    archived.update({"_id": doc["_id"], "archivedAt": datetime.now().isoformat(), "blob": Binary(compress(bson.encode(rest)))})
+    return archived
+
+
+def from_archive(archived: Dict[str, Any]) -> Dict[str, Any]:
+    rest = bson.decode(decompress(archived["blob"]))
+    if rest.pop("_compactMealPlan", False):
+        rest["mealPlan"] = expand_plan(rest["mealPlan"])
+    doc = {k: v for k, v in archived.items() if k not in ("blob", "archivedAt")}
+    doc.update(rest)
+    return doc
+
+
+async def ensure_lifecycle_indexes() -> None:
+    """
+    TTL index that removes abandoned and failed plans, indexes the archiver
+    scans by, and lookup indexes on the archives.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    plans = services.db[settings.MEAL_PLAN_COLLECTION]
+    await plans.create_index("expiresAt", expireAfterSeconds=0)
+    # Jobs written before expiry existed
+    for job_status in (jobs.PENDING, jobs.QUEUED, jobs.FAILED):
+        await plans.update_many(
+            {"status": job_status, "expiresAt": {"$exists": False}},
+            {"$set": {"expiresAt": jobs.expires_at(job_status)}}
+        )
+    for name, policy in _policies().items():
+        await services.db[name].create_index(policy["age_field"])
+        await services.db[archive_name(name)].create_index([(key, 1) for key in policy["keys"] if key in ("userId", "mealPlanId", "dayId", "mealType")])
+    _indexes_ready = True
+
+
+async def archive_batch(collection_name: str) -> int:
+    """Move up to ARCHIVE_BATCH_SIZE aged documents to the archive; returns how many moved"""
+    policy = _policies()[collection_name]
+    age_field = policy["age_field"]
+    cutoff = (datetime.now() - timedelta(days=policy["days"])).isoformat()
+    hot = services.db[collection_name]
+    docs = await hot.find({age_field: {"$lt": cutoff}, **policy["filter"]}).limit(settings.ARCHIVE_BATCH_SIZE).to_list(settings.ARCHIVE_BATCH_SIZE)
+    if not docs:
+        return 0
+    # Idempotent, so a crash between the two writes only leaves a copy behind
+    await services.db[archive_name(collection_name)].bulk_write(
+        [ReplaceOne({"_id": doc["_id"]}, to_archive(doc, policy["keys"]), upsert=True) for doc in docs],
+        ordered=False
+    )
+    # Every content write bumps the version, so documents written to since
+    # they were read (or no longer archivable) stay hot; their archive copy
+    # is replaced next time
+    result = await hot.delete_many({"$or": [{"_id": doc["_id"], "version": doc.get("version"), **policy["filter"]} for doc in docs]})
+    ARCHIVE_MOVES.inc(result.deleted_count, collection=collection_name, direction="archive")
+    return result.deleted_count
+
+
+async def restore(collection_name: str, query: Dict[str, Any]) -> bool:
+    """
+    Move the archived document matching `query` back into the hot
+    collection. Callers retry their read when this returns True.
+    """
+    archive = services.db[archive_name(collection_name)]
+    archived = await archive.find_one(query)
+    if not archived:
+        return False
+    doc = from_archive(archived)
+    await services.db[collection_name].replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    await archive.delete_one({"_id": archived["_id"]})
+    ARCHIVE_MOVES.inc(collection=collection_name, direction="restore")
+    return True
+
+
+async def find_one(collection_name: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """`find_one` on a hot collection that transparently brings archived documents back"""
+    collection = services.db[collection_name]
+    doc = await collection.find_one(query, projection)
+    if doc is None and await restore(collection_name, query):
+        doc = await collection.find_one(query, projection)
+    return doc
+
+
+async def find_archived(collection_name: str, query: Dict[str, Any], sort_field: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Archived documents matching `query`, newest `sort_field` first, unpacked
+    but left in the archive. `query` and `sort_field` may only use the keys
+    the collection's policy keeps on archived documents.
+    """
+    if limit <= 0:
+        return []
+    archived = await services.db[archive_name(collection_name)].find(query).sort(sort_field, -1).limit(limit).to_list(limit)
+    return [from_archive(doc) for doc in archived]
+
+
+async def delete_archived(collection_name: str, query: Dict[str, Any]) -> int:
+    result = await services.db[archive_name(collection_name)].delete_many(query)
+    return result.deleted_count
+
+
+async def run_archiver() -> None:
+    while True:
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+        for name in _policies():
+            try:
+                # Drain the backlog a batch at a time, yielding between batches
+                while await archive_batch(name) >= settings.ARCHIVE_BATCH_SIZE:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.exception("Archiving %s failed", name)
+
+
+def start_archiver() -> None:
+    """Called from the app lifespan"""
+    global _archiver
+    _archiver = asyncio.create_task(run_archiver())
+
+
+def stop_archiver() -> None:
+    if _archiver:
+        _archiver.cancel()
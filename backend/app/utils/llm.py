@@ -0,0 +1,212 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import openai
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.utils.admission import admission
+from app.utils.metrics import counter, gauge, llm_call, record_llm_usage
+from app.utils.recorder import record_llm
+from app.utils.services import services
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+LLM_RETRIES = counter("genie_llm_retries_total", "OpenAI requests retried after a retriable error", ["task"])
+LLM_HEDGES = counter("genie_llm_hedges_total", "Hedged OpenAI requests by which request won", ["task", "winner"])
+LLM_CIRCUIT_STATE = gauge("genie_llm_circuit_open", "1 while the OpenAI circuit breaker is open")
+
+# Worth retrying: the request may well succeed a moment later
+RETRIABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMUnavailableError(Exception):
+    """The provider is failing or the breaker is open; callers should serve a fallback"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def service_unavailable(error: LLMUnavailableError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Genie is having trouble reaching its AI provider, please retry shortly",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+class CircuitBreaker:
+    """
+    Opens after LLM_BREAKER_FAILURES consecutive retriable failures and fails
+    fast for LLM_BREAKER_RESET_SECONDS. Then a single trial request is let
+    through; its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def retry_after(self) -> int:
+        remaining = settings.LLM_BREAKER_RESET_SECONDS - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining))
+
+    def before_call(self) -> None:
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < settings.LLM_BREAKER_RESET_SECONDS:
+                raise LLMUnavailableError("OpenAI circuit is open", self.retry_after())
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._trial_running:
+                raise LLMUnavailableError("OpenAI circuit is half open", self.retry_after())
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial_running = False
+        if self.state != CLOSED:
+            self.state = CLOSED
+            LLM_CIRCUIT_STATE.set(0)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self._failures >= settings.LLM_BREAKER_FAILURES:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            LLM_CIRCUIT_STATE.set(1)
+
+    def release_trial(self) -> None:
+        """The trial ended without telling us anything about the provider"""
+        self._trial_running = False
+
+
+breaker = CircuitBreaker()
+
+
+def route(task: str) -> Dict[str, Any]:
+    """
+    Model, sampling parameters and deadline for an LLM task. Small, latency
+    sensitive tasks go to a cheaper model; plans get the larger budget.
+    """
+    routes = {
+        "title": {
+            "model": settings.LLM_TITLE_MODEL, "timeout": settings.LLM_TITLE_TIMEOUT_SECONDS,
+            "params": {"temperature": 0.3, "max_tokens": 20},
+        },
+        "chat": {
+            "model": settings.LLM_CHAT_MODEL, "timeout": settings.LLM_TIMEOUT_SECONDS,
+            "hedge_after": settings.LLM_CHAT_HEDGE_AFTER_SECONDS,
+            "params": {"temperature": 0.7},
+        },
+        "meal_chat": {
+            "model": settings.LLM_MEAL_CHAT_MODEL, "timeout": settings.LLM_TIMEOUT_SECONDS,
+            "hedge_after": settings.LLM_CHAT_HEDGE_AFTER_SECONDS,
+            "params": {"temperature": 0.7},
+        },
+        "meal_plan": {
+            "model": settings.LLM_MEAL_PLAN_MODEL, "timeout": settings.LLM_MEAL_PLAN_TIMEOUT_SECONDS,
+            "params": {"temperature": 0.7, "max_tokens": 4000, "response_format": {"type": "json_object"}},
+        },
+        # Only the slots the recipe index could not fill
+        "meal_plan_chunk": {
+            "model": settings.LLM_PLAN_CHUNK_MODEL, "timeout": settings.LLM_MEAL_PLAN_TIMEOUT_SECONDS,
+            "params": {"temperature": 0.7, "max_tokens": 2000, "response_format": {"type": "json_object"}},
+        },
+        # One day or one meal of an existing plan
+        "meal_regenerate": {
+            "model": settings.LLM_PLAN_CHUNK_MODEL, "timeout": settings.LLM_TIMEOUT_SECONDS,
+            "params": {"temperature": 0.9, "max_tokens": 1200, "response_format": {"type": "json_object"}},
+        },
+    }
+    if task not in routes:
+        raise ValueError(f"No model route for LLM task {task!r}")
+    return routes[task]
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps retries from many coroutines from arriving together
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+async def _hedged(task: str, request, hedge_after: float):
+    """Start a second identical request if the first is slower than `hedge_after`"""
+    first = asyncio.ensure_future(request())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+    second = asyncio.ensure_future(request())
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if not future.exception():
+                    LLM_HEDGES.inc(task=task, winner="primary" if future is first else "hedge")
+                    return future.result()
+        # Both failed; surface the primary's error
+        return first.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def complete(task: str, messages: List[Dict[str, str]], firebase_uid: Optional[str] = None, **overrides: Any):
+    """
+    Chat completion for `task` using its route, with a per-attempt deadline,
+    jittered retries on retriable errors, a shared circuit breaker and
+    optional hedging. `overrides` replace the route's sampling parameters.
+
+    Raises LLMUnavailableError when the breaker is open or retries run out;
+    other provider errors (bad request, auth) are raised unchanged.
+    """
+    task_route = route(task)
+    model, timeout, hedge_after = task_route["model"], task_route["timeout"], task_route.get("hedge_after")
+    kwargs = {**task_route["params"], **overrides}
+    retries = settings.LLM_MAX_RETRIES
+    last_error: Optional[BaseException] = None
+
+    async def request():
+        return await asyncio.wait_for(
+            services.openai.chat.completions.create(model=model, messages=messages, **kwargs),
+            timeout
+        )
+
+    for attempt in range(retries + 1):
+        breaker.before_call()
+        started = time.perf_counter()
+        try:
+            with llm_call(task, model):
+                if hedge_after:
+                    response = await _hedged(task, request, hedge_after)
+                else:
+                    response = await request()
+        except RETRIABLE_ERRORS as e:
+            breaker.record_failure()
+            last_error = e
+            if attempt < retries and breaker.state != OPEN:
+                LLM_RETRIES.inc(task=task)
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            break
+        except BaseException:
+            breaker.release_trial()
+            raise
+        breaker.record_success()
+        record_llm_usage(response, task, model)
+        record_llm(task, model, kwargs, messages, response, time.perf_counter() - started)
+        await admission.record_usage(firebase_uid, response)
+        return response
+
+    retry_after = breaker.retry_after() if breaker.state == OPEN else settings.ADMISSION_RETRY_AFTER_SECONDS
+    raise LLMUnavailableError(f"OpenAI request failed: {last_error}", retry_after) from last_error
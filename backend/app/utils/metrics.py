@@ -0,0 +1,256 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Seconds. Covers sub-millisecond cache hits up to multi-second LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        for key, series in items:
+            for bound, bucket_count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+HTTP_REQUEST_DURATION = histogram("genie_http_request_duration_seconds", "Time until the last response byte is sent", ["method", "route", "status"])
+HTTP_REQUESTS_IN_FLIGHT = gauge("genie_http_requests_in_flight", "Requests currently being served")
+STAGE_DURATION = histogram("genie_stage_duration_seconds", "Duration of an instrumented stage", ["stage"])
+MONGO_COMMAND_DURATION = histogram("genie_mongo_command_duration_seconds", "MongoDB command round trip", ["command", "collection"])
+MONGO_COMMAND_FAILURES = counter("genie_mongo_command_failures_total", "Failed MongoDB commands", ["command", "collection"])
+CACHE_LOOKUPS = counter("genie_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
+LLM_REQUEST_DURATION = histogram("genie_llm_request_duration_seconds", "OpenAI request latency", ["task", "model"])
+LLM_TOKENS = counter("genie_llm_tokens_total", "OpenAI tokens consumed", ["task", "model", "kind"])
+LLM_FAILURES = counter("genie_llm_failures_total", "Failed OpenAI requests", ["task", "model"])
+WS_CONNECTIONS = gauge("genie_ws_connections", "Open WebSocket connections")
+WS_MESSAGES = counter("genie_ws_messages_total", "WebSocket messages pushed by result", ["type", "result"])
+
+
+@contextmanager
+def timed(metric: Histogram, **labels):
+    """Observe the wall time of the `with` block on `metric`, including when it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric.observe(time.perf_counter() - start, **labels)
+
+
+def stage(name: str):
+    """Shorthand for timing one named stage of a request or background job"""
+    return timed(STAGE_DURATION, stage=name)
+
+
+@contextmanager
+def llm_call(task: str, model: str):
+    """Time an OpenAI request and count it as failed if the block raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_FAILURES.inc(task=task, model=model)
+        raise
+    finally:
+        LLM_REQUEST_DURATION.observe(time.perf_counter() - start, task=task, model=model)
+
+
+def record_llm_usage(response, task: str, model: str) -> None:
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, task=task, model=model, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, task=task, model=model, kind="completion")
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command issued by every Motor client in the process"""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[object, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name, collection=collection)
+
+
+# Listeners only attach to clients created after registration, so this module
+# must be imported before the first AsyncIOMotorClient is built.
+monitoring.register(MongoCommandListener())
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        finished: Optional[float] = None
+
+        async def send_wrapper(message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                finished = time.perf_counter()
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Background tasks run after the body is sent; they are not part of
+            # the latency the client sees.
+            end = finished or time.perf_counter()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                end - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            )
@@ -0,0 +1,125 @@
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils import jobs
+from app.utils.metrics import CACHE_LOOKUPS
+
+MACROS = ("calories", "protein", "carbs", "fat")
+# kcal per gram, used for the share of energy each macro provides
+MACRO_KCAL = {"protein": 4, "carbs": 4, "fat": 9}
+
+# user id -> (cached at, (limit, window), summary)
+_summary_cache: Dict[str, Tuple[float, Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def nutrition_pipeline(user_id, limit: int) -> List[Dict[str, Any]]:
+    """
+    One row per plan day with that day's macro totals. Summing happens in
+    Mongo, so recipes and ingredient lists never leave the database.
+    """
+    return [
+        {"$match": {"userId": user_id, "status": {"$in": [jobs.COMPLETED, jobs.PARTIAL]}, "mealPlan.days": {"$exists": True}}},
+        {"$sort": {"startDate": -1}},
+        {"$limit": limit},
+        {"$unwind": "$mealPlan.days"},
+        {"$project": {
+            "startDate": 1,
+            "day": "$mealPlan.days.day",
+            **{macro: {"$sum": f"$mealPlan.days.meals.nutritionalInfo.{macro}"} for macro in MACROS},
+        }},
+    ]
+
+
+def macro_ratios(totals: Dict[str, float]) -> Dict[str, float]:
+    energy = {macro: totals.get(macro, 0) * kcal for macro, kcal in MACRO_KCAL.items()}
+    total_energy = sum(energy.values())
+    if not total_energy:
+        return {macro: 0.0 for macro in MACRO_KCAL}
+    return {macro: round(value / total_energy, 3) for macro, value in energy.items()}
+
+
+def _day_date(start_date: Optional[str], day: Any) -> Optional[str]:
+    try:
+        return (date.fromisoformat(start_date[:10]) + timedelta(days=int(day) - 1)).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(rows: List[Dict[str, Any]], window: int) -> Dict[str, Any]:
+    """
+    Fold the per-day rows into daily, per-plan and overall totals, macro
+    ratios and a rolling average over the last `window` days, in one pass.
+    """
+    for row in rows:
+        row["date"] = _day_date(row.get("startDate"), row.get("day"))
+    rows.sort(key=lambda row: (row["date"] or "", str(row["_id"])))
+
+    days: List[Dict[str, Any]] = []
+    plans: Dict[str, Dict[str, Any]] = {}
+    overall = {macro: 0.0 for macro in MACROS}
+    recent: deque = deque()
+    running = {macro: 0.0 for macro in MACROS}
+
+    for row in rows:
+        totals = {macro: row.get(macro) or 0 for macro in MACROS}
+        recent.append(totals)
+        for macro in MACROS:
+            running[macro] += totals[macro]
+            overall[macro] += totals[macro]
+        if len(recent) > window:
+            dropped = recent.popleft()
+            for macro in MACROS:
+                running[macro] -= dropped[macro]
+
+        plan_id = str(row["_id"])
+        plan = plans.get(plan_id)
+        if plan is None:
+            plan = plans[plan_id] = {"mealPlanId": plan_id, "startDate": row.get("startDate"), "days": 0, "totals": {macro: 0.0 for macro in MACROS}}
+        plan["days"] += 1
+        for macro in MACROS:
+            plan["totals"][macro] += totals[macro]
+
+        days.append({
+            "mealPlanId": plan_id,
+            "date": row["date"],
+            "day": row.get("day"),
+            "totals": totals,
+            "macroRatios": macro_ratios(totals),
+            "rollingAverage": {macro: round(running[macro] / len(recent), 1) for macro in MACROS},
+        })
+
+    for plan in plans.values():
+        plan["dailyAverage"] = {macro: round(plan["totals"][macro] / plan["days"], 1) for macro in MACROS}
+        plan["macroRatios"] = macro_ratios(plan["totals"])
+
+    return {
+        "window": window,
+        "days": days,
+        "plans": list(plans.values()),
+        "totals": overall,
+        "dailyAverage": {macro: round(overall[macro] / len(days), 1) if days else 0.0 for macro in MACROS},
+        "macroRatios": macro_ratios(overall),
+    }
+
+
+async def get_nutrition_summary(collection, user_id, limit: int = 20, window: int = 7) -> Dict[str, Any]:
+    """Nutrition analytics over the user's latest `limit` plans, cached per user"""
+    key = str(user_id)
+    cached = _summary_cache.get(key)
+    if cached and cached[1] == (limit, window) and time.monotonic() - cached[0] < settings.NUTRITION_CACHE_SECONDS:
+        CACHE_LOOKUPS.inc(cache="nutrition", result="hit")
+        return cached[2]
+    CACHE_LOOKUPS.inc(cache="nutrition", result="miss")
+
+    rows = await collection.aggregate(nutrition_pipeline(user_id, limit)).to_list(None)
+    summary = summarize(rows, window)
+    _summary_cache[key] = (time.monotonic(), (limit, window), summary)
+    return summary
+
+
+def invalidate_nutrition(user_id) -> None:
+    """Drop a user's cached summary; call whenever one of their plans changes"""
+    _summary_cache.pop(str(user_id), None)
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.utils import jobs, llm
+from app.utils.admission import admission
+from app.utils.metrics import counter
+from app.utils.services import services
+
+logger = logging.getLogger(__name__)
+
+PREFERENCE_FIELDS = ("mealType", "dietaryPreferences", "cuisineTypes", "complexityLevels", "dietaryRestrictions")
+GENERATING, READY = "generating", "ready"
+
+PREGENERATED = counter("genie_pregenerated_plans_total", "Plans generated ahead of demand by outcome", ["result"])
+
+_indexes_ready = False
+_pregenerator: Optional[asyncio.Task] = None
+
+
+def preference_key(meal_plan: Dict[str, Any], days: int) -> str:
+    """What a request must match to be served a pre-generated plan; dates do not matter"""
+    return json.dumps(
+        {"days": days, **{field: sorted(meal_plan.get(field) or []) for field in PREFERENCE_FIELDS}},
+        sort_keys=True
+    )
+
+
+def is_off_peak(now: datetime) -> bool:
+    """Whether the UTC hour falls in PREGENERATE_HOURS, e.g. "2-6" or "22-4\""""
+    start, end = (int(hour) for hour in settings.PREGENERATE_HOURS.split("-"))
+    hour = now.astimezone(timezone.utc).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+async def ensure_pregenerate_indexes() -> None:
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection = services.db[settings.PREGENERATED_COLLECTION]
+    # One pre-generated plan per user and preference set; also the claim lock
+    await collection.create_index([("userId", 1), ("key", 1)], unique=True)
+    await collection.create_index("expiresAt", expireAfterSeconds=0)
+    _indexes_ready = True
+
+
+async def predict(now: datetime) -> List[Dict[str, Any]]:
+    """
+    Users whose weekly plan is due within PREGENERATE_LEAD_HOURS, with the
+    preferences and dates of the plan they are expected to request next.
+    A user qualifies after PREGENERATE_MIN_PLANS plans in the lookback
+    window; the prediction repeats their latest plan a week later.
+    """
+    cadence = timedelta(days=7)
+    lookback = (now - timedelta(days=settings.PREGENERATE_LOOKBACK_DAYS)).isoformat()
+    # The latest plan was created between a week (plus a day of slack) ago and a week minus the lead ago
+    due_from = (now - cadence - timedelta(days=1)).isoformat()
+    due_until = (now - cadence + timedelta(hours=settings.PREGENERATE_LEAD_HOURS)).isoformat()
+    rows = await services.db[settings.MEAL_PLAN_COLLECTION].aggregate([
+        {"$match": {"status": jobs.COMPLETED, "createdAt": {"$gte": lookback}, "batchId": {"$exists": False}}},
+        {"$sort": {"createdAt": -1}},
+        {"$group": {
+            "_id": "$userId",
+            "plans": {"$sum": 1},
+            "createdAt": {"$first": "$createdAt"},
+            "firebaseUid": {"$first": "$firebaseUid"},
+            "startDate": {"$first": "$startDate"},
+            "endDate": {"$first": "$endDate"},
+            **{field: {"$first": f"${field}"} for field in PREFERENCE_FIELDS},
+        }},
+        {"$match": {"plans": {"$gte": settings.PREGENERATE_MIN_PLANS}, "createdAt": {"$gte": due_from, "$lte": due_until}}},
+        {"$limit": settings.PREGENERATE_BATCH_SIZE},
+    ]).to_list(settings.PREGENERATE_BATCH_SIZE)
+
+    predictions = []
+    for row in rows:
+        try:
+            start, end = date.fromisoformat(row["startDate"]) + cadence, date.fromisoformat(row["endDate"]) + cadence
+        except (TypeError, ValueError):
+            continue
+        predictions.append({
+            "userId": row["_id"],
+            "firebaseUid": row.get("firebaseUid"),
+            "startDate": start.isoformat(),
+            "endDate": end.isoformat(),
+            **{field: row.get(field) or [] for field in PREFERENCE_FIELDS},
+        })
+    return predictions
+
+
+async def tokens_spent(day: date) -> int:
+    doc = await services.db[settings.USAGE_COLLECTION].find_one({"_id": f"pregenerate:{day.isoformat()}"}, {"tokens": 1})
+    return doc.get("tokens", 0) if doc else 0
+
+
+async def spend(day: date, tokens: int) -> None:
+    await services.db[settings.USAGE_COLLECTION].update_one(
+        {"_id": f"pregenerate:{day.isoformat()}"},
+        {"$inc": {"tokens": tokens}, "$setOnInsert": {"expiresAt": datetime.combine(day + timedelta(days=2), datetime.min.time())}},
+        upsert=True
+    )
+
+
+async def take_pregenerated(user_id, meal_plan: Dict[str, Any], days: int) -> Optional[Dict[str, Any]]:
+    """Claim the user's pre-generated plan matching this request, if one is ready"""
+    doc = await services.db[settings.PREGENERATED_COLLECTION].find_one_and_delete(
+        {"userId": user_id, "key": preference_key(meal_plan, days), "status": READY},
+        projection={"mealPlan": 1}
+    )
+    return doc["mealPlan"] if doc else None
+
+
+async def pregenerate_once(generate: Callable[[Dict[str, Any]], Awaitable[Tuple[Dict[str, Any], int]]], now: Optional[datetime] = None) -> int:
+    """
+    Generate plans for due predictions until the daily token budget runs out
+    or live traffic picks up. `generate` returns the plan data and tokens
+    used. Returns how many plans were generated.
+    """
+    now = now or datetime.now()
+    await ensure_pregenerate_indexes()
+    collection = services.db[settings.PREGENERATED_COLLECTION]
+    today = datetime.now(timezone.utc).date()
+    generated = 0
+    for prediction in await predict(now):
+        if await tokens_spent(today) >= settings.PREGENERATE_DAILY_TOKENS:
+            break
+        if admission.inflight > settings.LLM_MAX_INFLIGHT * settings.PREGENERATE_MAX_LOAD:
+            break
+        days = (date.fromisoformat(prediction["endDate"]) - date.fromisoformat(prediction["startDate"])).days + 1
+        try:
+            # Claim first, so other workers skip this user
+            claim = await collection.insert_one({
+                "userId": prediction["userId"],
+                "key": preference_key(prediction, days),
+                "status": GENERATING,
+                "createdAt": datetime.now().isoformat(),
+                # Unclaimed plans are dropped once the week they were made for is under way
+                "expiresAt": datetime.combine(date.fromisoformat(prediction["startDate"]) + timedelta(days=2), datetime.min.time()),
+            })
+        except DuplicateKeyError:
+            continue
+        try:
+            meal_plan_data, tokens = await generate(prediction)
+        except asyncio.CancelledError:
+            # Shutting down; free the claim for whichever worker runs next
+            await collection.delete_one({"_id": claim.inserted_id})
+            raise
+        except Exception as e:
+            await collection.delete_one({"_id": claim.inserted_id})
+            PREGENERATED.inc(result="failed")
+            logger.warning("Pre-generating a meal plan failed: %s", e, extra={"user": str(prediction["userId"])})
+            # Leave a struggling provider alone until the next run
+            if isinstance(e, llm.LLMUnavailableError):
+                break
+            continue
+        await collection.update_one({"_id": claim.inserted_id}, {"$set": {"status": READY, "mealPlan": meal_plan_data, "tokens": tokens}})
+        await spend(today, tokens)
+        PREGENERATED.inc(result="generated")
+        generated += 1
+    return generated
+
+
+async def run_pregenerator(generate: Callable[[Dict[str, Any]], Awaitable[Tuple[Dict[str, Any], int]]]) -> None:
+    while True:
+        await asyncio.sleep(settings.PREGENERATE_INTERVAL_SECONDS)
+        if not is_off_peak(datetime.now(timezone.utc)):
+            continue
+        try:
+            await pregenerate_once(generate)
+        except Exception as e:
+            logger.exception("Pre-generation failed")
+
+
+def start_pregenerator(generate: Callable[[Dict[str, Any]], Awaitable[Tuple[Dict[str, Any], int]]]) -> None:
+    global _pregenerator
+    if settings.PREGENERATE_ENABLED:
+        _pregenerator = asyncio.create_task(run_pregenerator(generate))
+
+
+async def stop_pregenerator() -> None:
+    if _pregenerator:
+        await jobs.cancel_and_wait([_pregenerator], settings.JOB_RELEASE_TIMEOUT_SECONDS)
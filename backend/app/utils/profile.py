@@ -0,0 +1,262 @@
+import logging
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.utils.services import services
+from app.utils.shopping_list import normalize_item, parse_ingredient
+
+logger = logging.getLogger(__name__)
+
+MACROS = ("calories", "protein", "carbs", "fat")
+# Request fields counted per value, and the profile field each is counted under
+PREFERENCE_COUNTS = {
+    "cuisineTypes": "cuisines",
+    "dietaryPreferences": "dietaryPreferences",
+    "complexityLevels": "complexityLevels",
+    "mealType": "mealTypes",
+}
+
+# "no mushrooms", "without onion", "I don't like olives", "allergic to peanuts"
+_DISLIKE_RE = re.compile(
+    r"\b(?:no|without|hate|dislike|avoid|allergic to|(?:do not|don't|dont) (?:like|eat|want))\s+"
+    r"(?:any\s+|eating\s+|to eat\s+)?([a-z][a-z \-]{1,30}?)(?=\s*(?:[,.;!?]|\band\b|\bor\b|\bplease\b|$))",
+    re.IGNORECASE
+)
+_NOT_INGREDIENTS = {"more", "thank", "thanks", "thank you", "problem", "worry", "idea", "time", "longer", "cooking", "it", "that", "this", "them"}
+
+
+def _user_key(user_id) -> ObjectId:
+    """Profiles are keyed by the user document's ObjectId; chats pass it as a string"""
+    return user_id if isinstance(user_id, ObjectId) else ObjectId(str(user_id))
+
+
+def _field(value: str) -> str:
+    """A user-supplied value made safe to use as a field name"""
+    return value.lower().replace(".", " ").replace("$", "").strip()[:60]
+
+
+def ingredient_names(lines: Iterable[str]) -> List[str]:
+    names = []
+    for line in lines:
+        parsed = parse_ingredient(line)
+        name = parsed["item"] if parsed else normalize_item(line)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def disliked_in(text: str) -> List[str]:
+    """Ingredients a message asks to avoid"""
+    found = []
+    for match in _DISLIKE_RE.finditer(text or ""):
+        name = normalize_item(match.group(1))
+        if name and name not in _NOT_INGREDIENTS and name not in found:
+            found.append(name)
+    return found
+
+
+def _plan_request_update(meal_plan: Dict[str, Any]) -> Dict[str, Any]:
+    inc: Dict[str, int] = {"plans": 1}
+    for request_field, profile_field in PREFERENCE_COUNTS.items():
+        for value in meal_plan.get(request_field) or []:
+            if _field(value):
+                inc[f"{profile_field}.{_field(value)}"] = inc.get(f"{profile_field}.{_field(value)}", 0) + 1
+    update: Dict[str, Any] = {"$inc": inc}
+    restrictions = [r.lower() for r in meal_plan.get("dietaryRestrictions") or [] if r]
+    if restrictions:
+        update["$addToSet"] = {"restrictions": {"$each": restrictions}}
+    return update
+
+
+def _plan_completed_update(meal_plan_data: Dict[str, Any]) -> Dict[str, Any]:
+    days = (meal_plan_data or {}).get("days") or []
+    meals = [meal for day in days for meal in day.get("meals") or []]
+    inc = {f"macros.{macro}": 0 for macro in MACROS}
+    for meal in meals:
+        info = meal.get("nutritionalInfo") or {}
+        for macro in MACROS:
+            try:
+                inc[f"macros.{macro}"] += int(info.get(macro) or 0)
+            except (TypeError, ValueError):
+                pass
+    inc["macros.days"] = len(days)
+    return {
+        "$inc": inc,
+        "$push": {"recentMeals": {"$each": [meal.get("name") for meal in meals if meal.get("name")], "$slice": -settings.PROFILE_RECENT_MEALS}},
+    }
+
+
+async def _apply(user_id, update: Dict[str, Any]) -> None:
+    update = {**update, "$set": {**update.get("$set", {}), "updatedAt": datetime.now().isoformat()}}
+    collection = services.db[settings.PROFILE_COLLECTION]
+    try:
+        result = await collection.update_one({"_id": _user_key(user_id), "seeded": True}, update)
+        if not result.matched_count:
+            # Seed before the first live update, so history is never counted on top of it
+            await _seed(user_id)
+            await collection.update_one({"_id": _user_key(user_id)}, update, upsert=True)
+    except Exception as e:
+        # Personalization is best effort; never fail the request that triggered it
+        logger.warning("Failed to update user profile: %s", e)
+
+
+async def record_plan_request(user_id, meal_plan: Dict[str, Any]) -> None:
+    await _apply(user_id, _plan_request_update(meal_plan))
+
+
+async def record_plan_completed(user_id, meal_plan_data: Dict[str, Any]) -> None:
+    await _apply(user_id, _plan_completed_update(meal_plan_data))
+
+
+async def record_favorite(user_id, day: Dict[str, Any], is_favorite: bool) -> None:
+    """Ingredients of favorited days count as liked; unfavoriting takes them back"""
+    meals = day.get("meals") or []
+    step = 1 if is_favorite else -1
+    inc = Counter()
+    for meal in meals:
+        for name in ingredient_names(meal.get("ingredients") or []):
+            if _field(name):
+                inc[f"likedIngredients.{_field(name)}"] += step
+    names = [meal.get("name") for meal in meals if meal.get("name")]
+    update: Dict[str, Any] = {"$inc": dict(inc)} if inc else {}
+    if names:
+        update["$addToSet" if is_favorite else "$pull"] = {"likedMeals": {"$each": names} if is_favorite else {"$in": names}}
+    if update:
+        await _apply(user_id, update)
+
+
+async def record_replaced(user_id, meal_names: List[str], instructions: Optional[str] = None) -> None:
+    """Meals the user regenerated away, and anything their instructions ruled out"""
+    update: Dict[str, Any] = {}
+    if meal_names:
+        update["$push"] = {"dislikedMeals": {"$each": meal_names, "$slice": -settings.PROFILE_RECENT_MEALS}}
+    disliked = disliked_in(instructions or "")
+    if disliked:
+        update["$addToSet"] = {"dislikedIngredients": {"$each": disliked}}
+    if update:
+        await _apply(user_id, update)
+
+
+async def record_message(user_id, text: str) -> None:
+    """Pick up dislikes mentioned in chat; most messages mention none and cost nothing"""
+    disliked = disliked_in(text)
+    if disliked:
+        await _apply(user_id, {"$addToSet": {"dislikedIngredients": {"$each": disliked}}})
+
+
+async def _seed(user_id) -> None:
+    """
+    Build the parts of a profile that come from plan history for users
+    whose plans predate profiles. Live updates only land on a seeded
+    profile, so the history is written when the profile is created and is
+    never added to one that already has live counts.
+    """
+    plans = await services.db[settings.MEAL_PLAN_COLLECTION].find(
+        {"userId": _user_key(user_id), "status": "completed"},
+        {
+            **{field: 1 for field in (*PREFERENCE_COUNTS, "dietaryRestrictions")},
+            "mealPlan.days.meals.name": 1, "mealPlan.days.meals.nutritionalInfo": 1,
+        }
+    ).sort("createdAt", -1).limit(settings.PROFILE_SEED_PLANS).to_list(settings.PROFILE_SEED_PLANS)
+    plans.reverse()
+
+    inc: Counter = Counter()
+    restrictions, recent = set(), []
+    for plan in plans:
+        request = _plan_request_update(plan)
+        inc.update(request["$inc"])
+        restrictions.update(request.get("$addToSet", {}).get("restrictions", {}).get("$each", []))
+        completed = _plan_completed_update(plan.get("mealPlan") or {})
+        inc.update(completed["$inc"])
+        recent.extend(completed["$push"]["recentMeals"]["$each"])
+
+    history: Dict[str, Any] = {**inc, "createdAt": datetime.now().isoformat()}
+    if restrictions:
+        history["restrictions"] = sorted(restrictions)
+    if recent:
+        history["recentMeals"] = recent[-settings.PROFILE_RECENT_MEALS:]
+    try:
+        await services.db[settings.PROFILE_COLLECTION].update_one(
+            {"_id": _user_key(user_id)},
+            {"$set": {"seeded": True, "updatedAt": datetime.now().isoformat()}, "$setOnInsert": history},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker seeded it first
+        pass
+
+
+async def get_profile(user_id) -> Dict[str, Any]:
+    profile = await services.db[settings.PROFILE_COLLECTION].find_one({"_id": _user_key(user_id)})
+    if not (profile or {}).get("seeded"):
+        await _seed(user_id)
+        profile = await services.db[settings.PROFILE_COLLECTION].find_one({"_id": _user_key(user_id)})
+    return profile or {}
+
+
+async def set_preferences(
+    user_id,
+    macro_targets: Optional[Dict[str, int]] = None,
+    liked: Optional[List[str]] = None,
+    disliked: Optional[List[str]] = None,
+) -> None:
+    """Preferences the user stated, replacing what was learned; None leaves a field as is"""
+    update: Dict[str, Any] = {}
+    if macro_targets is not None:
+        update["macroTargets"] = macro_targets
+    if liked is not None:
+        # Counts start over from the user's own list
+        update["likedIngredients"] = {_field(name): 1 for name in ingredient_names(liked) if _field(name)}
+    if disliked is not None:
+        update["dislikedIngredients"] = ingredient_names(disliked)
+    if update:
+        # Seed first, or the backfill would count history on top of the user's list
+        await get_profile(user_id)
+        update["updatedAt"] = datetime.now().isoformat()
+        await services.db[settings.PROFILE_COLLECTION].update_one({"_id": _user_key(user_id)}, {"$set": update}, upsert=True)
+
+
+def _top(counts: Dict[str, int], n: int) -> List[str]:
+    return [name for name, count in sorted((counts or {}).items(), key=lambda item: -item[1]) if count > 0][:n]
+
+
+def liked_ingredients(profile: Dict[str, Any], n: int = 10) -> List[str]:
+    return _top(profile.get("likedIngredients"), n)
+
+
+def macro_targets(profile: Dict[str, Any]) -> Dict[str, int]:
+    """Targets the user set, otherwise what their plans have averaged per day"""
+    if profile.get("macroTargets"):
+        return profile["macroTargets"]
+    macros = profile.get("macros") or {}
+    days = macros.get("days") or 0
+    return {macro: round(macros.get(macro, 0) / days) for macro in MACROS} if days else {}
+
+
+def profile_context(profile: Dict[str, Any]) -> str:
+    """A few lines for the generation prompt, in place of whole previous plans"""
+    lines = []
+    cuisines = _top(profile.get("cuisines"), 5)
+    if cuisines:
+        lines.append(f"Cuisines they choose most: {', '.join(cuisines)}")
+    liked = liked_ingredients(profile)
+    if liked:
+        lines.append(f"Ingredients they like: {', '.join(liked)}")
+    if profile.get("dislikedIngredients"):
+        lines.append(f"Never use: {', '.join(profile['dislikedIngredients'])}")
+    if profile.get("likedMeals"):
+        lines.append(f"Meals they liked: {', '.join(profile['likedMeals'][-10:])}")
+    if profile.get("dislikedMeals"):
+        lines.append(f"Meals they replaced, avoid similar ones: {', '.join(profile['dislikedMeals'][-10:])}")
+    targets = macro_targets(profile)
+    if targets:
+        lines.append("Daily targets: {calories} kcal, {protein}g protein, {carbs}g carbs, {fat}g fat".format(**{m: targets.get(m, 0) for m in MACROS}))
+    if profile.get("recentMeals"):
+        lines.append(f"Recently served, do not repeat: {', '.join(profile['recentMeals'])}")
+    return "About this user:\n" + "\n".join(lines) + "\n" if lines else ""
@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import math
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.utils import jobs
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_KEY_RE = re.compile(r"[^a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "the", "of", "with", "in", "on", "to", "for", "or", "cup", "cups", "tbsp", "tsp", "g", "ml", "oz", "lb"}
+# Pick randomly among this many best matches so repeated requests vary
+TOP_CANDIDATES = 5
+# Plans read per query while refreshing
+REFRESH_BATCH = 500
+# Tags that are hard filters in `candidates`, so a recipe must never gain them
+CONSTRAINT_TAGS = ("restriction:", "preference:")
+# The only meal fields kept; whatever else a plan attached to a meal stays with that user
+SHARED_FIELDS = ("type", "name", "description", "ingredients", "recipe", "nutritionalInfo")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _tags(prefix: str, values: Optional[Iterable[str]]) -> Set[str]:
+    return {f"{prefix}:{v.strip().lower()}" for v in values or [] if isinstance(v, str) and v.strip()}
+
+
+def _is_valid_meal(meal: Any) -> bool:
+    return (
+        isinstance(meal, dict)
+        and isinstance(meal.get("name"), str) and meal["name"].strip()
+        and isinstance(meal.get("type"), str)
+        and isinstance(meal.get("ingredients"), list) and meal["ingredients"]
+        and meal.get("recipe")
+        and isinstance(meal.get("nutritionalInfo"), dict)
+    )
+
+
+class RecipeIndex:
+    """
+    In-process index of meals from completed plans.
+
+    Tags (meal type, cuisine, dietary preference and restriction) go in an
+    inverted index used as hard filters; meal text is scored with TF-IDF to
+    rank what passes. A meal keeps only the restriction and preference
+    tags common to every plan it appeared in, so it never matches a
+    constraint its stored recipe was not produced under.
+
+    The index is shared by all users on purpose: a meal generated for one
+    user is offered to others whose constraints it satisfies. Only the
+    recipe itself (SHARED_FIELDS) is kept, never the plan, its owner or
+    their favorites.
+    """
+
+    def __init__(self, max_meals: int):
+        self.max_meals = max_meals
+        # meal key -> {"meal", "tags", "tf", "length"}, oldest first
+        self._meals: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._df: Counter = Counter()
+        self._watermark = ""
+        self._refreshed_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._index_ready = False
+
+    def __len__(self) -> int:
+        return len(self._meals)
+
+    @staticmethod
+    def meal_key(meal: Dict[str, Any]) -> str:
+        return f"{meal['type'].strip().lower()}:{_KEY_RE.sub(' ', meal['name'].lower()).strip()}"
+
+    def add_plan(self, plan: Dict[str, Any]) -> int:
+        """Index the meals of a completed plan document; returns how many were new"""
+        plan_tags = (
+            _tags("cuisine", plan.get("cuisineTypes"))
+            | _tags("preference", plan.get("dietaryPreferences"))
+            | _tags("restriction", plan.get("dietaryRestrictions"))
+        )
+        added = 0
+        for day in (plan.get("mealPlan") or {}).get("days") or []:
+            for meal in day.get("meals") or []:
+                if not _is_valid_meal(meal):
+                    continue
+                key = self.meal_key(meal)
+                tags = plan_tags | _tags("type", [meal["type"]])
+                entry = self._meals.get(key)
+                if entry:
+                    self._retag(key, entry, tags)
+                    continue
+                text = " ".join([meal["name"], meal.get("description") or ""] + [i for i in meal["ingredients"] if isinstance(i, str)])
+                tf = Counter(tokenize(text))
+                shared = {field: meal[field] for field in SHARED_FIELDS if field in meal}
+                self._meals[key] = {"meal": shared, "tags": tags, "tf": tf, "length": sum(tf.values()) or 1}
+                self._df.update(tf.keys())
+                self._tag(key, tags)
+                added += 1
+        while len(self._meals) > self.max_meals:
+            self._evict_oldest()
+        return added
+
+    def _tag(self, key: str, tags: Iterable[str]) -> None:
+        for tag in tags:
+            self._postings.setdefault(tag, set()).add(key)
+
+    def _untag(self, key: str, tags: Iterable[str]) -> None:
+        for tag in tags:
+            keys = self._postings.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[tag]
+
+    def _retag(self, key: str, entry: Dict[str, Any], tags: Set[str]) -> None:
+        """
+        The same meal seen in another plan. Only the first recipe is kept, and
+        the new plan's constraints say nothing about it, so constraint tags
+        can only narrow to what both plans required; cuisine tags may widen.
+        """
+        merged = {tag for tag in entry["tags"] if not tag.startswith(CONSTRAINT_TAGS) or tag in tags}
+        merged |= {tag for tag in tags if not tag.startswith(CONSTRAINT_TAGS)}
+        self._untag(key, entry["tags"] - merged)
+        self._tag(key, merged - entry["tags"])
+        entry["tags"] = merged
+
+    def _evict_oldest(self) -> None:
+        key, entry = self._meals.popitem(last=False)
+        self._untag(key, entry["tags"])
+        for term in entry["tf"]:
+            self._df[term] -= 1
+            if self._df[term] <= 0:
+                del self._df[term]
+
+    def refresh(self, collection) -> None:
+        """
+        Start indexing plans completed since the last refresh, at most once
+        per RECIPE_INDEX_REFRESH_SECONDS. It runs in the background so no
+        request waits for it; until it lands, requests see the index as it was.
+        """
+        if time.monotonic() - self._refreshed_at < settings.RECIPE_INDEX_REFRESH_SECONDS:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh(collection))
+        self._refresh_task.add_done_callback(self._refresh_done)
+
+    @staticmethod
+    def _refresh_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error("Recipe index refresh failed", exc_info=task.exception())
+
+    async def _refresh(self, collection) -> int:
+        """
+        Index at most RECIPE_INDEX_MAX_PLANS plans: the newest ones on the
+        first build, then the oldest not yet seen, so a large backlog is
+        caught up over several refreshes instead of one long scan.
+        """
+        if not self._index_ready:
+            await collection.create_index([("status", 1), ("completedAt", 1)])
+            self._index_ready = True
+        projection = {"completedAt": 1, "cuisineTypes": 1, "dietaryPreferences": 1, "dietaryRestrictions": 1, "mealPlan.days.meals": 1}
+        added = 0
+        if not self._watermark:
+            plans = await collection.find({"status": jobs.COMPLETED}, projection).sort(
+                "completedAt", -1
+            ).limit(settings.RECIPE_INDEX_MAX_PLANS).to_list(settings.RECIPE_INDEX_MAX_PLANS)
+            for plan in reversed(plans):
+                added += self.add_plan(plan)
+            if plans:
+                self._watermark = plans[0]["completedAt"]
+        else:
+            remaining = settings.RECIPE_INDEX_MAX_PLANS
+            while remaining > 0:
+                batch = min(REFRESH_BATCH, remaining)
+                plans = await collection.find(
+                    {"status": jobs.COMPLETED, "completedAt": {"$gt": self._watermark}}, projection
+                ).sort("completedAt", 1).limit(batch).to_list(batch)
+                for plan in plans:
+                    added += self.add_plan(plan)
+                    self._watermark = plan["completedAt"]
+                remaining -= len(plans)
+                if len(plans) < batch:
+                    break
+        self._refreshed_at = time.monotonic()
+        return added
+
+    def _score(self, key: str, query: List[str]) -> float:
+        entry = self._meals[key]
+        total = len(self._meals)
+        return sum(
+            entry["tf"][term] / entry["length"] * math.log((1 + total) / (1 + self._df[term]))
+            for term in query if term in entry["tf"]
+        )
+
+    def candidates(self, meal_plan: Dict[str, Any], meal_type: str, exclude: Set[str]) -> List[str]:
+        """Meal keys satisfying the plan's constraints for `meal_type`, best first"""
+        keys = set(self._postings.get(f"type:{meal_type.strip().lower()}", ()))
+        for tag in _tags("restriction", meal_plan.get("dietaryRestrictions")) | _tags("preference", meal_plan.get("dietaryPreferences")):
+            keys &= self._postings.get(tag, set())
+            if not keys:
+                return []
+        cuisines = _tags("cuisine", meal_plan.get("cuisineTypes"))
+        if cuisines:
+            keys &= set().union(*(self._postings.get(tag, set()) for tag in cuisines))
+        keys -= exclude
+        query = tokenize(" ".join(
+            (meal_plan.get("cuisineTypes") or []) + (meal_plan.get("dietaryPreferences") or []) + (meal_plan.get("complexityLevels") or [])
+        ))
+        return sorted(keys, key=lambda key: self._score(key, query), reverse=True)
+
+    def assemble(self, meal_plan: Dict[str, Any], days: int, exclude_names: Iterable[str] = ()) -> Tuple[List[Dict[str, Any]], Dict[int, List[str]]]:
+        """
+        Fill as many (day, meal type) slots of the requested plan as the index
+        can without repeating a meal. Returns the days and the slots left
+        empty, keyed by day number.
+        """
+        exclude = {self.meal_key({"type": t, "name": name}) for name in exclude_names for t in meal_plan.get("mealType") or []}
+        pools = {}
+        for meal_type in meal_plan.get("mealType") or []:
+            ranked = self.candidates(meal_plan, meal_type, exclude)
+            head = ranked[:TOP_CANDIDATES]
+            random.shuffle(head)
+            pools[meal_type] = head + ranked[TOP_CANDIDATES:]
+
+        assembled, gaps = [], {}
+        for day in range(1, days + 1):
+            meals = []
+            for meal_type in meal_plan.get("mealType") or []:
+                if pools[meal_type]:
+                    meals.append(dict(self._meals[pools[meal_type].pop(0)]["meal"]))
+                else:
+                    gaps.setdefault(day, []).append(meal_type)
+            assembled.append({"day": day, "meals": meals})
+        return assembled, gaps
+
+
+def merge_generated(assembled: List[Dict[str, Any]], generated: Dict[str, Any], meal_types: List[str]) -> Dict[str, Any]:
+    """Slot LLM-generated meals into the gaps of an assembled plan"""
+    order = {meal_type.strip().lower(): i for i, meal_type in enumerate(meal_types)}
+    by_day = {day.get("day"): day for day in (generated or {}).get("days") or [] if isinstance(day, dict)}
+    days = []
+    for day in assembled:
+        generated_day = by_day.get(day["day"]) or {}
+        meals = list(day["meals"])
+        # Only take generated meals for slots that are still empty
+        taken = {meal["type"].strip().lower() for meal in meals}
+        for meal in generated_day.get("meals") or []:
+            meal_type = meal.get("type", "").strip().lower() if _is_valid_meal(meal) else None
+            if meal_type in order and meal_type not in taken:
+                taken.add(meal_type)
+                meals.append(meal)
+        if not meals:
+            continue
+        meals.sort(key=lambda meal: order.get(meal["type"].strip().lower(), len(order)))
+        if not day["meals"] and generated_day.get("description"):
+            description = generated_day["description"]
+        else:
+            description = "Today: " + ", ".join(meal["name"] for meal in meals)
+        days.append({"day": day["day"], "description": description, "meals": meals})
+    return {"days": days}
+
+
+recipe_index = RecipeIndex(settings.RECIPE_INDEX_MAX_MEALS)
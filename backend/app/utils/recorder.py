@@ -0,0 +1,88 @@
+"""
+Recording of LLM traffic for offline replay and profiling (see
+benchmarks/replay.py). Off unless LLM_RECORD_DIR is set; each worker then
+appends one JSON object per line to its own session file:
+
+    {"kind": "meal_plan", "jobId": ..., "request": {...}}
+    {"kind": "llm", "jobId": ..., "task": ..., "model": ..., "params": {...},
+     "messages": [...], "response": {...}, "latencyMs": ...}
+
+Entries are serialized and written on a background thread, like log records.
+"""
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.log import NonBlockingQueueHandler, job_id, request_id
+
+_logger = logging.getLogger("genie.recorder")
+_listener: Optional[QueueListener] = None
+
+
+class _EntryFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, default=str)
+
+
+def _start() -> None:
+    global _listener
+    os.makedirs(settings.LLM_RECORD_DIR, exist_ok=True)
+    path = os.path.join(settings.LLM_RECORD_DIR, f"session-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}.jsonl")
+    file_handler = logging.FileHandler(path, encoding="utf-8")
+    file_handler.setFormatter(_EntryFormatter())
+    entries: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _logger.handlers = [NonBlockingQueueHandler(entries)]
+    _logger.setLevel(logging.INFO)
+    # Recordings never go to the application log
+    _logger.propagate = False
+    _listener = QueueListener(entries, file_handler)
+    _listener.start()
+
+
+def record(kind: str, **fields: Any) -> None:
+    if not settings.LLM_RECORD_DIR:
+        return
+    if _listener is None:
+        _start()
+    _logger.info({
+        "kind": kind,
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "requestId": request_id.get(),
+        "jobId": job_id.get(),
+        **fields,
+    })
+
+
+def record_llm(task: str, model: str, params: Dict[str, Any], messages: List[Dict[str, str]], response, latency: float) -> None:
+    if not settings.LLM_RECORD_DIR:
+        return
+    choice = response.choices[0]
+    usage = getattr(response, "usage", None)
+    record(
+        "llm", task=task, model=model, params=params, messages=messages,
+        response={
+            "content": choice.message.content,
+            "finishReason": getattr(choice, "finish_reason", None),
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+                "total_tokens": getattr(usage, "total_tokens", 0),
+            } if usage else None,
+        },
+        latencyMs=round(latency * 1000, 1),
+    )
+
+
+def stop_recording() -> None:
+    """Flush and close the session file; called from the app lifespan"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
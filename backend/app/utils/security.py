@@ -1,6 +1,46 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS)
+
+# bcrypt holds a core for hundreds of milliseconds per hash, so it runs in
+# worker processes; the semaphore caps how much hashing can queue up.
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        _slots = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_PENDING)
+    return _executor, _slots
+
+async def _run(func, *args):
+    executor, slots = _pool()
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+async def hash_password_async(password: str) -> str:
+    """Hash off the event loop"""
+    return await _run(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """Verify off the event loop"""
+    return await _run(verify_password, password, hashed_password)
+
+def shutdown_hash_pool() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor, _slots = None, None
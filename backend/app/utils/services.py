@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+import firebase_admin
+import openai
+from firebase_admin import credentials
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """
+    Process-wide clients, created on first use rather than at import.
+
+    The app lifespan calls `startup` to build them and run warm-up checks
+    concurrently before traffic arrives, and `shutdown` to close them.
+    Anything that imports a module without starting the app (scripts,
+    benchmarks) still gets working clients on first access.
+    """
+
+    # Warm-up checks that must pass before the process reports ready
+    CRITICAL_CHECKS = ("mongo", "firebase")
+
+    def __init__(self):
+        self._mongo_client: Optional[AsyncIOMotorClient] = None
+        self._openai = None
+        self._openai_ready = False
+        self._firebase_ready = False
+        self.ready = False
+        self._started = False
+        # check name -> {"ok", "seconds", "error"}
+        self.checks: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def mongo_client(self) -> AsyncIOMotorClient:
+        if self._mongo_client is None:
+            if not settings.DATABASE_URL:
+                raise ValueError("Missing required MongoDB environment variables.")
+            self._mongo_client = AsyncIOMotorClient(
+                settings.DATABASE_URL, minPoolSize=settings.MONGO_MIN_POOL_SIZE, compressors=settings.MONGO_COMPRESSORS
+            )
+        return self._mongo_client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.mongo_client[settings.DATABASE_NAME]
+
+    @property
+    def openai(self):
+        """The shared AsyncOpenAI client, or None when no API key is configured"""
+        if not self._openai_ready:
+            if settings.OPENAI_API_KEY:
+                # Retries and deadlines are handled by app/utils/llm.py
+                self._openai = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+            else:
+                logger.warning("OPENAI_API_KEY not set. OpenAI features will not be available.")
+            self._openai_ready = True
+        return self._openai
+
+    def init_firebase(self) -> None:
+        """Initialize Firebase admin once; token verification needs the default app"""
+        if self._firebase_ready:
+            return
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
+            firebase_admin.initialize_app(cred)
+        self._firebase_ready = True
+
+    def override(self, mongo_client: Optional[AsyncIOMotorClient] = None, openai_client: Any = None) -> None:
+        """Swap in other clients, e.g. a local Mongo and a fake OpenAI for benchmarks"""
+        if mongo_client is not None:
+            self._mongo_client = mongo_client
+        if openai_client is not None:
+            self._openai = openai_client
+            self._openai_ready = True
+
+    async def _check(self, name: str, check: Awaitable) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check, settings.STARTUP_CHECK_TIMEOUT_SECONDS)
+            self.checks[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3), "error": None}
+        except Exception as e:
+            self.checks[name] = {"ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(e) or type(e).__name__}
+            logger.error("Startup check %s failed: %s", name, e)
+
+    async def _prime_mongo(self) -> None:
+        # Concurrent pings open MONGO_MIN_POOL_SIZE connections up front
+        await asyncio.gather(*(self.db.command("ping") for _ in range(max(1, settings.MONGO_MIN_POOL_SIZE))))
+
+    def _critical_check(self, name: str) -> Awaitable:
+        if name == "mongo":
+            return self._prime_mongo()
+        return asyncio.to_thread(self.init_firebase)
+
+    def _critical_ok(self) -> bool:
+        return all(self.checks.get(name, {}).get("ok") for name in self.CRITICAL_CHECKS)
+
+    async def startup(self, **warmups: Awaitable) -> None:
+        """Build clients and run the built-in and given warm-up checks concurrently"""
+        checks = {
+            **{name: self._critical_check(name) for name in self.CRITICAL_CHECKS},
+            **warmups,
+        }
+        await asyncio.gather(*(self._check(name, check) for name, check in checks.items()))
+        self.ready = self._critical_ok()
+        self._started = True
+        summary = ", ".join(f"{name}={'ok' if check['ok'] else 'failed'} ({check['seconds']}s)" for name, check in self.checks.items())
+        logger.info("Startup checks: %s", summary, extra={"ready": self.ready})
+
+    async def recheck(self) -> bool:
+        """
+        Re-run the critical checks that failed, so a dependency that was down
+        at boot doesn't keep the process unready after it recovers. Callers
+        rate-limit this; the readiness probe caches its result.
+        """
+        if not self._started:
+            return self.ready
+        failed = [name for name in self.CRITICAL_CHECKS if not self.checks.get(name, {}).get("ok")]
+        if failed:
+            await asyncio.gather(*(self._check(name, self._critical_check(name)) for name in failed))
+            self.ready = self._critical_ok()
+            if self.ready:
+                logger.info("Critical checks recovered: %s", ", ".join(failed))
+        return self.ready
+
+    async def shutdown(self) -> None:
+        self.ready = False
+        self._started = False
+        if self._openai is not None and hasattr(self._openai, "close"):
+            try:
+                await self._openai.close()
+            except Exception as e:
+                logger.warning("Failed to close OpenAI client: %s", e)
+        if self._mongo_client is not None:
+            self._mongo_client.close()
+            self._mongo_client = None
+
+
+services = Services()
@@ -0,0 +1,150 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# unit alias -> (canonical unit, dimension, factor to the dimension's base unit)
+# Volumes normalize to ml and weights to g; count-like units stay as they are.
+UNITS: Dict[str, Tuple[str, str, float]] = {}
+
+def _add_units(aliases: Iterable[str], canonical: str, dimension: str, factor: float) -> None:
+    for alias in aliases:
+        UNITS[alias] = (canonical, dimension, factor)
+
+_add_units(("ml", "milliliter", "milliliters", "millilitre", "millilitres"), "ml", "volume", 1)
+_add_units(("l", "liter", "liters", "litre", "litres"), "l", "volume", 1000)
+_add_units(("tsp", "tsps", "teaspoon", "teaspoons"), "tsp", "volume", 4.929)
+_add_units(("tbsp", "tbsps", "tbs", "tablespoon", "tablespoons"), "tbsp", "volume", 14.787)
+_add_units(("cup", "cups"), "cup", "volume", 240)
+_add_units(("fl oz", "fluid ounce", "fluid ounces"), "fl oz", "volume", 29.574)
+_add_units(("pint", "pints"), "pint", "volume", 473.176)
+_add_units(("g", "gram", "grams", "gr"), "g", "mass", 1)
+_add_units(("kg", "kilogram", "kilograms", "kilo", "kilos"), "kg", "mass", 1000)
+_add_units(("mg", "milligram", "milligrams"), "mg", "mass", 0.001)
+_add_units(("oz", "ounce", "ounces"), "oz", "mass", 28.35)
+_add_units(("lb", "lbs", "pound", "pounds"), "lb", "mass", 453.592)
+for _count_unit in ("clove", "slice", "can", "piece", "pinch", "dash", "bunch", "handful", "sprig", "stalk", "head", "packet", "sheet", "fillet", "stick"):
+    _add_units((_count_unit, _count_unit + "s", _count_unit + "es"), _count_unit, _count_unit, 1)
+
+UNICODE_FRACTIONS = {"½": 0.5, "⅓": 1 / 3, "⅔": 2 / 3, "¼": 0.25, "¾": 0.75, "⅛": 0.125, "⅜": 0.375, "⅝": 0.625, "⅞": 0.875}
+
+_NUMBER = r"(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?\s*[½⅓⅔¼¾⅛⅜⅝⅞]|\d+(?:\.\d+)?|[½⅓⅔¼¾⅛⅜⅝⅞])"
+_UNIT = "|".join(sorted((re.escape(u) for u in UNITS), key=len, reverse=True))
+INGREDIENT_RE = re.compile(
+    rf"""^\s*
+    (?:[-*•]\s*)?                                  # list bullet
+    (?P<qty>{_NUMBER})
+    (?:\s*(?:-|to)\s*(?P<qty_max>{_NUMBER}))?      # ranges such as 2-3
+    \s*
+    (?:(?P<unit>{_UNIT})\.?\b)?
+    \s*(?:of\s+)?
+    (?P<item>.+?)\s*$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+# Preparation notes that do not change what is bought
+_NOTES_RE = re.compile(r"\([^)]*\)|,.*$|\b(?:chopped|diced|minced|sliced|grated|fresh|freshly|large|medium|small|finely|roughly|to taste|optional)\b", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def parse_quantity(text: str) -> float:
+    """Parse "1 1/2", "½" or "2.5"; a zero denominator raises ValueError"""
+    text = text.strip()
+    total = 0.0
+    for symbol, value in UNICODE_FRACTIONS.items():
+        if symbol in text:
+            total += value
+            text = text.replace(symbol, "")
+    for part in text.split():
+        if "/" in part:
+            numerator, denominator = part.split("/", 1)
+            if not float(denominator):
+                raise ValueError(f"zero denominator in {part!r}")
+            total += float(numerator) / float(denominator)
+        elif part:
+            total += float(part)
+    return total
+
+
+def normalize_item(item: str) -> str:
+    item = _SPACES_RE.sub(" ", _NOTES_RE.sub(" ", item.lower())).strip(" .")
+    # Naive singularization is enough to merge "tomatoes" with "tomato"
+    if item.endswith("oes"):
+        item = item[:-2]
+    elif item.endswith("ies") and len(item) > 4:
+        item = item[:-3] + "y"
+    elif item.endswith("s") and not item.endswith(("ss", "us", "is")):
+        item = item[:-1]
+    return item
+
+
+def parse_ingredient(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Split "1 1/2 cups of rice" into quantity, unit and item. Returns None when
+    the line has no usable leading quantity (e.g. "salt to taste" or "1/0 cup").
+    """
+    match = INGREDIENT_RE.match(line)
+    if not match:
+        return None
+    try:
+        quantity = parse_quantity(match.group("qty_max") or match.group("qty"))
+    except (ValueError, ZeroDivisionError):
+        # One malformed line from the model must not fail the whole list
+        return None
+    unit_text = (match.group("unit") or "").lower()
+    item = normalize_item(match.group("item"))
+    if not item:
+        return None
+    if unit_text:
+        canonical, dimension, factor = UNITS[unit_text]
+    else:
+        canonical, dimension, factor = None, "count", 1
+    return {"item": item, "quantity": quantity, "unit": canonical, "dimension": dimension, "base": quantity * factor}
+
+
+def _display(dimension: str, base: float, units: List[str]) -> Tuple[float, Optional[str]]:
+    """Pick a readable unit for an aggregated amount"""
+    if dimension == "volume":
+        if len(set(units)) == 1 and units[0] in ("cup", "tbsp", "tsp"):
+            return base / UNITS[units[0]][2], units[0]
+        return (base / 1000, "l") if base >= 1000 else (base, "ml")
+    if dimension == "mass":
+        if len(set(units)) == 1 and units[0] in ("oz", "lb"):
+            return base / UNITS[units[0]][2], units[0]
+        return (base / 1000, "kg") if base >= 1000 else (base, "g")
+    if dimension == "count":
+        return base, None
+    return base, dimension
+
+
+def build_shopping_list(meal_plan_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aggregate every ingredient across all days and meals of a plan into a
+    deduplicated shopping list. Lines that cannot be parsed are kept, merged
+    by their normalized text, so nothing silently disappears from the list.
+    """
+    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    unparsed: Dict[str, Dict[str, Any]] = {}
+    for day in (meal_plan_data or {}).get("days") or []:
+        for meal in day.get("meals") or []:
+            for line in meal.get("ingredients") or []:
+                if not isinstance(line, str):
+                    continue
+                parsed = parse_ingredient(line)
+                if not parsed:
+                    key = normalize_item(line.lstrip("-*• "))
+                    if key:
+                        entry = unparsed.setdefault(key, {"item": key, "quantity": None, "unit": None, "occurrences": 0})
+                        entry["occurrences"] += 1
+                    continue
+                entry = totals.setdefault((parsed["item"], parsed["dimension"]), {"base": 0.0, "units": [], "occurrences": 0})
+                entry["base"] += parsed["base"]
+                entry["occurrences"] += 1
+                if parsed["unit"]:
+                    entry["units"].append(parsed["unit"])
+
+    items = []
+    for (item, dimension), entry in totals.items():
+        quantity, unit = _display(dimension, entry["base"], entry["units"])
+        items.append({"item": item, "quantity": round(quantity, 2), "unit": unit, "occurrences": entry["occurrences"]})
+    parsed_items = {item for item, _ in totals}
+    items.extend(entry for key, entry in unparsed.items() if key not in parsed_items)
+    items.sort(key=lambda i: i["item"])
+    return {"items": items}
@@ -0,0 +1,37 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi import BackgroundTasks
+
+from app.utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+POST_RESPONSE_TASKS = counter("genie_post_response_tasks_total", "Tasks run after the response was sent, by outcome", ["task", "result"])
+POST_RESPONSE_TASKS_IN_FLIGHT = gauge("genie_post_response_tasks_in_flight", "Post-response tasks currently running")
+POST_RESPONSE_TASK_DURATION = histogram("genie_post_response_task_duration_seconds", "Duration of a post-response task", ["task"])
+
+
+async def _tracked(name: str, fn: Callable[..., Awaitable[Any]], args, kwargs) -> None:
+    POST_RESPONSE_TASKS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        await fn(*args, **kwargs)
+    except Exception:
+        POST_RESPONSE_TASKS.inc(task=name, result="error")
+        logger.exception("Post-response task failed", extra={"task": name})
+    else:
+        POST_RESPONSE_TASKS.inc(task=name, result="ok")
+    finally:
+        POST_RESPONSE_TASK_DURATION.observe(time.perf_counter() - start, task=name)
+        POST_RESPONSE_TASKS_IN_FLIGHT.dec()
+
+
+def after_response(background_tasks: BackgroundTasks, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> None:
+    """
+    Run `fn` once the response has been sent. No client is left to see a
+    failure, so it is logged and counted instead, and it doesn't stop the
+    request's other background tasks from running as an exception would.
+    """
+    background_tasks.add_task(_tracked, fn.__name__, fn, args, kwargs)
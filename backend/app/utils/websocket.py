@@ -3,6 +3,9 @@ from firebase_admin import auth
 import json
 import logging
 
+from app.config import settings
+from app.utils.metrics import WS_CONNECTIONS, WS_MESSAGES, stage
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
@@ -15,27 +18,36 @@ class ConnectionManager:
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
-        logger.info(f"User {user_id} connected. Total connections: {len(self.active_connections[user_id])}")
+        WS_CONNECTIONS.inc()
+        logger.info("WebSocket connected", extra={"user": user_id, "connections": len(self.active_connections[user_id])})
 
     def disconnect(self, websocket: WebSocket, user_id: str):
         if user_id in self.active_connections:
             self.active_connections[user_id].remove(websocket)
-            logger.info(f"User {user_id} disconnected. Remaining connections: {len(self.active_connections[user_id]) if user_id in self.active_connections else 0}")
+            WS_CONNECTIONS.dec()
+            logger.info("WebSocket disconnected", extra={"user": user_id, "connections": len(self.active_connections[user_id])})
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
 
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
     async def send_message(self, message: dict, user_id: str):
         if user_id in self.active_connections:
-            logger.info(f"Sending message to user {user_id}: {message} and active connections: {self.active_connections}")
+            message_type = message.get("type", "unknown")
             for connection in self.active_connections[user_id]:
                 try:
-                    await connection.send_json(message)
-                    logger.info(f"Message sent successfully to one connection for user {user_id}")
+                    with stage("ws.delivery"):
+                        await connection.send_json(message)
+                    WS_MESSAGES.inc(type=message_type, result="sent")
+                    logger.debug("WebSocket message sent", extra={"user": user_id, "type": message_type, "sample": settings.LOG_SAMPLE_RATE})
                 except Exception as e:
-                    logger.error(f"Failed to send message to connection: {str(e)}")
+                    WS_MESSAGES.inc(type=message_type, result="failed")
+                    logger.warning("Failed to send WebSocket message: %s", e, extra={"user": user_id, "type": message_type})
         else:
-            logger.warning(f"No active connections found for user {user_id} and active connections: {list(self.active_connections.keys())}")
-            logger.debug(f"Active connections: {list(self.active_connections.keys())}")
+            WS_MESSAGES.inc(type=message.get("type", "unknown"), result="no_connection")
+            # Routine: progress updates for users who closed the page
+            logger.debug("No WebSocket connection for user", extra={"user": user_id, "type": message.get("type", "unknown"), "sample": settings.LOG_SAMPLE_RATE})
 
 # Create the connection manager instance
 manager = ConnectionManager()
@@ -44,11 +56,11 @@ manager = ConnectionManager()
 async def websocket_endpoint(websocket: WebSocket, user_id: str, token: str = None):
     try:
         # Log incoming connection attempt
-        logger.info(f"WebSocket connection attempt for user_id: {user_id}")
+        logger.debug("WebSocket connection attempt", extra={"user": user_id})
         
         # Check if token is provided
         if not token:
-            logger.error(f"No token provided for user_id: {user_id}")
+            logger.warning("WebSocket connection without a token", extra={"user": user_id})
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
@@ -59,13 +71,13 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, token: str = No
             
             # Verify that token UID matches the requested user_id
             if token_uid != user_id:
-                logger.error(f"Token UID ({token_uid}) doesn't match requested user_id ({user_id})")
+                logger.warning("WebSocket token UID %s doesn't match the requested user", token_uid, extra={"user": user_id})
                 await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
                 return
                 
-            logger.info(f"Token successfully verified for user: {user_id}")
+            logger.debug("WebSocket token verified", extra={"user": user_id})
         except Exception as e:
-            logger.error(f"Token verification failed for user_id {user_id}: {str(e)}")
+            logger.warning("WebSocket token verification failed: %s", e, extra={"user": user_id})
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
@@ -82,13 +94,12 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, token: str = No
                 try:
                     message = json.loads(data)
                     # Handle messages if needed
-                    logger.info(f"Received message from {user_id}: {message}")
+                    logger.debug("WebSocket message received", extra={"user": user_id, "type": message.get("type") if isinstance(message, dict) else None})
                 except:
                     pass
                     
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected for user_id: {user_id}")
         manager.disconnect(websocket, user_id)
     except Exception as e:
-        logger.error(f"Error in websocket connection for user_id {user_id}: {str(e)}")
+        logger.exception("Error in WebSocket connection", extra={"user": user_id})
         manager.disconnect(websocket, user_id)
\ No newline at end of file
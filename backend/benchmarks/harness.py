@@ -0,0 +1,278 @@
+"""
+Boots the FastAPI app in-process against a local Mongo stand-in, a stubbed
+OpenAI client and a stubbed Firebase verifier, and drives it over raw ASGI.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+# Settings are read from the environment at import time, so these must be in
+# place before anything under `app` is imported. The Mongo credentials only
+# need to exist; the client itself is swapped out below.
+os.environ.setdefault("MONGODB_USERNAME", "bench")
+os.environ.setdefault("MONGODB_PASSWORD", "bench")
+os.environ.setdefault("MONGODB_CLUSTER", "localhost")
+os.environ.setdefault("OPENAI_API_KEY", "bench-key")
+os.environ.setdefault("DATABASE_NAME", "genie_bench")
+
+BENCH_TOKEN_PREFIX = "bench-"
+
+
+def bench_token(uid: str) -> str:
+    """Bearer token accepted by the stubbed Firebase verifier"""
+    return f"{BENCH_TOKEN_PREFIX}{uid}"
+
+
+def _verify_id_token(token: str, *args, **kwargs) -> Dict[str, Any]:
+    if not token or not token.startswith(BENCH_TOKEN_PREFIX):
+        from firebase_admin.exceptions import FirebaseError
+        raise FirebaseError("invalid-argument", "Invalid bench token")
+    uid = token[len(BENCH_TOKEN_PREFIX):]
+    return {"uid": uid, "email": f"{uid}@bench.local"}
+
+
+class FakeCompletions:
+    """Stands in for `AsyncOpenAI().chat.completions` with a fixed latency"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = "\n".join(m["content"] for m in messages if isinstance(m, dict))
+        if kwargs.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps(_fake_meal_plan(prompt))
+        else:
+            content = "Here is a helpful answer about food, cooking and nutrition.\n- Tip one\n- Tip two"
+            if "<TITLE:" in prompt:
+                content += "\n<TITLE:Bench Conversation>"
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=(len(prompt) + len(content)) // 4,
+        )
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency))
+
+
+def _fake_meal_plan(prompt: str) -> Dict[str, Any]:
+    days_match = re.search(r"for (\d+) days", prompt)
+    days = int(days_match.group(1)) if days_match else 7
+    types_match = re.search(r"Meal types: ([^\n]*)", prompt)
+    meal_types = [t.strip() for t in types_match.group(1).split(",") if t.strip()] if types_match else ["breakfast", "lunch", "dinner"]
+    return {
+        "days": [
+            {
+                "day": day,
+                "description": f"Balanced day {day}",
+                "meals": [
+                    {
+                        "type": meal_type,
+                        "name": f"{meal_type.title()} bowl {day}",
+                        "description": "A simple, healthy bowl.",
+                        "ingredients": ["1 cup of rice", "200 g chicken breast", "1 tbsp olive oil", "2 cups spinach"],
+                        "recipe": [
+                            {"step": "Step 1", "description": "Cook the rice."},
+                            {"step": "Step 2", "description": "Sear the chicken in olive oil."},
+                            {"step": "Step 3", "description": "Wilt the spinach and serve."},
+                        ],
+                        "nutritionalInfo": {"calories": 550, "protein": 40, "carbs": 60, "fat": 15},
+                    }
+                    for meal_type in meal_types
+                ],
+            }
+            for day in range(1, days + 1)
+        ]
+    }
+
+
+def load_app(llm_latency: float = 0.0, mongo_uri: Optional[str] = None, provider_pacing: bool = False, tier: str = "coach"):
+    """
+    Import `app.main` with its external services swapped out.
+
+    With `mongo_uri` the app talks to a real (local) mongod, otherwise to an
+    in-memory mongomock instance. Bench users get the admission `tier` so
+    per-user limits do not dominate the numbers.
+    """
+    os.environ["DEFAULT_TIER"] = tier
+    import firebase_admin
+    from firebase_admin import auth as firebase_auth, credentials
+
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firebase_auth.verify_id_token = _verify_id_token
+
+    from app.main import app
+    from app.routers import meal_plan
+    from app.utils.services import services
+
+    if mongo_uri:
+        import motor.motor_asyncio
+        shared_client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        shared_client = AsyncMongoMockClient()
+    fake_openai = FakeOpenAI(llm_latency)
+    services.override(mongo_client=shared_client, openai_client=fake_openai)
+    if not provider_pacing:
+        # The generator spaces OpenAI calls 12s apart; that pacing protects
+        # the real provider and is not what we are measuring.
+        meal_plan.OPENAI_RATE_LIMIT = 10 ** 9
+
+    return app, shared_client, fake_openai
+
+
+class Response:
+    def __init__(self, status_code: int, headers: List, body: bytes):
+        self.status_code = status_code
+        self.headers = {k.decode().lower(): v.decode() for k, v in headers}
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+class WebSocketSession:
+    def __init__(self, task: asyncio.Task, inbound: asyncio.Queue, outbound: asyncio.Queue):
+        self._task = task
+        self._inbound = inbound
+        self._outbound = outbound
+
+    async def receive_json(self, timeout: Optional[float] = None) -> Any:
+        message = await asyncio.wait_for(self._outbound.get(), timeout)
+        if message["type"] == "websocket.close":
+            raise WebSocketClosed(message.get("code"))
+        return json.loads(message.get("text") or message.get("bytes"))
+
+    async def close(self) -> None:
+        await self._inbound.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+
+class ASGIClient:
+    """
+    Minimal in-process ASGI client.
+
+    Unlike httpx's ASGITransport, `request` returns as soon as the response
+    body is complete, so background tasks keep running after the response the
+    way they do behind a real server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._tasks = set()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def request(self, method: str, path: str, json_body: Any = None, token: Optional[str] = None, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Response:
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        raw_headers = [(b"host", b"bench")]
+        if json_body is not None:
+            raw_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if token:
+            raw_headers.append((b"authorization", f"Bearer {token}".encode()))
+        for key, value in (headers or {}).items():
+            raw_headers.append((key.lower().encode(), value.encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        request_sent = False
+        never = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Keep-alive client: never disconnects while the app is running.
+            await never.wait()
+            return {"type": "http.disconnect"}
+
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body") and not done.done():
+                    done.set_result(None)
+
+        task = self._spawn(self.app(scope, receive, send))
+        await asyncio.wait({done, task}, return_when=asyncio.FIRST_COMPLETED)
+        if not done.done():
+            task.result()
+            raise RuntimeError(f"{method} {path} finished without a response")
+        return Response(start["status"], start.get("headers", []), b"".join(chunks))
+
+    async def websocket(self, path: str, params: Optional[Dict[str, Any]] = None) -> WebSocketSession:
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "subprotocols": [],
+            "client": ("127.0.0.1", 50001),
+            "server": ("bench", 80),
+        }
+        inbound: asyncio.Queue = asyncio.Queue()
+        outbound: asyncio.Queue = asyncio.Queue()
+        await inbound.put({"type": "websocket.connect"})
+        task = self._spawn(self.app(scope, inbound.get, outbound.put))
+        first = await asyncio.wait_for(outbound.get(), 10)
+        if first["type"] != "websocket.accept":
+            raise WebSocketClosed(first.get("code"))
+        return WebSocketSession(task, inbound, outbound)
+
+    async def drain(self, timeout: float = 30) -> None:
+        """Wait for background work spawned by earlier requests"""
+        pending = [t for t in self._tasks if not t.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+
+def now() -> float:
+    return time.perf_counter()
@@ -0,0 +1,400 @@
+"""
+Replay recorded LLM sessions against the meal plan pipeline, offline.
+
+Record in any environment by setting LLM_RECORD_DIR (see
+app/utils/recorder.py), then run from the `backend` directory:
+
+    python -m benchmarks.replay recordings/session-*.jsonl
+    python -m benchmarks.replay recordings/*.jsonl -c 8 -r 5 --cpu --memory
+    python -m benchmarks.replay recordings/*.jsonl --latency recorded --pstats /tmp/replay.prof
+
+Each recorded generation is requested again through the API with its
+original constraints, and the LLM answers with the recorded responses. That
+makes everything the pipeline does around the LLM call deterministic:
+prompt building, JSON parsing, Mongo writes and WebSocket fan-out. The
+report gives wall time, CPU time and retained allocations per instrumented
+stage, plus the cProfile and tracemalloc hotspots.
+
+The response cache and the recipe index are disabled unless --warm-caches is
+given, so that every replay reaches the LLM step. Per-stage CPU and memory
+figures are exact at -c 1. At higher concurrency, a stage that awaits also
+counts work from other jobs interleaved with it.
+"""
+import argparse
+import asyncio
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+# Replays are not recorded again, and pregeneration would make unrecorded LLM calls
+os.environ["LLM_RECORD_DIR"] = ""
+os.environ["PREGENERATE_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.harness import ASGIClient, WebSocketClosed, load_app, now
+from benchmarks.run import git_commit, percentile
+from benchmarks.scenarios import API, BenchUser
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class ReplayMismatch(Exception):
+    """The pipeline asked for an LLM call the recording does not have"""
+
+
+class Session:
+    """One recorded generation: the plan request and the LLM calls it made, in order"""
+
+    def __init__(self, job_id: str, request: Dict[str, Any]):
+        self.job_id = job_id
+        self.request = request
+        self.calls: List[Dict[str, Any]] = []
+
+
+class Cursor:
+    """Position in a session during one replay of it"""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.position = 0
+        self.mismatches: List[str] = []
+
+
+# Set by the worker before it sends the request. The app task, and the
+# background generation inside it, inherit it, so concurrent replays each
+# read their own recording.
+_cursor: contextvars.ContextVar[Optional[Cursor]] = contextvars.ContextVar("replay_cursor", default=None)
+
+
+def load_sessions(paths: List[str]) -> List[Session]:
+    sessions: List[Session] = []
+    for path in paths:
+        current: Dict[str, Session] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                job_id = entry.get("jobId")
+                if not job_id:
+                    # Chat and title calls have no plan to replay
+                    continue
+                if entry["kind"] == "meal_plan":
+                    # A requeued job is generated again; each attempt is its own session
+                    current[job_id] = Session(job_id, entry["request"])
+                    sessions.append(current[job_id])
+                elif entry["kind"] == "llm" and job_id in current:
+                    current[job_id].calls.append(entry)
+    return [session for session in sessions if session.calls]
+
+
+class ReplayCompletions:
+    """Stands in for `AsyncOpenAI().chat.completions`, answering from the recording"""
+
+    def __init__(self, latency: str):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        self.calls += 1
+        cursor = _cursor.get()
+        if cursor is None or cursor.position >= len(cursor.session.calls):
+            raise ReplayMismatch(f"no recorded response left for a {model} call")
+        call = cursor.session.calls[cursor.position]
+        cursor.position += 1
+        if call["model"] != model:
+            cursor.mismatches.append(f"call {cursor.position}: recorded {call['model']}, replayed {model}")
+        if self.latency == "recorded":
+            await asyncio.sleep(call.get("latencyMs", 0) / 1000)
+        response = call["response"]
+        usage = SimpleNamespace(**response["usage"]) if response.get("usage") else None
+        message = SimpleNamespace(role="assistant", content=response["content"])
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message, finish_reason=response.get("finishReason"))], usage=usage)
+
+
+class ReplayOpenAI:
+    def __init__(self, latency: str):
+        self.chat = SimpleNamespace(completions=ReplayCompletions(latency))
+
+
+class StageProfiler:
+    """Wraps `metrics.stage` to add CPU time and retained allocations per stage"""
+
+    def __init__(self, original):
+        self.original = original
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0, "retained": 0})
+
+    @contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        try:
+            with self.original(name):
+                yield
+        finally:
+            stats = self.stats[name]
+            stats["calls"] += 1
+            stats["wall"] += time.perf_counter() - wall
+            stats["cpu"] += time.thread_time() - cpu
+            if tracemalloc.is_tracing():
+                stats["retained"] += tracemalloc.get_traced_memory()[0] - memory
+
+    def install(self) -> None:
+        # Modules call `stage` through their globals, so rebinding it there is enough
+        for name, module in list(sys.modules.items()):
+            if name.startswith("app.") and getattr(module, "stage", None) is self.original:
+                module.stage = self.stage
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "calls": stats["calls"],
+                "wall_ms": round(stats["wall"] * 1000, 3),
+                "cpu_ms": round(stats["cpu"] * 1000, 3),
+                "cpu_ms_per_call": round(stats["cpu"] * 1000 / stats["calls"], 3),
+                "retained_bytes": stats["retained"] if tracemalloc.is_tracing() else None,
+            }
+            for name, stats in sorted(self.stats.items(), key=lambda item: -item[1]["cpu"])
+        }
+
+
+def _short(filename: str) -> str:
+    if filename.startswith(os.getcwd()):
+        return os.path.relpath(filename)
+    for marker in ("site-packages" + os.sep, "lib" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1] if marker.startswith("site") else filename.rsplit(marker, 1)[1].split(os.sep, 1)[-1]
+    return filename
+
+
+def cpu_hotspots(profiler: cProfile.Profile, top: int) -> Dict[str, List[Dict[str, Any]]]:
+    stats = pstats.Stats(profiler).stats
+
+    def rows(key, only_app: bool):
+        entries = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.items():
+            if only_app and f"{os.sep}app{os.sep}" not in filename:
+                continue
+            entries.append({
+                "function": f"{_short(filename)}:{line}({function})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            })
+        return sorted(entries, key=lambda row: -row[key])[:top]
+
+    return {"by_own_time": rows("own_ms", False), "app_by_cumulative_time": rows("cumulative_ms", True)}
+
+
+def allocation_hotspots(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int) -> List[Dict[str, Any]]:
+    """Lines whose live allocations grew the most during the replay"""
+    # Leave out what the profilers themselves hold
+    ignore = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+    before, after = before.filter_traces(ignore), after.filter_traces(ignore)
+    return [
+        {"line": f"{_short(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", "bytes": stat.size_diff, "blocks": stat.count_diff}
+        for stat in after.compare_to(before, "lineno")[:top]
+    ]
+
+
+async def replay_worker(client: ASGIClient, user: BenchUser, queue: "asyncio.Queue[Session]", results: List[Dict[str, Any]]) -> None:
+    ws = await client.websocket(f"{API}/ws/{user.uid}", {"token": user.token})
+    try:
+        await ws.receive_json(10)  # connection_status
+        while not queue.empty():
+            session = queue.get_nowait()
+            cursor = Cursor(session)
+            token = _cursor.set(cursor)
+            started = now()
+            outcome, error = "error", None
+            try:
+                response = await client.request("POST", f"{API}/meal-plans/", session.request, token=user.token)
+                if response.status_code != 200:
+                    raise RuntimeError(f"unexpected status {response.status_code}: {response.body[:200]!r}")
+                plan_id = response.json()["_id"]
+                while True:
+                    message = await ws.receive_json(60)
+                    if message.get("meal_plan_id") != plan_id:
+                        continue
+                    if message.get("type") == "meal_plan_completed":
+                        outcome = (message.get("meal_plan_data") or {}).get("status", "completed")
+                        break
+                    if message.get("type") == "meal_plan_error":
+                        error = message.get("error")
+                        break
+            except (asyncio.TimeoutError, WebSocketClosed, RuntimeError) as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                _cursor.reset(token)
+            if cursor.position < len(session.calls):
+                cursor.mismatches.append(f"{len(session.calls) - cursor.position} recorded calls unused")
+            results.append({
+                "jobId": session.job_id,
+                "seconds": now() - started,
+                "outcome": outcome,
+                "error": error,
+                "mismatches": cursor.mismatches,
+            })
+    finally:
+        await ws.close()
+
+
+async def run(args) -> Dict[str, Any]:
+    sessions = load_sessions(args.recordings)
+    if not sessions:
+        raise SystemExit("no replayable meal plan sessions in the recordings")
+    if args.memory:
+        tracemalloc.start(args.memory_frames)
+
+    app, mongo_client, _ = load_app(0, args.mongo_uri)
+    if args.mongo_uri:
+        await mongo_client.drop_database(os.environ["DATABASE_NAME"])
+    from app.config import settings
+    from app.routers import meal_plan
+    from app.utils import metrics
+    from app.utils.services import services
+
+    replay_openai = ReplayOpenAI(args.latency)
+    services.override(openai_client=replay_openai)
+    if not args.warm_caches:
+        settings.RECIPE_INDEX_ENABLED = False
+        # Looked up through the module's globals, like `stage`
+        meal_plan.get_cached_response = lambda key: None
+    stages = StageProfiler(metrics.stage)
+    stages.install()
+
+    client = ASGIClient(app)
+    # Not profiled: connecting is done once per worker
+    users = [BenchUser(f"replay-user-{i}") for i in range(args.concurrency)]
+    for user in users:
+        await client.request("GET", f"{API}/meal-plans/", token=user.token)
+
+    queue: "asyncio.Queue[Session]" = asyncio.Queue()
+    for _ in range(args.repeat):
+        for session in sessions:
+            queue.put_nowait(session)
+    results: List[Dict[str, Any]] = []
+
+    profiler = cProfile.Profile() if args.cpu else None
+    if args.memory:
+        snapshot_before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    wall_start = now()
+    if profiler:
+        profiler.enable()
+    try:
+        await asyncio.gather(*(replay_worker(client, user, queue, results) for user in users))
+        await client.drain()
+    finally:
+        if profiler:
+            profiler.disable()
+    wall = now() - wall_start
+
+    latencies = sorted(result["seconds"] for result in results)
+    outcomes: Dict[str, int] = defaultdict(int)
+    for result in results:
+        outcomes[result["outcome"]] += 1
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "mongo": "mongod" if args.mongo_uri else "mongomock",
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "sessions": len(sessions),
+        "replays": len(results),
+        "llm_calls": replay_openai.chat.completions.calls,
+        "outcomes": dict(outcomes),
+        "errors": [{"jobId": r["jobId"], "error": r["error"]} for r in results if r["error"]][:args.top],
+        "mismatches": [{"jobId": r["jobId"], "mismatches": r["mismatches"]} for r in results if r["mismatches"]][:args.top],
+        "wall_seconds": round(wall, 4),
+        "throughput_per_second": round(len(results) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "stages": stages.report(),
+    }
+    if profiler:
+        report["cpu"] = cpu_hotspots(profiler, args.top)
+        if args.pstats:
+            profiler.dump_stats(args.pstats)
+    if args.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        report["memory"] = {
+            "traced_peak_bytes": peak - traced_before,
+            "traced_retained_bytes": current - traced_before,
+            "top_allocations": allocation_hotspots(snapshot_before, tracemalloc.take_snapshot(), args.top),
+        }
+        tracemalloc.stop()
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    latency = report["latency_ms"]
+    print(
+        f"{report['replays']} replays of {report['sessions']} sessions in {report['wall_seconds']}s "
+        f"({report['throughput_per_second']}/s)  p50 {latency['p50']}ms  p95 {latency['p95']}ms  "
+        f"outcomes {report['outcomes']}"
+    )
+    for error in report["errors"]:
+        print(f"  error {error['jobId']}: {error['error']}")
+    for mismatch in report["mismatches"]:
+        print(f"  mismatch {mismatch['jobId']}: {'; '.join(mismatch['mismatches'])}")
+    print(f"\n{'stage':<28}{'calls':>7}{'wall ms':>11}{'cpu ms':>11}{'cpu/call':>10}{'retained':>12}")
+    for name, stats in report["stages"].items():
+        print(f"{name:<28}{stats['calls']:>7}{stats['wall_ms']:>11.2f}{stats['cpu_ms']:>11.2f}{stats['cpu_ms_per_call']:>10.3f}{stats['retained_bytes'] if stats['retained_bytes'] is not None else '-':>12}")
+    if "cpu" in report:
+        print(f"\n{'own ms':>10}{'cum ms':>11}{'calls':>9}  function (app code, by cumulative time)")
+        for row in report["cpu"]["app_by_cumulative_time"]:
+            print(f"{row['own_ms']:>10.2f}{row['cumulative_ms']:>11.2f}{row['calls']:>9}  {row['function']}")
+        print(f"\n{'own ms':>10}{'cum ms':>11}{'calls':>9}  function (all code, by own time)")
+        for row in report["cpu"]["by_own_time"]:
+            print(f"{row['own_ms']:>10.2f}{row['cumulative_ms']:>11.2f}{row['calls']:>9}  {row['function']}")
+    if "memory" in report:
+        memory = report["memory"]
+        print(f"\ntraced peak {memory['traced_peak_bytes']} bytes, retained {memory['traced_retained_bytes']} bytes")
+        for row in memory["top_allocations"]:
+            print(f"{row['bytes']:>12}{row['blocks']:>9}  {row['line']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded LLM sessions against the meal plan pipeline")
+    parser.add_argument("recordings", nargs="+", help="session files written under LLM_RECORD_DIR")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="replays in flight at once, one user each")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="times each session is replayed")
+    parser.add_argument("--latency", choices=("none", "recorded"), default="none", help="answer at once or after the recorded LLM latency")
+    parser.add_argument("--cpu", action="store_true", help="profile with cProfile")
+    parser.add_argument("--memory", action="store_true", help="trace allocations with tracemalloc (slower)")
+    parser.add_argument("--memory-frames", type=int, default=1, help="traceback depth kept by tracemalloc")
+    parser.add_argument("--pstats", help="also write the cProfile stats here, e.g. for snakeviz")
+    parser.add_argument("--top", type=int, default=20, help="rows per hotspot table")
+    parser.add_argument("--warm-caches", action="store_true", help="keep the response cache and recipe index on")
+    parser.add_argument("--mongo-uri", help="use a real local mongod instead of mongomock")
+    parser.add_argument("-o", "--output", help="result file (default: benchmarks/results/replay-<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"replay-{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nwrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
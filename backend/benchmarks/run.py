@@ -0,0 +1,221 @@
+"""
+API benchmark runner.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.run                          # all scenarios
+    python -m benchmarks.run -s fetch_plan -s mixed -c 32 -n 2000
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.run compare benchmarks/results/a.json benchmarks/results/b.json
+
+Needs `mongomock-motor` (or a local mongod via `--mongo-uri`) on top of the
+app's own dependencies. Results are written as JSON to `benchmarks/results/`
+named after the current commit.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.harness import ASGIClient, load_app, now
+from benchmarks.scenarios import NEEDS_PLANS, SCENARIOS, BenchUser, generate_plan
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def rss_bytes() -> int:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenario(client: ASGIClient, name: str, users: List[BenchUser], requests: int, concurrency: int, trace_memory: bool) -> Dict[str, Any]:
+    operation = SCENARIOS[name]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            user = users[i % len(users)]
+            started = now()
+            try:
+                await operation(client, user)
+            except Exception as e:
+                key = f"{type(e).__name__}: {str(e)[:80]}"
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(now() - started)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    if trace_memory:
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    wall_start = now()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = now() - wall_start
+    # Let background generations finish so they are attributed to this scenario.
+    await client.drain()
+
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "memory": {
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": rss_bytes(),
+        },
+    }
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        result["memory"]["traced_peak_bytes"] = peak - traced_before
+        result["memory"]["traced_retained_bytes"] = current - traced_before
+    return result
+
+
+async def seed_plans(client: ASGIClient, users: List[BenchUser], per_user: int) -> None:
+    for user in users:
+        while len(user.meal_plan_ids) < per_user:
+            await generate_plan(client, user)
+
+
+async def run(args) -> Dict[str, Any]:
+    random.seed(args.seed)
+    if args.trace_memory:
+        tracemalloc.start()
+    app, mongo_client, fake_openai = load_app(args.llm_latency_ms / 1000, args.mongo_uri, args.provider_pacing, args.tier)
+    if args.mongo_uri:
+        await mongo_client.drop_database(os.environ["DATABASE_NAME"])
+
+    client = ASGIClient(app)
+    users = [BenchUser(f"bench-user-{i}") for i in range(args.users)]
+    scenario_names = args.scenario or list(SCENARIOS)
+    if NEEDS_PLANS.intersection(scenario_names):
+        await seed_plans(client, users, args.seed_plans)
+
+    results: Dict[str, Any] = {}
+    for name in scenario_names:
+        calls_before = fake_openai.chat.completions.calls
+        await run_scenario(client, name, users, max(1, args.warmup), args.concurrency, False)
+        results[name] = await run_scenario(client, name, users, args.requests, args.concurrency, args.trace_memory)
+        results[name]["llm_calls"] = fake_openai.chat.completions.calls - calls_before
+        latency = results[name]["latency_ms"]
+        print(f"{name:>14}: {results[name]['throughput_rps']:>9} req/s  p50 {latency['p50']:>8}ms  p95 {latency['p95']:>8}ms  p99 {latency['p99']:>8}ms  errors {sum(results[name]['errors'].values())}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo": "mongod" if args.mongo_uri else "mongomock",
+            "args": {k: v for k, v in vars(args).items() if k not in ("command", "output")},
+        },
+        "scenarios": results,
+    }
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print p50/p95/p99 deltas; return non-zero if any p95 regressed beyond `threshold` percent"""
+    baseline = json.loads(Path(baseline_path).read_text())["scenarios"]
+    candidate = json.loads(Path(candidate_path).read_text())["scenarios"]
+    regressed = False
+    for name in sorted(set(baseline) & set(candidate)):
+        parts = []
+        for key in ("p50", "p95", "p99"):
+            before = baseline[name]["latency_ms"][key]
+            after = candidate[name]["latency_ms"][key]
+            delta = ((after - before) / before * 100) if before else 0.0
+            parts.append(f"{key} {before:.2f}->{after:.2f}ms ({delta:+.1f}%)")
+            if key == "p95" and delta > threshold:
+                regressed = True
+        rps_before = baseline[name]["throughput_rps"]
+        rps_after = candidate[name]["throughput_rps"]
+        parts.append(f"rps {rps_before}->{rps_after}")
+        print(f"{name:>14}: " + "  ".join(parts))
+    if regressed:
+        print(f"p95 regression above {threshold}% detected")
+    return 1 if regressed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Genie API in-process")
+    sub = parser.add_subparsers(dest="command")
+
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("candidate")
+    cmp_parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression in percent")
+
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable, default: all)")
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-u", "--users", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed-plans", type=int, default=2, help="completed plans per user before read scenarios")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="simulated OpenAI latency")
+    parser.add_argument("--mongo-uri", help="use a real local mongod instead of mongomock")
+    parser.add_argument("--provider-pacing", action="store_true", help="keep the generator's OpenAI request pacing")
+    parser.add_argument("--tier", default="coach", help="admission tier given to bench users")
+    parser.add_argument("--trace-memory", action="store_true", help="record tracemalloc peaks (slower)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-o", "--output", help="result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        return compare(args.baseline, args.candidate, args.threshold)
+
+    started = time.time()
+    report = asyncio.run(run(args))
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"wrote {output} in {time.time() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Benchmark scenarios. Each scenario is a coroutine that performs one operation
+for a bench user and returns once that operation is complete.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.harness import ASGIClient, bench_token
+
+API = "/api/v1"
+
+MEAL_PLAN_REQUEST = {
+    "mealType": ["breakfast", "lunch", "dinner"],
+    "dietaryPreferences": ["high protein"],
+    "cuisineTypes": ["mediterranean"],
+    "complexityLevels": ["easy"],
+    "dietaryRestrictions": [],
+}
+
+
+class BenchUser:
+    def __init__(self, uid: str):
+        self.uid = uid
+        self.token = bench_token(uid)
+        self.meal_plan_ids: List[str] = []
+        self.chat_ids: List[str] = []
+
+
+def meal_plan_payload(days: int = 7) -> Dict[str, Any]:
+    start = date.today()
+    return {**MEAL_PLAN_REQUEST, "startDate": start.isoformat(), "endDate": (start + timedelta(days=days - 1)).isoformat()}
+
+
+def _check(response, expected: int = 200):
+    if response.status_code != expected:
+        raise RuntimeError(f"unexpected status {response.status_code}: {response.body[:200]!r}")
+    return response
+
+
+async def create_plan(client: ASGIClient, user: BenchUser) -> None:
+    """POST a meal plan; measures the request only, generation continues in the background"""
+    response = _check(await client.request("POST", f"{API}/meal-plans/", meal_plan_payload(), token=user.token))
+    user.meal_plan_ids.append(response.json()["_id"])
+
+
+async def generate_plan(client: ASGIClient, user: BenchUser) -> None:
+    """POST a meal plan and wait for the `meal_plan_completed` WebSocket push"""
+    ws = await client.websocket(f"{API}/ws/{user.uid}", {"token": user.token})
+    try:
+        await ws.receive_json(10)  # connection_status
+        response = _check(await client.request("POST", f"{API}/meal-plans/", meal_plan_payload(), token=user.token))
+        plan_id = response.json()["_id"]
+        while True:
+            message = await ws.receive_json(60)
+            if message.get("type") == "meal_plan_completed" and message.get("meal_plan_id") == plan_id:
+                user.meal_plan_ids.append(plan_id)
+                return
+    finally:
+        await ws.close()
+
+
+async def list_plans(client: ASGIClient, user: BenchUser) -> None:
+    _check(await client.request("GET", f"{API}/meal-plans/", token=user.token))
+
+
+async def fetch_plan(client: ASGIClient, user: BenchUser) -> None:
+    if not user.meal_plan_ids:
+        raise RuntimeError("user has no meal plans; seed before fetching")
+    plan_id = random.choice(user.meal_plan_ids)
+    _check(await client.request("GET", f"{API}/meal-plans/{plan_id}", token=user.token))
+
+
+async def chat_turn(client: ASGIClient, user: BenchUser) -> None:
+    """Send one message to an existing chat, creating the chat on first use"""
+    if not user.chat_ids:
+        response = _check(await client.request("POST", f"{API}/chats/", token=user.token))
+        user.chat_ids.append(response.json()["_id"])
+    chat_id = random.choice(user.chat_ids)
+    _check(await client.request("POST", f"{API}/chats/{chat_id}/messages", {"message": "What is a good high protein breakfast?"}, token=user.token))
+
+
+async def ws_subscribe(client: ASGIClient, user: BenchUser) -> None:
+    """Open a WebSocket, wait for the connection status and close it"""
+    ws = await client.websocket(f"{API}/ws/{user.uid}", {"token": user.token})
+    try:
+        await ws.receive_json(10)
+    finally:
+        await ws.close()
+
+
+Operation = Callable[[ASGIClient, BenchUser], Awaitable[None]]
+
+# Weighted mix modelled on a typical session: mostly reads and chat, with the
+# occasional new plan.
+MIXED_WEIGHTS: Dict[str, int] = {
+    "fetch_plan": 40,
+    "list_plans": 20,
+    "chat_turn": 25,
+    "ws_subscribe": 10,
+    "create_plan": 5,
+}
+
+OPERATIONS: Dict[str, Operation] = {
+    "create_plan": create_plan,
+    "generate_plan": generate_plan,
+    "list_plans": list_plans,
+    "fetch_plan": fetch_plan,
+    "chat_turn": chat_turn,
+    "ws_subscribe": ws_subscribe,
+}
+
+
+async def mixed(client: ASGIClient, user: BenchUser) -> None:
+    names = list(MIXED_WEIGHTS)
+    name = random.choices(names, weights=[MIXED_WEIGHTS[n] for n in names])[0]
+    await OPERATIONS[name](client, user)
+
+
+SCENARIOS: Dict[str, Operation] = {**OPERATIONS, "mixed": mixed}
+
+# Scenarios that need completed plans to exist before they are measured.
+NEEDS_PLANS = {"fetch_plan", "mixed"}
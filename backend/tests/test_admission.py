@@ -0,0 +1,104 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.utils.admission import TIERS, AdmissionController
+
+
+def _controller(tokens_used=0, *uids):
+    controller = AdmissionController()
+    today = datetime.now(timezone.utc).date().isoformat()
+    # Seed the quota cache so admission never reads Mongo
+    for uid in uids or ("u1",):
+        controller._usage_cache[uid] = (today, tokens_used, time.monotonic())
+    return controller
+
+
+def _user(uid="u1", tier="free"):
+    return {"firebaseUid": uid, "tier": tier}
+
+
+def _admit(controller, user, kind="generation"):
+    return asyncio.run(controller.admit(user, kind))
+
+
+def test_per_user_inflight_limit():
+    controller = _controller()
+    tickets = [_admit(controller, _user(), "chat") for _ in range(int(TIERS["free"]["chat"]))]
+
+    with pytest.raises(HTTPException) as raised:
+        _admit(controller, _user(), "chat")
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == str(settings.ADMISSION_RETRY_AFTER_SECONDS)
+    # Limits are per kind
+    _admit(controller, _user(), "generation")
+
+    tickets[0].release()
+    _admit(controller, _user(), "chat")
+
+
+def test_release_is_idempotent():
+    controller = _controller()
+    ticket = _admit(controller, _user())
+    ticket.release()
+    ticket.release()
+
+    assert controller.inflight == 0
+    _admit(controller, _user())
+
+
+def test_process_capacity_is_shared_by_tier(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_INFLIGHT", 10)
+    uids = [f"u{i}" for i in range(8)]
+    controller = _controller(0, *uids)
+    # Free users may fill 60% of capacity
+    for uid in uids[:6]:
+        _admit(controller, _user(uid))
+
+    with pytest.raises(HTTPException) as raised:
+        _admit(controller, _user(uids[6]))
+    assert raised.value.status_code == 429
+    # The coach tier keeps the headroom
+    _admit(controller, _user(uids[7], "coach"))
+    assert controller.inflight == 7
+
+
+def test_daily_token_limit():
+    controller = _controller(TIERS["free"]["daily_tokens"])
+
+    with pytest.raises(HTTPException) as raised:
+        _admit(controller, _user())
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) > 0
+    # A rejected request does not keep its slot
+    assert controller.inflight == 0
+
+    # The same usage is within a higher tier's quota
+    _admit(controller, _user(tier="pro"))
+
+
+def test_recorded_tokens_count_towards_the_limit(monkeypatch):
+    controller = _controller(TIERS["free"]["daily_tokens"] - 10)
+    _admit(controller, _user()).release()
+
+    class _Usage:
+        async def create_index(self, *args, **kwargs):
+            pass
+
+        async def update_one(self, *args, **kwargs):
+            pass
+
+    monkeypatch.setattr("app.utils.admission.services", SimpleNamespace(db={settings.USAGE_COLLECTION: _Usage()}))
+    asyncio.run(controller.record_tokens("u1", 10))
+
+    with pytest.raises(HTTPException):
+        _admit(controller, _user())
+
+
+def test_unknown_tier_falls_back_to_the_default():
+    assert AdmissionController.tier_of({"tier": "platinum"}) == settings.DEFAULT_TIER
@@ -0,0 +1,39 @@
+from app.utils.compact import compact_plan, compress, decompress, expand_plan
+
+
+def _plan():
+    meal = {
+        "type": "Dinner",
+        "name": "Rice bowl",
+        "ingredients": ["1 cup rice", "1 tbsp oil"],
+        "recipe": ["Rinse the rice.", "Cook it."],
+        "nutritionalInfo": {"calories": 500},
+    }
+    return {"days": [
+        {"day": 1, "description": "Rice", "meals": [meal, {**meal, "type": "Lunch", "recipe": "Cook it."}]},
+        {"day": 2, "description": "More rice", "meals": [{**meal, "ingredients": ["1 cup rice", "2 eggs"]}]},
+    ]}
+
+
+def test_expand_plan_inverts_compact_plan():
+    plan = _plan()
+    assert expand_plan(compact_plan(plan)) == plan
+
+
+def test_compact_plan_stores_repeated_lines_once():
+    compact = compact_plan(_plan())
+
+    assert compact["ingredients"] == ["1 cup rice", "1 tbsp oil", "2 eggs"]
+    assert compact["steps"] == ["Rinse the rice.", "Cook it."]
+    assert compact["days"][1]["meals"][0]["ingredients"] == [0, 2]
+    # A recipe written as one string is left as it is
+    assert compact["days"][0]["meals"][1]["recipe"] == "Cook it."
+
+
+def test_compact_plan_of_an_empty_plan():
+    assert expand_plan(compact_plan({})) == {"days": []}
+
+
+def test_decompress_inverts_compress():
+    raw = b'{"days": []}' * 100
+    assert decompress(compress(raw)) == raw
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.requests import Request
+
+from app.utils.http_cache import conditional_get, with_version_bump
+
+
+class _Item(BaseModel):
+    id: str
+    name: str
+
+
+class _Collection:
+    """A single document; counts full reads to show when the body cache answers"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.full_reads = 0
+
+    async def find_one(self, query, projection=None):
+        if query["_id"] != self.doc["_id"]:
+            return None
+        if projection is None:
+            self.full_reads += 1
+            return dict(self.doc)
+        return {k: v for k, v in self.doc.items() if k == "_id" or k in projection}
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def _get(collection, if_none_match=None):
+    return asyncio.run(conditional_get(
+        _request(if_none_match), "item", collection, {"_id": collection.doc["_id"]}, _Item,
+        lambda doc: {"id": str(doc["_id"]), "name": doc["name"]},
+    ))
+
+
+def _collection():
+    return _Collection({"_id": ObjectId(), "name": "Rice", "version": 1, "updatedAt": "2026-01-01T08:00:00"})
+
+
+def test_first_request_gets_the_body_and_an_etag():
+    collection = _collection()
+    response = _get(collection)
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"item-{collection.doc["_id"]}-1"'
+    assert "Last-Modified" in response.headers
+    assert json.loads(response.body)["name"] == "Rice"
+
+
+def test_matching_etag_gets_304_without_reading_the_document():
+    collection = _collection()
+    tag = _get(collection).headers["ETag"]
+    reads = collection.full_reads
+
+    response = _get(collection, tag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag
+    assert response.body == b""
+    assert collection.full_reads == reads
+
+    assert _get(collection, "*").status_code == 304
+    assert _get(collection, f'"other", {tag}').status_code == 304
+
+
+def test_write_changes_the_etag():
+    collection = _collection()
+    old_tag = _get(collection).headers["ETag"]
+
+    # What a content write does to the stored version
+    update = with_version_bump({"$set": {"name": "Fried rice"}})
+    collection.doc.update(update["$set"])
+    collection.doc["version"] += update["$inc"]["version"]
+
+    response = _get(collection, old_tag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != old_tag
+    assert json.loads(response.body)["name"] == "Fried rice"
+    assert _get(collection, response.headers["ETag"]).status_code == 304
+
+
+def test_unchanged_document_is_served_from_the_body_cache():
+    collection = _collection()
+    first = _get(collection)
+    second = _get(collection)
+
+    assert second.body == first.body
+    assert collection.full_reads == 1
+
+
+def test_missing_document_returns_none():
+    collection = _collection()
+    response = asyncio.run(conditional_get(_request(), "item", collection, {"_id": ObjectId()}, _Item, dict))
+    assert response is None
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.utils import jobs
+
+
+class _Plans:
+    """Just enough of a collection for the conditional update in `transition`"""
+
+    def __init__(self, status):
+        self.doc = {"_id": ObjectId(), "status": status}
+
+    async def update_one(self, query, update):
+        matched = query["_id"] == self.doc["_id"] and self.doc["status"] in query["status"]["$in"]
+        if matched:
+            self.doc.update(update["$set"])
+        return SimpleNamespace(modified_count=int(matched))
+
+
+def _transition(status, target):
+    plans = _Plans(status)
+    moved = asyncio.run(jobs.transition(plans, str(plans.doc["_id"]), target))
+    return moved, plans.doc
+
+
+def test_every_state_has_transitions():
+    states = {jobs.QUEUED, jobs.GENERATING, jobs.PARTIAL, jobs.COMPLETED, jobs.FAILED, jobs.PENDING}
+    assert set(jobs.ALLOWED_TRANSITIONS) == states
+    assert all(targets <= states for targets in jobs.ALLOWED_TRANSITIONS.values())
+
+
+def test_sources_for_inverts_allowed_transitions():
+    assert set(jobs.sources_for(jobs.GENERATING)) == {jobs.PENDING, jobs.QUEUED, jobs.PARTIAL}
+    assert jobs.sources_for(jobs.PENDING) == []
+
+
+@pytest.mark.parametrize("status, target", [
+    (source, target) for source, targets in jobs.ALLOWED_TRANSITIONS.items() for target in targets
+])
+def test_transition_allowed(status, target):
+    moved, doc = _transition(status, target)
+    assert moved
+    assert doc["status"] == target
+
+
+@pytest.mark.parametrize("status, target", [
+    (jobs.COMPLETED, jobs.GENERATING),
+    (jobs.COMPLETED, jobs.FAILED),
+    (jobs.FAILED, jobs.GENERATING),
+    (jobs.QUEUED, jobs.COMPLETED),
+    (jobs.GENERATING, jobs.GENERATING),
+])
+def test_transition_refused(status, target):
+    moved, doc = _transition(status, target)
+    assert not moved
+    assert doc["status"] == status
+
+
+def test_transition_update_stamps_the_new_state():
+    update = jobs._transition_update(jobs.GENERATING, 10, None, {"batchId": "b1"})
+
+    assert update["$set"]["status"] == jobs.GENERATING
+    assert update["$set"]["progress"] == 10
+    assert update["$set"]["batchId"] == "b1"
+    assert update["$inc"] == {"attempts": 1, "version": 1}
+    assert "expiresAt" in update["$unset"]
+    assert "expiresAt" in jobs._transition_update(jobs.FAILED, None, "boom", None)["$set"]
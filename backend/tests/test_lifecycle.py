@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.utils.lifecycle import from_archive, to_archive
+
+
+KEYS = ("userId", "status", "createdAt", "version")
+
+
+def _doc():
+    return {
+        "_id": ObjectId(),
+        "userId": ObjectId(),
+        "status": "completed",
+        "createdAt": "2026-01-01T08:00:00",
+        "version": 3,
+        "completedAt": datetime(2026, 1, 1, 8, 5),
+        "mealPlan": {"days": [{"day": 1, "description": "Eggs", "meals": [{
+            "type": "Breakfast",
+            "name": "Eggs",
+            "ingredients": ["2 eggs"],
+            "recipe": ["Boil the eggs."],
+            "nutritionalInfo": {"calories": 150},
+        }]}]},
+    }
+
+
+def test_from_archive_inverts_to_archive():
+    doc = _doc()
+    assert from_archive(to_archive(doc, KEYS)) == doc
+
+
+def test_to_archive_keeps_only_lookup_keys_unpacked():
+    doc = _doc()
+    archived = to_archive(doc, KEYS)
+
+    assert set(archived) == {"_id", "blob", "archivedAt", *KEYS}
+    assert archived["userId"] == doc["userId"]
+
+
+def test_archive_round_trip_without_a_meal_plan():
+    doc = {"_id": ObjectId(), "userId": ObjectId(), "title": "Chat", "messages": [{"role": "user", "content": "hi"}]}
+    assert from_archive(to_archive(doc, ("userId", "title"))) == doc
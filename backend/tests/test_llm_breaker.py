@@ -0,0 +1,89 @@
+import pytest
+
+from app.config import settings
+from app.utils import llm
+from app.utils.llm import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMUnavailableError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "LLM_BREAKER_RESET_SECONDS", 30)
+    return now
+
+
+def _open(breaker):
+    for _ in range(settings.LLM_BREAKER_FAILURES):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker()
+    for _ in range(settings.LLM_BREAKER_FAILURES - 1):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker()
+    for _ in range(settings.LLM_BREAKER_FAILURES - 1):
+        breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_fails_fast_with_retry_after(clock):
+    breaker = CircuitBreaker()
+    _open(breaker)
+    clock[0] += 10
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == 20
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker()
+    _open(breaker)
+    clock[0] += settings.LLM_BREAKER_RESET_SECONDS
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_trial_opens_again(clock):
+    breaker = CircuitBreaker()
+    _open(breaker)
+    clock[0] += settings.LLM_BREAKER_RESET_SECONDS
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+
+
+def test_released_trial_lets_the_next_one_through(clock):
+    breaker = CircuitBreaker()
+    _open(breaker)
+    clock[0] += settings.LLM_BREAKER_RESET_SECONDS
+
+    breaker.before_call()
+    breaker.release_trial()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,46 @@
+from app.utils.recipe_index import RecipeIndex
+
+
+def _meal(name, meal_type="Dinner", ingredients=("1 cup rice",)):
+    return {
+        "type": meal_type,
+        "name": name,
+        "ingredients": list(ingredients),
+        "recipe": "Cook it.",
+        "nutritionalInfo": {"calories": 500},
+    }
+
+
+def _plan(meals, **constraints):
+    return {"mealPlan": {"days": [{"day": 1, "meals": meals}]}, **constraints}
+
+
+def test_constraint_tags_never_widen_on_a_repeated_meal():
+    index = RecipeIndex(max_meals=100)
+    index.add_plan(_plan([_meal("Satay noodles", ingredients=("2 tbsp peanut butter",))], cuisineTypes=["Thai"]))
+    # The same name generated for a nut-free vegan plan must not make the stored recipe nut-free
+    added = index.add_plan(_plan([_meal("Satay noodles")], cuisineTypes=["Asian"], dietaryRestrictions=["Nut-free"], dietaryPreferences=["Vegan"]))
+
+    assert added == 0
+    restricted = {"mealType": ["Dinner"], "dietaryRestrictions": ["Nut-free"], "dietaryPreferences": ["Vegan"]}
+    assert index.candidates(restricted, "Dinner", set()) == []
+    # Cuisine tags are not hard constraints and still accumulate
+    assert index.candidates({"cuisineTypes": ["Asian"]}, "Dinner", set()) == ["dinner:satay noodles"]
+
+
+def test_constraint_tags_narrow_to_what_every_plan_required():
+    index = RecipeIndex(max_meals=100)
+    index.add_plan(_plan([_meal("Lentil stew")], dietaryRestrictions=["Nut-free"], dietaryPreferences=["Vegan"]))
+    index.add_plan(_plan([_meal("Lentil stew")], dietaryRestrictions=["Nut-free"]))
+
+    assert index.candidates({"dietaryRestrictions": ["Nut-free"]}, "Dinner", set()) == ["dinner:lentil stew"]
+    assert index.candidates({"dietaryPreferences": ["Vegan"]}, "Dinner", set()) == []
+
+
+def test_eviction_drops_postings():
+    index = RecipeIndex(max_meals=1)
+    index.add_plan(_plan([_meal("Old stew")], dietaryRestrictions=["Nut-free"]))
+    index.add_plan(_plan([_meal("New stew")]))
+
+    assert len(index) == 1
+    assert "restriction:nut-free" not in index._postings
@@ -0,0 +1,70 @@
+import pytest
+
+from app.utils.shopping_list import build_shopping_list, parse_ingredient, parse_quantity
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2", 2),
+    ("2.5", 2.5),
+    ("1/2", 0.5),
+    ("1 1/2", 1.5),
+    ("½", 0.5),
+    ("1½", 1.5),
+    ("1 ¾", 1.75),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == pytest.approx(expected)
+
+
+def test_parse_quantity_rejects_zero_denominator():
+    with pytest.raises(ValueError):
+        parse_quantity("1/0")
+
+
+def test_parse_ingredient_fraction_with_unit():
+    parsed = parse_ingredient("1 1/2 cups of rice")
+    assert parsed["item"] == "rice"
+    assert parsed["unit"] == "cup"
+    assert parsed["quantity"] == pytest.approx(1.5)
+    assert parsed["base"] == pytest.approx(360)
+
+
+def test_parse_ingredient_unicode_fraction():
+    parsed = parse_ingredient("½ tsp salt")
+    assert parsed["quantity"] == pytest.approx(0.5)
+    assert parsed["unit"] == "tsp"
+    assert parsed["item"] == "salt"
+
+
+@pytest.mark.parametrize("line", ["2-3 cloves garlic", "2 to 3 cloves garlic"])
+def test_parse_ingredient_range_takes_the_upper_bound(line):
+    parsed = parse_ingredient(line)
+    assert parsed["quantity"] == 3
+    assert parsed["unit"] == "clove"
+    assert parsed["item"] == "garlic"
+
+
+def test_parse_ingredient_counts_without_unit():
+    parsed = parse_ingredient("- 3 large tomatoes, diced")
+    assert parsed["item"] == "tomato"
+    assert parsed["unit"] is None
+    assert parsed["dimension"] == "count"
+
+
+@pytest.mark.parametrize("line", ["salt to taste", "1/0 cup flour", "2-1/0 eggs", ""])
+def test_parse_ingredient_unparseable(line):
+    assert parse_ingredient(line) is None
+
+
+def test_build_shopping_list_merges_units_and_keeps_unparsed_lines():
+    plan = {"days": [
+        {"meals": [{"ingredients": ["1 cup rice", "1/0 cup flour", "salt to taste"]}]},
+        {"meals": [{"ingredients": ["1/2 cup rice", "Salt to taste", None]}]},
+    ]}
+    items = {item["item"]: item for item in build_shopping_list(plan)["items"]}
+    assert items["rice"]["quantity"] == 1.5
+    assert items["rice"]["unit"] == "cup"
+    assert items["rice"]["occurrences"] == 2
+    assert items["salt"]["quantity"] is None
+    assert items["salt"]["occurrences"] == 2
+    assert "1/0 cup flour" in items
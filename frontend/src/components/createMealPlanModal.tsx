@@ -217,8 +217,25 @@ const CreateMealPlanModal: React.FC<CreateMealPlanModalProps> = ({
       // Handle error
       setIsLoading(false);
       toast.error(`Error creating meal plan: ${lastMessage.error}`);
+    } else if (
+      lastMessage &&
+      lastMessage.type === 'meal_plan_progress' &&
+      lastMessage.meal_plan_id === createdMealPlanId
+    ) {
+      if (lastMessage.status === 'failed') {
+        setIsLoading(false);
+        toast.error(`Error creating meal plan: ${lastMessage.error}`);
+      } else if (lastMessage.status === 'queued') {
+        // Put back in the queue for a retry; the plans list tracks it from here
+        setIsLoading(false);
+        toast.info(
+          lastMessage.error ||
+            'Your meal plan is queued and will be ready shortly'
+        );
+        onClose();
+      }
     }
-  }, [lastMessage, createdMealPlanId, dispatch]);
+  }, [lastMessage, createdMealPlanId, dispatch, onClose]);
 
   // eslint-disable-next-line @typescript-eslint/no-unused-vars
   const onSubmit = async (data: FormValues) => {
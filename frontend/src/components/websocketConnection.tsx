@@ -3,7 +3,7 @@ import { auth } from '../firebaseConfig';
 import { useDispatch } from 'react-redux';
 import { WebSocketContext, ConnectionStatus } from '../hooks/websocketContext';
 import { useLocation } from 'react-router-dom';
-import { updateMealPlan } from '../store/mealPlanSlice';
+import { updateMealPlan, updateMealPlanProgress } from '../store/mealPlanSlice';
 
 // The WebSocket Provider component
 export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({
@@ -73,6 +73,16 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({
 
           if (data.type === 'meal_plan_completed' && data.meal_plan_data) {
             dispatch(updateMealPlan(data.meal_plan_data));
+          } else if (data.type === 'meal_plan_progress') {
+            dispatch(updateMealPlanProgress(data));
+          } else if (data.type === 'meal_plan_error') {
+            dispatch(
+              updateMealPlanProgress({
+                meal_plan_id: data.meal_plan_id,
+                status: 'failed',
+                error: data.error,
+              })
+            );
           }
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
@@ -30,6 +30,18 @@ export interface MealItem {
   };
 }
 
+// Generation job states; 'pending' is kept for plans created before queued jobs
+export type MealPlanStatus =
+  | 'queued'
+  | 'pending'
+  | 'generating'
+  | 'partial'
+  | 'completed'
+  | 'failed';
+
+export const isMealPlanInProgress = (status: MealPlanStatus) =>
+  status === 'queued' || status === 'pending' || status === 'generating';
+
 export interface MealPlan {
   _id: string;
   userId: string;
@@ -40,7 +52,8 @@ export interface MealPlan {
   dietaryPreferences: string[];
   cuisineTypes: string[];
   complexityLevels: string[];
-  status: 'pending' | 'completed' | 'error';
+  status: MealPlanStatus;
+  progress?: number;
   createdAt: string;
   completedAt?: string;
   mealPlan?: {
@@ -102,6 +115,31 @@ const mealPlanSlice = createSlice({
         state.mealPlans[index] = action.payload;
       }
     },
+    // Applies `meal_plan_progress` and `meal_plan_error` WebSocket messages
+    updateMealPlanProgress(
+      state,
+      action: {
+        payload: {
+          meal_plan_id: string;
+          status: MealPlanStatus;
+          progress?: number;
+          error?: string;
+        };
+      }
+    ) {
+      const plan = state.mealPlans.find(
+        (plan) => plan._id === action.payload.meal_plan_id
+      );
+      if (plan) {
+        plan.status = action.payload.status;
+        if (action.payload.progress !== undefined) {
+          plan.progress = action.payload.progress;
+        }
+        if (action.payload.error) {
+          plan.error = action.payload.error;
+        }
+      }
+    },
   },
   extraReducers: (builder) => {
     builder
@@ -120,5 +158,6 @@ const mealPlanSlice = createSlice({
   },
 });
 
-export const { addMealPlan, updateMealPlan } = mealPlanSlice.actions;
+export const { addMealPlan, updateMealPlan, updateMealPlanProgress } =
+  mealPlanSlice.actions;
 export default mealPlanSlice.reducer;
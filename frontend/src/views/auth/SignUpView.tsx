@@ -36,11 +36,11 @@ const SignUpView = ({ setIsAuthenticated }: SignUpViewProps) => {
       const user = result.user;
       console.log('User signed up with Google:', user);
 
-      await axios.post('/api/auth/register', {
-        email: user.email,
-        firebaseUid: user.uid,
-        googleAuth: true,
-      });
+      await axios.post(
+        '/api/auth/register',
+        {},
+        { headers: { Authorization: `Bearer ${await user.getIdToken()}` } }
+      );
 
       setIsAuthenticated(true);
       navigate('/');
@@ -68,11 +68,11 @@ const SignUpView = ({ setIsAuthenticated }: SignUpViewProps) => {
       const user = userCredential?.user;
       console.log('User created:', user);
 
-      await axios.post('/api/auth/register', {
-        email: email,
-        password: password,
-        firebaseUid: user.uid,
-      });
+      await axios.post(
+        '/api/auth/register',
+        { password: password },
+        { headers: { Authorization: `Bearer ${await user.getIdToken()}` } }
+      );
       setIsAuthenticated(true);
       navigate('/login');
       setIsLoading(false);
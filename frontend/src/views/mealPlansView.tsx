@@ -4,7 +4,12 @@ import MealChatModal from '../components/mealChatModal';
 import CreateMealPlanModal from '../components/createMealPlanModal';
 import { useSelector, useDispatch } from 'react-redux';
 import { RootState, AppDispatch } from '../store/index';
-import { fetchMealPlans, MealDay, MealPlan } from '../store/mealPlanSlice';
+import {
+  fetchMealPlans,
+  isMealPlanInProgress,
+  MealDay,
+  MealPlan,
+} from '../store/mealPlanSlice';
 import { format } from 'date-fns';
 import { formatRelativeTime } from '../utils/helper';
 import EmptyState from '../components/emptyState';
@@ -43,6 +48,15 @@ const MealPlansView: React.FC<{
     }
   }, [mealPlans, selectedPlan]);
 
+  // Keep the selected plan in step with progress and completion updates
+  useEffect(() => {
+    if (!selectedPlan) return;
+    const latest = mealPlans.find((plan) => plan._id === selectedPlan._id);
+    if (latest && latest !== selectedPlan) {
+      setSelectedPlan(latest);
+    }
+  }, [mealPlans, selectedPlan]);
+
   const itemsPerPage = 6;
 
   const getMealDays = () => selectedPlan?.mealPlan?.days || [];
@@ -219,9 +233,23 @@ const MealPlansView: React.FC<{
                     >
                       {format(new Date(plan.startDate), 'MMM d')} -{' '}
                       {format(new Date(plan.endDate), 'MMM d')} Meal Plan
-                      {plan.status === 'pending' && (
+                      {isMealPlanInProgress(plan.status) && (
                         <span className=' absolute right-0  top-0 inline-flex items-center px-2 py-0.5 rounded text-xs font-medium bg-yellow-100 text-yellow-800'>
-                          Pending
+                          {plan.status === 'generating'
+                            ? `Generating${
+                                plan.progress ? ` ${plan.progress}%` : ''
+                              }`
+                            : 'Queued'}
+                        </span>
+                      )}
+                      {plan.status === 'partial' && (
+                        <span className=' absolute right-0  top-0 inline-flex items-center px-2 py-0.5 rounded text-xs font-medium bg-orange-100 text-orange-800'>
+                          Partial
+                        </span>
+                      )}
+                      {plan.status === 'failed' && (
+                        <span className=' absolute right-0  top-0 inline-flex items-center px-2 py-0.5 rounded text-xs font-medium bg-red-100 text-red-800'>
+                          Failed
                         </span>
                       )}
                     </div>
@@ -263,14 +291,21 @@ const MealPlansView: React.FC<{
               />
 
               <div className='grid grid-cols-1 gap-6 mt-4 w-full '>
-                {selectedPlan?.status === 'pending' ? (
+                {selectedPlan && isMealPlanInProgress(selectedPlan.status) ? (
                   <div className='flex flex-col items-center justify-center h-64'>
                     <div className='w-12 h-12 border-4 border-gray-900 border-t-transparent rounded-full animate-spin mb-4'></div>
                     <p className='text-gray-600'>
-                      Generating your meal plan...
+                      {selectedPlan.status === 'generating'
+                        ? `Generating your meal plan...${
+                            selectedPlan.progress
+                              ? ` ${selectedPlan.progress}%`
+                              : ''
+                          }`
+                        : selectedPlan.error ||
+                          'Your meal plan is queued and will start shortly...'}
                     </p>
                   </div>
-                ) : selectedPlan?.status === 'error' ? (
+                ) : selectedPlan?.status === 'failed' ? (
                   <div className='flex flex-col items-center justify-center h-64'>
                     <p className='text-red-500'>
                       Error:{' '}
@@ -279,6 +314,12 @@ const MealPlansView: React.FC<{
                   </div>
                 ) : selectedPlan?.mealPlan?.days ? (
                   <div className='grid grid-cols-1 md:grid-cols-2 gap-6 mt-4'>
+                    {selectedPlan.status === 'partial' && (
+                      <div className='md:col-span-2 text-sm text-orange-800 bg-orange-50 rounded-md px-4 py-3'>
+                        {selectedPlan.error ||
+                          'Only part of this meal plan could be generated.'}
+                      </div>
+                    )}
                     {currentDays.map((day) => (
                       <div
                         key={day.day}